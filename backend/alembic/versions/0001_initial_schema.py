@@ -0,0 +1,39 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'page_visits',
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('datetime_visited', sa.DateTime(), nullable=False),
+        sa.Column('link_count', sa.Integer(), nullable=False),
+        sa.Column('word_count', sa.Integer(), nullable=False),
+        sa.Column('image_count', sa.Integer(), nullable=False),
+        sa.Column('total_visits', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('url'),
+    )
+    op.create_index('ix_page_visits_url', 'page_visits', ['url'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_page_visits_url', table_name='page_visits')
+    op.drop_table('page_visits')
@@ -0,0 +1,32 @@
+"""index page_visits by datetime_visited
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Leads with datetime_visited, so it serves both the /current lookup
+    # (ORDER BY datetime_visited DESC LIMIT 1) and keyset pagination of /history.
+    op.create_index(
+        'ix_page_visits_datetime_visited_url', 'page_visits', ['datetime_visited', 'url'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_page_visits_datetime_visited_url', table_name='page_visits')
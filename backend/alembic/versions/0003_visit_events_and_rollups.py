@@ -0,0 +1,57 @@
+"""add visit event log and hourly/daily rollups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_rollup_table(name: str) -> None:
+    op.create_table(
+        name,
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('visits', sa.Integer(), nullable=False),
+        sa.Column('link_count_sum', sa.BigInteger(), nullable=False),
+        sa.Column('word_count_sum', sa.BigInteger(), nullable=False),
+        sa.Column('image_count_sum', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('bucket_start', 'url'),
+    )
+    op.create_index(f'ix_{name}_url_bucket_start', name, ['url', 'bucket_start'], unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'visit_events',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('visited_at', sa.DateTime(), nullable=False),
+        sa.Column('visit_count', sa.Integer(), nullable=False),
+        sa.Column('link_count', sa.Integer(), nullable=False),
+        sa.Column('word_count', sa.Integer(), nullable=False),
+        sa.Column('image_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    _create_rollup_table('visit_rollups_hourly')
+    _create_rollup_table('visit_rollups_daily')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in ('visit_rollups_daily', 'visit_rollups_hourly'):
+        op.drop_index(f'ix_{name}_url_bucket_start', table_name=name)
+        op.drop_table(name)
+    op.drop_table('visit_events')
@@ -0,0 +1,232 @@
+"""key page visits and rollups by a hash of the normalized URL
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Dict, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.urls import normalize_url, url_hash
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+ROLLUP_TABLES = ('visit_rollups_hourly', 'visit_rollups_daily')
+
+
+def _insert(bind, table):
+    dialect_insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}[bind.dialect.name]
+    return dialect_insert(table)
+
+
+def _page_visits_table(name: str, hashed: bool) -> sa.Table:
+    key_columns = (
+        [sa.Column('url_hash', sa.BigInteger(), primary_key=True, autoincrement=False),
+         sa.Column('url', sa.String(), nullable=False)]
+        if hashed else
+        [sa.Column('url', sa.String(), primary_key=True)]
+    )
+    return sa.Table(
+        name, sa.MetaData(),
+        *key_columns,
+        sa.Column('datetime_visited', sa.DateTime(), nullable=False),
+        sa.Column('link_count', sa.Integer(), nullable=False),
+        sa.Column('word_count', sa.Integer(), nullable=False),
+        sa.Column('image_count', sa.Integer(), nullable=False),
+        sa.Column('total_visits', sa.Integer(), nullable=False),
+    )
+
+
+def _rollup_table(name: str, hashed: bool) -> sa.Table:
+    key_column = (
+        sa.Column('url_hash', sa.BigInteger(), primary_key=True, autoincrement=False)
+        if hashed else
+        sa.Column('url', sa.String(), primary_key=True)
+    )
+    return sa.Table(
+        name, sa.MetaData(),
+        sa.Column('bucket_start', sa.DateTime(), primary_key=True),
+        key_column,
+        sa.Column('visits', sa.Integer(), nullable=False),
+        sa.Column('link_count_sum', sa.BigInteger(), nullable=False),
+        sa.Column('word_count_sum', sa.BigInteger(), nullable=False),
+        sa.Column('image_count_sum', sa.BigInteger(), nullable=False),
+    )
+
+
+def _upsert_page_visits(bind, table: sa.Table, rows: Dict) -> None:
+    """Merge rows into `table`: visit counts are summed, the newest metrics win."""
+    if not rows:
+        return
+    stmt = _insert(bind, table).values(list(rows.values()))
+    newer = stmt.excluded.datetime_visited > table.c.datetime_visited
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.url_hash],
+        set_={
+            'total_visits': table.c.total_visits + stmt.excluded.total_visits,
+            **{
+                column: sa.case((newer, stmt.excluded[column]), else_=table.c[column])
+                for column in ('datetime_visited', 'link_count', 'word_count', 'image_count')
+            },
+        },
+    )
+    bind.execute(stmt)
+
+
+def _merge_page_visit(rows: Dict, key, row: Dict) -> None:
+    previous = rows.get(key)
+    if previous is None:
+        rows[key] = row
+        return
+    newest = row if row['datetime_visited'] > previous['datetime_visited'] else previous
+    rows[key] = dict(newest, total_visits=previous['total_visits'] + row['total_visits'])
+
+
+def _upsert_rollups(bind, table: sa.Table, key: str, rows: Dict) -> None:
+    if not rows:
+        return
+    stmt = _insert(bind, table).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.bucket_start, table.c[key]],
+        set_={
+            column: table.c[column] + stmt.excluded[column]
+            for column in ('visits', 'link_count_sum', 'word_count_sum', 'image_count_sum')
+        },
+    )
+    bind.execute(stmt)
+
+
+def _merge_rollup(rows: Dict, key: Tuple, row: Dict) -> None:
+    previous = rows.get(key)
+    if previous is None:
+        rows[key] = row
+        return
+    for column in ('visits', 'link_count_sum', 'word_count_sum', 'image_count_sum'):
+        previous[column] += row[column]
+
+
+def _select_in_pages(bind, table: sa.Table, order_by: Sequence[str]):
+    """Yield lists of row mappings from `table`, paging by its primary key."""
+    columns = [table.c[name] for name in order_by]
+    last = None
+    while True:
+        stmt = sa.select(table).order_by(*columns).limit(BATCH_SIZE)
+        if last is not None:
+            stmt = stmt.where(sa.tuple_(*columns) > sa.tuple_(*last))
+        rows = [dict(row) for row in bind.execute(stmt).mappings()]
+        if not rows:
+            return
+        yield rows
+        last = [rows[-1][name] for name in order_by]
+
+
+def _replace_table(old_name: str, new_name: str) -> None:
+    op.drop_table(old_name)
+    op.rename_table(new_name, old_name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    # page_visits: re-key by url_hash, merging rows whose URLs normalize alike.
+    old_visits = _page_visits_table('page_visits', hashed=False)
+    new_visits = _page_visits_table('page_visits_hashed', hashed=True)
+    new_visits.create(bind)
+    for page in _select_in_pages(bind, old_visits, ['url']):
+        merged: Dict = {}
+        for row in page:
+            url = normalize_url(row['url'])
+            key = url_hash(url)
+            _merge_page_visit(merged, key, dict(row, url=url, url_hash=key))
+        _upsert_page_visits(bind, new_visits, merged)
+    _replace_table('page_visits', 'page_visits_hashed')
+    op.create_index(
+        'ix_page_visits_datetime_visited_url_hash', 'page_visits', ['datetime_visited', 'url_hash'], unique=False
+    )
+
+    # visit_events: keep the logged URL and add the key it aggregates under.
+    with op.batch_alter_table('visit_events') as batch_op:
+        batch_op.add_column(sa.Column('url_hash', sa.BigInteger(), nullable=True))
+    events = sa.table('visit_events', sa.column('id'), sa.column('url'), sa.column('url_hash'))
+    last_id = None
+    while True:
+        stmt = sa.select(events.c.id, events.c.url).order_by(events.c.id).limit(BATCH_SIZE)
+        if last_id is not None:
+            stmt = stmt.where(events.c.id > last_id)
+        rows = bind.execute(stmt).all()
+        if not rows:
+            break
+        bind.execute(
+            events.update().where(events.c.id == sa.bindparam('event_id')).values(url_hash=sa.bindparam('key')),
+            [{'event_id': row.id, 'key': url_hash(normalize_url(row.url))} for row in rows],
+        )
+        last_id = rows[-1].id
+    with op.batch_alter_table('visit_events') as batch_op:
+        batch_op.alter_column('url_hash', existing_type=sa.BigInteger(), nullable=False)
+
+    # Rollups: re-key buckets by url_hash, summing buckets that merge.
+    for name in ROLLUP_TABLES:
+        old_rollup = _rollup_table(name, hashed=False)
+        new_rollup = _rollup_table(f'{name}_hashed', hashed=True)
+        new_rollup.create(bind)
+        for page in _select_in_pages(bind, old_rollup, ['bucket_start', 'url']):
+            merged = {}
+            for row in page:
+                key = url_hash(normalize_url(row['url']))
+                bucket = {column: value for column, value in row.items() if column != 'url'}
+                _merge_rollup(merged, (row['bucket_start'], key), dict(bucket, url_hash=key))
+            _upsert_rollups(bind, new_rollup, 'url_hash', merged)
+        op.drop_index(f'ix_{name}_url_bucket_start', table_name=name)
+        _replace_table(name, f'{name}_hashed')
+        op.create_index(f'ix_{name}_url_hash_bucket_start', name, ['url_hash', 'bucket_start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema. Rows merged by normalization stay merged."""
+    bind = op.get_bind()
+
+    # Rollups: recover URLs from page_visits; buckets of unknown URLs are dropped.
+    url_by_hash = {row.url_hash: row.url for row in bind.execute(sa.text('SELECT url_hash, url FROM page_visits'))}
+    for name in ROLLUP_TABLES:
+        hashed_rollup = _rollup_table(name, hashed=True)
+        url_rollup = _rollup_table(f'{name}_by_url', hashed=False)
+        url_rollup.create(bind)
+        for page in _select_in_pages(bind, hashed_rollup, ['bucket_start', 'url_hash']):
+            merged = {}
+            for row in page:
+                url = url_by_hash.get(row['url_hash'])
+                if url is not None:
+                    bucket = {column: value for column, value in row.items() if column != 'url_hash'}
+                    _merge_rollup(merged, (row['bucket_start'], url), dict(bucket, url=url))
+            _upsert_rollups(bind, url_rollup, 'url', merged)
+        op.drop_index(f'ix_{name}_url_hash_bucket_start', table_name=name)
+        _replace_table(name, f'{name}_by_url')
+        op.create_index(f'ix_{name}_url_bucket_start', name, ['url', 'bucket_start'], unique=False)
+
+    with op.batch_alter_table('visit_events') as batch_op:
+        batch_op.drop_column('url_hash')
+
+    hashed_visits = _page_visits_table('page_visits', hashed=True)
+    url_visits = _page_visits_table('page_visits_by_url', hashed=False)
+    url_visits.create(bind)
+    for page in _select_in_pages(bind, hashed_visits, ['url_hash']):
+        bind.execute(url_visits.insert(), [
+            {column: row[column] for column in url_visits.c.keys()} for row in page
+        ])
+    _replace_table('page_visits', 'page_visits_by_url')
+    op.create_index('ix_page_visits_url', 'page_visits', ['url'], unique=False)
+    op.create_index(
+        'ix_page_visits_datetime_visited_url', 'page_visits', ['datetime_visited', 'url'], unique=False
+    )
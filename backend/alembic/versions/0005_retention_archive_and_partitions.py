@@ -0,0 +1,148 @@
+"""add retention archive tables and partition visit_events by month
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:40:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+# Months partitioned ahead of the current one; app.services.partitions
+# keeps creating them from then on.
+PARTITIONS_AHEAD = 2
+
+EVENT_COLUMNS = 'id, url_hash, url, visited_at, visit_count, link_count, word_count, image_count'
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _copy_events(bind, source: str, target: str) -> None:
+    """Copy visit_events rows from `source` to `target` in id order, a batch per statement."""
+    last_id = 0
+    while True:
+        last = bind.execute(sa.text(
+            f'WITH batch AS (SELECT {EVENT_COLUMNS} FROM {source} WHERE id > :last_id ORDER BY id LIMIT :batch_size) '
+            f'INSERT INTO {target} ({EVENT_COLUMNS}) SELECT * FROM batch RETURNING id'
+        ), {'last_id': last_id, 'batch_size': BATCH_SIZE}).scalars().all()
+        if not last:
+            return
+        last_id = max(last)
+
+
+def _partition_visit_events(bind) -> None:
+    """
+    Rebuild visit_events as a table range-partitioned by month on visited_at,
+    with a default partition for rows outside the monthly ones. Old months
+    can then be removed by detaching their partition instead of a DELETE.
+    """
+    op.rename_table('visit_events', 'visit_events_unpartitioned')
+    op.execute(
+        'ALTER TABLE visit_events_unpartitioned RENAME CONSTRAINT visit_events_pkey TO visit_events_unpartitioned_pkey'
+    )
+    # The primary key of a partitioned table must include the partition key.
+    op.execute(
+        "CREATE TABLE visit_events ("
+        "id BIGINT NOT NULL DEFAULT nextval('visit_events_id_seq'), "
+        "url_hash BIGINT NOT NULL, url VARCHAR NOT NULL, visited_at TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+        "visit_count INTEGER NOT NULL, link_count INTEGER NOT NULL, word_count INTEGER NOT NULL, "
+        "image_count INTEGER NOT NULL, PRIMARY KEY (id, visited_at)"
+        ") PARTITION BY RANGE (visited_at)"
+    )
+    op.execute('ALTER SEQUENCE visit_events_id_seq OWNED BY visit_events.id')
+    op.execute('CREATE TABLE visit_events_default PARTITION OF visit_events DEFAULT')
+
+    oldest = bind.execute(sa.text('SELECT min(visited_at) FROM visit_events_unpartitioned')).scalar()
+    current = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = min(oldest, current).replace(day=1, hour=0, minute=0, second=0, microsecond=0) if oldest else current
+    while month <= _add_months(current, PARTITIONS_AHEAD):
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE visit_events_p{month:%Y%m} PARTITION OF visit_events "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        )
+        month = next_month
+
+    _copy_events(bind, 'visit_events_unpartitioned', 'visit_events')
+    op.drop_table('visit_events_unpartitioned')
+    op.create_index('ix_visit_events_visited_at', 'visit_events', ['visited_at'], unique=False)
+
+
+def _unpartition_visit_events(bind) -> None:
+    op.rename_table('visit_events', 'visit_events_partitioned')
+    op.execute(
+        'ALTER TABLE visit_events_partitioned RENAME CONSTRAINT visit_events_pkey TO visit_events_partitioned_pkey'
+    )
+    op.execute(
+        "CREATE TABLE visit_events ("
+        "id BIGINT NOT NULL DEFAULT nextval('visit_events_id_seq') PRIMARY KEY, "
+        "url_hash BIGINT NOT NULL, url VARCHAR NOT NULL, visited_at TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+        "visit_count INTEGER NOT NULL, link_count INTEGER NOT NULL, word_count INTEGER NOT NULL, "
+        "image_count INTEGER NOT NULL)"
+    )
+    op.execute('ALTER SEQUENCE visit_events_id_seq OWNED BY visit_events.id')
+    _copy_events(bind, 'visit_events_partitioned', 'visit_events')
+    # Dropping the parent drops every partition with it.
+    op.drop_table('visit_events_partitioned')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    op.create_table(
+        'page_visits_archive',
+        sa.Column('url_hash', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('datetime_visited', sa.DateTime(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('link_count', sa.Integer(), nullable=False),
+        sa.Column('word_count', sa.Integer(), nullable=False),
+        sa.Column('image_count', sa.Integer(), nullable=False),
+        sa.Column('total_visits', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('url_hash', 'datetime_visited'),
+    )
+    op.create_table(
+        'visit_events_archive',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=False, nullable=False),
+        sa.Column('url_hash', sa.BigInteger(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('visited_at', sa.DateTime(), nullable=False),
+        sa.Column('visit_count', sa.Integer(), nullable=False),
+        sa.Column('link_count', sa.Integer(), nullable=False),
+        sa.Column('word_count', sa.Integer(), nullable=False),
+        sa.Column('image_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    if bind.dialect.name == 'postgresql':
+        _partition_visit_events(bind)
+    else:
+        op.create_index('ix_visit_events_visited_at', 'visit_events', ['visited_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        _unpartition_visit_events(bind)
+    else:
+        op.drop_index('ix_visit_events_visited_at', table_name='visit_events')
+    op.drop_table('visit_events_archive')
+    op.drop_table('page_visits_archive')
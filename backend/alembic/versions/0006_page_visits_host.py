@@ -0,0 +1,59 @@
+"""add an indexed host column to page_visits
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.urls import url_host
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+HOST_INDEX_COLUMNS = ['host', 'total_visits', 'link_count', 'word_count', 'image_count']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    with op.batch_alter_table('page_visits') as batch_op:
+        batch_op.add_column(sa.Column('host', sa.String(), nullable=True))
+
+    # Backfill from the stored (already normalized) URLs, paging by the key.
+    page_visits = sa.table('page_visits', sa.column('url_hash'), sa.column('url'), sa.column('host'))
+    last_hash = None
+    while True:
+        stmt = sa.select(page_visits.c.url_hash, page_visits.c.url).order_by(page_visits.c.url_hash).limit(BATCH_SIZE)
+        if last_hash is not None:
+            stmt = stmt.where(page_visits.c.url_hash > last_hash)
+        rows = bind.execute(stmt).all()
+        if not rows:
+            break
+        bind.execute(
+            page_visits.update().where(page_visits.c.url_hash == sa.bindparam('key')).values(host=sa.bindparam('url_host')),
+            [{'key': row.url_hash, 'url_host': url_host(row.url)} for row in rows],
+        )
+        last_hash = rows[-1].url_hash
+
+    with op.batch_alter_table('page_visits') as batch_op:
+        batch_op.alter_column('host', existing_type=sa.String(), nullable=False)
+    op.create_index('ix_page_visits_host', 'page_visits', HOST_INDEX_COLUMNS, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_page_visits_host', table_name='page_visits')
+    with op.batch_alter_table('page_visits') as batch_op:
+        batch_op.drop_column('host')
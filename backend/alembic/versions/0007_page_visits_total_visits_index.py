@@ -0,0 +1,29 @@
+"""index page_visits by total_visits for the top-K reload
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 10:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_page_visits_total_visits_url_hash', 'page_visits', ['total_visits', 'url_hash'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_page_visits_total_visits_url_hash', table_name='page_visits')
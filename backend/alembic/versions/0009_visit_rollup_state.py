@@ -0,0 +1,48 @@
+"""add visit_rollup_state for the background roll-up of visit_events
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    state = op.create_table(
+        'visit_rollup_state',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('last_event_id', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # Events logged so far were rolled up as they were written.
+    last_id = bind.execute(sa.text('SELECT COALESCE(max(id), 0) FROM visit_events')).scalar()
+    op.bulk_insert(state, [{'name': 'visit_rollups', 'last_event_id': last_id, 'updated_at': datetime.utcnow()}])
+    if bind.dialect.name == 'sqlite':
+        # Without AUTOINCREMENT, SQLite hands out the ids of deleted rows
+        # again, and the roll-up would skip events below its high-water mark.
+        with op.batch_alter_table('visit_events', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        with op.batch_alter_table('visit_events', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
+    op.drop_table('visit_rollup_state')
@@ -0,0 +1,174 @@
+import math
+import zlib
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch of the number of distinct 64-bit hashes added to it.
+
+    2**precision registers each keep the longest run of leading zeros seen
+    among the hashes routed to them; the relative standard error is about
+    1.04 / sqrt(2**precision) (0.8% at precision 14, for 16 KB of
+    registers). Sketches with the same precision merge by taking the
+    maximum of each register, so the merge of two sketches estimates the
+    size of the union of their inputs.
+
+    Small sketches keep their registers in a dict and switch to a dense
+    byte array once that would be larger. The estimate uses Ertl's improved
+    estimator ("New cardinality estimation algorithms for HyperLogLog
+    sketches", 2017), which is unbiased from empty to very large
+    cardinalities without empirical correction tables.
+    """
+
+    def __init__(self, precision: int = 14):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.precision = precision
+        self.size = 1 << precision
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+        self._sparse: Optional[Dict[int, int]] = {}
+        self._dense: Optional[bytearray] = None
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.size)
+
+    def add_hash(self, value: int) -> bool:
+        """Add a 64-bit hash (signed or unsigned). Returns True if a register changed."""
+        value &= 0xFFFFFFFFFFFFFFFF
+        index = value >> self._shift
+        rest = value & self._mask
+        # Leading zeros of the remaining bits, plus one; all zeros gives the maximum.
+        rank = self._shift - rest.bit_length() + 1
+        if self._dense is not None:
+            if rank > self._dense[index]:
+                self._dense[index] = rank
+                return True
+            return False
+        if rank > self._sparse.get(index, 0):
+            self._sparse[index] = rank
+            # A dict entry takes well over the dense array's byte per register.
+            if len(self._sparse) > self.size // 64:
+                self._densify()
+            return True
+        return False
+
+    def _densify(self) -> None:
+        dense = bytearray(self.size)
+        for index, rank in self._sparse.items():
+            dense[index] = rank
+        self._dense = dense
+        self._sparse = None
+
+    def registers(self) -> bytes:
+        """All registers, one byte each."""
+        if self._dense is None:
+            self._densify()
+        return bytes(self._dense)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Fold `other` into this sketch (the union of both inputs)."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precisions")
+        if other._dense is None:
+            for index, rank in other._sparse.items():
+                self._merge_register(index, rank)
+            return
+        self.merge_registers(other._dense)
+
+    def _merge_register(self, index: int, rank: int) -> None:
+        if self._dense is not None:
+            if rank > self._dense[index]:
+                self._dense[index] = rank
+        elif rank > self._sparse.get(index, 0):
+            self._sparse[index] = rank
+            if len(self._sparse) > self.size // 64:
+                self._densify()
+
+    def merge_registers(self, registers: bytes) -> None:
+        """Fold in the registers of a sketch with the same precision, as returned by registers()."""
+        import numpy as np
+
+        if len(registers) != self.size:
+            raise ValueError("Cannot merge sketches with different precisions")
+        if self._dense is None:
+            self._densify()
+        merged = np.maximum(np.frombuffer(self._dense, dtype=np.uint8), np.frombuffer(registers, dtype=np.uint8))
+        self._dense = bytearray(merged.tobytes())
+
+    def _register_counts(self) -> "np.ndarray":
+        import numpy as np
+
+        counts = np.zeros(self._shift + 2, dtype=np.int64)
+        if self._dense is not None:
+            counts += np.bincount(np.frombuffer(self._dense, dtype=np.uint8), minlength=self._shift + 2)
+        else:
+            counts[0] = self.size - len(self._sparse)
+            for rank in self._sparse.values():
+                counts[rank] += 1
+        return counts
+
+    def estimate(self) -> float:
+        """Estimated number of distinct hashes added."""
+        counts = self._register_counts()
+        m = self.size
+        q = self._shift
+        z = m * _tau(1 - counts[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + counts[k])
+        z += m * _sigma(counts[0] / m)
+        return float(m * m / (2 * math.log(2) * z))
+
+    def to_bytes(self) -> bytes:
+        """Compact encoding for storage: the zlib-compressed registers."""
+        return zlib.compress(self.registers(), 6)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int) -> "HyperLogLog":
+        sketch = cls(precision)
+        registers = zlib.decompress(data)
+        if len(registers) != sketch.size:
+            raise ValueError("Stored sketch does not match its precision")
+        sketch._dense = bytearray(registers)
+        sketch._sparse = None
+        return sketch
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], precision: int) -> "HyperLogLog":
+        merged = cls(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+def _sigma(x: float) -> float:
+    if x == 1:
+        return math.inf
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+def _tau(x: float) -> float:
+    if x == 0 or x == 1:
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
@@ -0,0 +1,149 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, IO, Optional
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+def _parse_sample_rates(raw: str) -> Dict[str, float]:
+    """Parse "logger=rate,logger=rate" (e.g. "app.services.analytics_service=0.01")."""
+    rates = {}
+    for item in raw.split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records at INFO and below from selected
+    loggers. A rate applies to the named logger and its children; the most
+    specific configured name wins. WARNING and above are never dropped.
+    """
+
+    def __init__(self, rates: Dict[str, float], max_level: int = logging.INFO):
+        super().__init__()
+        self.rates = dict(rates)
+        self.max_level = max_level
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            rate = None
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        rate = self._rate(record.name)
+        return rate is None or random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger and message."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records, and counts them, when the queue is full instead of blocking."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare() formats the message on the caller's thread
+        # and strips args and exc_info. Queue a copy as is instead, so the
+        # listener's formatter does the work and can still add "exception".
+        return copy.copy(record)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging(
+    level: Optional[str] = None,
+    log_format: Optional[str] = None,
+    use_queue: Optional[bool] = None,
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: Optional[int] = None,
+    stream: Optional[IO[str]] = None,
+) -> logging.Handler:
+    """
+    Replace the root logger's handlers. Arguments default to LOG_LEVEL,
+    LOG_FORMAT (text or json), LOG_QUEUE, LOG_SAMPLE_RATES and LOG_QUEUE_SIZE.
+
+    With the queue on, the root handler only puts records on a bounded queue;
+    a QueueListener thread formats and writes them, so slow output never
+    blocks the event loop. Records are dropped when the queue is full. Returns
+    the handler installed on the root logger.
+    """
+    global _listener
+    level = (level or os.getenv("LOG_LEVEL", "info")).upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT", "text")).lower()
+    if use_queue is None:
+        use_queue = os.getenv("LOG_QUEUE", "true").lower() in ("1", "true", "yes")
+    if sample_rates is None:
+        sample_rates = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+    if queue_size is None:
+        queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    if use_queue:
+        handler: logging.Handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+    else:
+        handler = output
+    if sample_rates:
+        # Sampling before the queue also skips formatting of dropped records.
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
+
+def shutdown_logging() -> None:
+    """Stop the queue listener, writing out every record still queued."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,303 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Prometheus text exposition format version served by GET /metrics.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _ShardedMetric:
+    """
+    Base for metrics that are written without locks: every thread records into
+    its own shard (a dict of label values -> series), so a shard only ever has
+    one writer. Scrapes sum the shards; a scrape racing a write may miss that
+    write, but never corrupts a shard.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Labels, list]] = []
+
+    def _shard(self) -> Dict[Labels, list]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # list.append is atomic, so registering a new thread's shard needs no lock.
+            self._shards.append(shard)
+        return shard
+
+    def _merged(self) -> Dict[Labels, list]:
+        merged: Dict[Labels, list] = {}
+        for shard in list(self._shards):
+            for labels, series in list(shard.items()):
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(series)
+                else:
+                    for i, value in enumerate(series):
+                        total[i] += value
+        return merged
+
+    def clear(self) -> None:
+        for shard in list(self._shards):
+            shard.clear()
+
+    def collect(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+class Histogram(_ShardedMetric):
+    """Cumulative-bucket latency histogram, exported with _bucket, _sum and _count series."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # One count per bucket, one for +Inf, then the sum of observations.
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def collect(self) -> List[str]:
+        lines = super().collect()
+        for labels, series in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+class Gauge(_ShardedMetric):
+    """Gauge moved up and down with inc()/dec(), e.g. in-flight requests."""
+
+    type_name = "gauge"
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            series = shard[labels] = [0]
+        series[0] += amount
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def collect(self) -> List[str]:
+        lines = super().collect()
+        for labels, series in sorted(self._merged().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(series[0])}")
+        return lines
+
+class CallbackGauge:
+    """Gauge whose values are read from `callback` (label values -> value) at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Tuple[Labels, float]]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def clear(self) -> None:
+        pass
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for labels, value in self.callback():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of the response.",
+    ("method", "handler", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled.",
+    ("method",),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing a SQL statement on the database cursor.",
+    ("engine", "operation"),
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool, including opening new ones.",
+    ("engine",),
+)
+
+# Engines whose pools are reported by the db_pool_* gauges, by engine label.
+_instrumented_pools: Dict[str, Callable[[], object]] = {}
+
+def _pool_samples(attribute: str):
+    def collect():
+        for label, get_pool in sorted(_instrumented_pools.items()):
+            pool = get_pool()
+            if not hasattr(pool, "checkedout"):
+                continue
+            capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+            values = {
+                "checked_out": pool.checkedout(),
+                "size": capacity,
+                "utilization": pool.checkedout() / capacity if capacity else 0.0,
+            }
+            yield (label,), values[attribute]
+    return collect
+
+DB_POOL_CHECKED_OUT = CallbackGauge(
+    "db_pool_connections_checked_out", "Connections currently checked out of the pool.",
+    ("engine",), _pool_samples("checked_out"),
+)
+DB_POOL_CAPACITY = CallbackGauge(
+    "db_pool_connections_max", "Pool size plus allowed overflow.",
+    ("engine",), _pool_samples("size"),
+)
+DB_POOL_UTILIZATION = CallbackGauge(
+    "db_pool_utilization_ratio", "Checked-out connections as a fraction of the pool's maximum.",
+    ("engine",), _pool_samples("utilization"),
+)
+
+REGISTRY = [
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_FLIGHT,
+    DB_QUERY_DURATION,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CAPACITY,
+    DB_POOL_UTILIZATION,
+]
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    lines.append("")
+    return "\n".join(lines)
+
+class MeteredAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waits for a connection."""
+
+    metrics_label = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, (self.metrics_label,))
+
+def _operation(statement: str) -> str:
+    """The leading SQL keyword, e.g. SELECT or INSERT, used as a low-cardinality label."""
+    keyword = statement.lstrip()[:8].split(None, 1)
+    return keyword[0].upper() if keyword else "OTHER"
+
+def instrument_engine(engine: AsyncEngine, label: str = "default") -> None:
+    """
+    Record query timings and pool usage of `engine` under the engine label
+    `label`. A no-op when METRICS_ENABLED is off.
+    """
+    if not METRICS_ENABLED:
+        return
+    sync_engine = engine.sync_engine
+    if isinstance(sync_engine.pool, MeteredAsyncAdaptedQueuePool):
+        sync_engine.pool.metrics_label = label
+    _instrumented_pools[label] = lambda: sync_engine.pool
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        start: Optional[float] = getattr(context, "_metrics_query_start", None)
+        if start is not None:
+            DB_QUERY_DURATION.observe(time.perf_counter() - start, (label, _operation(statement)))
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency by method, handler (the name of
+    the matched route, e.g. get_visit_by_url) and status code, and the number
+    of requests in flight.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc((method,))
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec((method,))
+            # The router stores the matched route in the scope. Labelling by
+            # route rather than path keeps /url/{url:path} to one series.
+            handler = getattr(scope.get("route"), "name", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, (method, handler, str(status_code)))
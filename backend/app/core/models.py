@@ -1,16 +1,132 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import BigInteger, Column, Date, Integer, LargeBinary, String, DateTime, Index
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
+from app.core.urls import url_host
+
 Base = declarative_base()
 
+def _default_host(context) -> str:
+    return url_host(context.get_current_parameters()["url"])
+
 class PageVisit(Base):
     __tablename__ = 'page_visits'
     
-    # Use URL as the primary key
-    url = Column(String, primary_key=True, index=True)
+    # Keyed by a 64-bit hash of the normalized URL (see app.core.urls); the
+    # URL itself is payload, so the primary key index stays small.
+    url_hash = Column(BigInteger, primary_key=True, autoincrement=False)
+    url = Column(String, nullable=False)
+    # Host of the URL, extracted once when the row is written (see
+    # app.core.urls.url_host) so /domains never parses URLs.
+    host = Column(String, default=_default_host, nullable=False)
     datetime_visited = Column(DateTime, default=datetime.utcnow, nullable=False)
     link_count = Column(Integer, nullable=False)
     word_count = Column(Integer, nullable=False)
     image_count = Column(Integer, nullable=False)
     total_visits = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        # Backs keyset pagination of /history, ordered by (datetime_visited, url_hash).
+        Index("ix_page_visits_datetime_visited_url_hash", "datetime_visited", "url_hash"),
+        # Backs the per-host GROUP BY of /domains. The aggregated columns are
+        # part of the index, so the query reads the index alone.
+        Index("ix_page_visits_host", "host", "total_visits", "link_count", "word_count", "image_count"),
+        # Backs the reload of the in-memory top-K of /top, read backwards.
+        Index("ix_page_visits_total_visits_url_hash", "total_visits", "url_hash"),
+    )
+
+class VisitEvent(Base):
+    __tablename__ = 'visit_events'
+
+    # Append-only log of visits; rows are never updated. A row written for a
+    # coalesced batch stands for visit_count visits sharing the same metrics.
+    # Ids only grow (AUTOINCREMENT on SQLite, so they are not reused once
+    # retention empties the table); the rollups are filled in id order.
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    url_hash = Column(BigInteger, nullable=False)
+    url = Column(String, nullable=False)
+    visited_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    visit_count = Column(Integer, default=1, nullable=False)
+    link_count = Column(Integer, nullable=False)
+    word_count = Column(Integer, nullable=False)
+    image_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Backs retention, which ages out events by visited_at. On PostgreSQL
+        # the table is range-partitioned by month on visited_at (migration 0005).
+        Index("ix_visit_events_visited_at", "visited_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+class PageVisitArchive(Base):
+    __tablename__ = 'page_visits_archive'
+
+    # page_visits rows aged out by retention. A page that is visited again
+    # and ages out a second time is archived again under a later
+    # datetime_visited.
+    url_hash = Column(BigInteger, primary_key=True, autoincrement=False)
+    datetime_visited = Column(DateTime, primary_key=True)
+    url = Column(String, nullable=False)
+    link_count = Column(Integer, nullable=False)
+    word_count = Column(Integer, nullable=False)
+    image_count = Column(Integer, nullable=False)
+    total_visits = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class VisitEventArchive(Base):
+    __tablename__ = 'visit_events_archive'
+
+    # visit_events rows aged out by retention, keeping their ids.
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=False)
+    url_hash = Column(BigInteger, nullable=False)
+    url = Column(String, nullable=False)
+    visited_at = Column(DateTime, nullable=False)
+    visit_count = Column(Integer, nullable=False)
+    link_count = Column(Integer, nullable=False)
+    word_count = Column(Integer, nullable=False)
+    image_count = Column(Integer, nullable=False)
+
+class UniqueVisitSketch(Base):
+    __tablename__ = 'unique_visit_sketches'
+
+    # HyperLogLog registers (zlib-compressed, see app.core.hyperloglog) of
+    # the distinct pages ("pages") or hosts ("hosts") visited on a day,
+    # across all sites (scope "") or for one host (scope = the host).
+    day = Column(Date, primary_key=True)
+    counter = Column(String, primary_key=True)
+    scope = Column(String, primary_key=True)
+    precision = Column(Integer, nullable=False)
+    registers = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class VisitRollupMixin:
+    """Columns shared by the time-bucketed rollups of visit_events."""
+    bucket_start = Column(DateTime, primary_key=True)
+    url_hash = Column(BigInteger, primary_key=True, autoincrement=False)
+    visits = Column(Integer, default=0, nullable=False)
+    link_count_sum = Column(BigInteger, default=0, nullable=False)
+    word_count_sum = Column(BigInteger, default=0, nullable=False)
+    image_count_sum = Column(BigInteger, default=0, nullable=False)
+
+class VisitRollupState(Base):
+    __tablename__ = 'visit_rollup_state'
+
+    # High-water mark of the background roll-up: every visit_events row up
+    # to last_event_id has been added to the rollups (or skipped as a gap).
+    name = Column(String, primary_key=True)
+    last_event_id = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class HourlyVisitRollup(VisitRollupMixin, Base):
+    __tablename__ = 'visit_rollups_hourly'
+
+    __table_args__ = (
+        Index("ix_visit_rollups_hourly_url_hash_bucket_start", "url_hash", "bucket_start"),
+    )
+
+class DailyVisitRollup(VisitRollupMixin, Base):
+    __tablename__ = 'visit_rollups_daily'
+
+    __table_args__ = (
+        Index("ix_visit_rollups_daily_url_hash_bucket_start", "url_hash", "bucket_start"),
+    )
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ConfigDict
-from datetime import datetime
-from typing import List
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
 class VisitBase(BaseModel):
     url: str
@@ -25,3 +25,97 @@ class Visit(VisitBase):
 
 class PageVisitHistoryResponse(BaseModel):
     visits: List[Visit]
+    next_cursor: Optional[str] = None
+
+class VisitBatchItemResult(BaseModel):
+    index: int
+    url: Optional[str] = None
+    accepted: bool
+    visit: Optional[Visit] = None
+    error: Optional[str] = None
+
+class VisitBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[VisitBatchItemResult]
+
+class TimeseriesPoint(BaseModel):
+    bucket_start: datetime
+    visits: int
+    avg_link_count: float
+    avg_word_count: float
+    avg_image_count: float
+
+class TimeseriesResponse(BaseModel):
+    granularity: str
+    start: datetime
+    end: datetime
+    url: Optional[str] = None
+    points: List[TimeseriesPoint]
+
+class VisitRangeBucket(BaseModel):
+    bucket_start: datetime
+    bucket_end: datetime
+    count: int
+    link_count_sum: int
+    link_count_max: int
+    word_count_sum: int
+    word_count_max: int
+    image_count_sum: int
+    image_count_max: int
+    total_visits_sum: int
+    total_visits_max: int
+
+class VisitRangeResponse(BaseModel):
+    start: datetime
+    end: datetime
+    bucket_seconds: Optional[float] = None
+    buckets: Optional[List[VisitRangeBucket]] = None
+    visits: Optional[List[Visit]] = None
+    next_cursor: Optional[str] = None
+
+class TopVisitsResponse(BaseModel):
+    k: int
+    exact: bool
+    visits: List[Visit]
+
+class UniqueCountsDay(BaseModel):
+    day: date
+    pages: int
+    hosts: Optional[int] = None
+
+class UniqueCountsResponse(BaseModel):
+    start: date
+    end: date
+    host: Optional[str] = None
+    pages: int
+    hosts: Optional[int] = None
+    relative_error: float
+    days: List[UniqueCountsDay]
+
+class DomainStats(BaseModel):
+    host: str
+    pages: int
+    visits: int
+    avg_link_count: float
+    avg_word_count: float
+    avg_image_count: float
+
+class HistogramStats(BaseModel):
+    bin_edges: List[float]
+    counts: List[int]
+
+class ColumnStats(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    percentiles: Dict[str, float]
+    histogram: HistogramStats
+
+class VisitStatsResponse(BaseModel):
+    count: int
+    refreshed_at: Optional[datetime] = None
+    high_water: Optional[datetime] = None
+    columns: Dict[str, ColumnStats]
@@ -0,0 +1,74 @@
+import hashlib
+import os
+from typing import FrozenSet, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+# Query parameters that only track where a visit came from. They are dropped
+# during normalization so that the same page is counted on a single row.
+DEFAULT_STRIP_PARAMS = (
+    "utm_source,utm_medium,utm_campaign,utm_term,utm_content,utm_id,"
+    "gclid,dclid,fbclid,msclkid,mc_cid,mc_eid,_ga,_gl,igshid,yclid,ref_src"
+)
+
+def _load_strip_params() -> FrozenSet[str]:
+    raw = os.getenv("URL_STRIP_PARAMS", DEFAULT_STRIP_PARAMS)
+    return frozenset(param.strip().lower() for param in raw.split(",") if param.strip())
+
+STRIP_PARAMS = _load_strip_params()
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str, strip_params: Optional[FrozenSet[str]] = None) -> str:
+    """
+    Canonicalize a URL so near-duplicates share one row: lowercase the scheme
+    and host, drop the default port, strip the fragment, remove tracking query
+    parameters (URL_STRIP_PARAMS) and sort the remaining ones. The path is
+    left untouched because it is case-sensitive on most servers.
+    """
+    if strip_params is None:
+        strip_params = STRIP_PARAMS
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        # Not a parseable URL; count it verbatim rather than rejecting the visit.
+        return url
+
+    netloc = parts.hostname or ""
+    if ":" in netloc:
+        # Restore the brackets urlsplit removes from IPv6 literals.
+        netloc = f"[{netloc}]"
+    if port is not None and port != _DEFAULT_PORTS.get(parts.scheme):
+        netloc += f":{port}"
+    if parts.username or parts.password:
+        userinfo = parts.username or ""
+        if parts.password:
+            userinfo += f":{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    # Work on the raw "key=value" pairs so their encoding is preserved. The
+    # sort is stable, so repeated keys keep their relative order.
+    params = [
+        param for param in parts.query.split("&")
+        if param and param.partition("=")[0].lower() not in strip_params
+    ]
+    params.sort(key=lambda param: param.partition("=")[0])
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path, "&".join(params), ""))
+
+def url_hash(url: str) -> int:
+    """
+    Fixed-width 64-bit key for a normalized URL, as a signed integer so it fits
+    a BIGINT column. The function must never change once rows are keyed by it.
+    """
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+def url_host(url: str) -> str:
+    """
+    Host of a normalized URL, lowercase and without port or credentials, or
+    an empty string for URLs without one. Pages are grouped by it per site.
+    """
+    try:
+        return urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
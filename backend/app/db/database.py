@@ -1,12 +1,16 @@
+import asyncio
 import os
 import logging
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from typing import Any, Dict, Optional
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+from app.core.metrics import MeteredAsyncAdaptedQueuePool, instrument_engine
 from app.core.models import Base
-
-# Load environment variables from .env file
-load_dotenv()
+from app.services.read_your_writes import read_your_writes
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,30 +18,251 @@ logger = logging.getLogger(__name__)
 def get_db_url():
     """Get database URL from environment or use SQLite as fallback."""
     db_url = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
-    logger.info(f"Using database URL: {db_url}")
+    logger.info("Using database URL: %s", db_url)
     return db_url
 
-# Create engine and session factory
-try:
-    engine = create_async_engine(
-        get_db_url(),
-        echo=False,  # Set to True to log SQL
-        future=True
-    )
-    AsyncSessionLocal = sessionmaker(
-        engine, 
-        class_=AsyncSession, 
+def get_read_db_url() -> Optional[str]:
+    """Get the URL of the read replica from the environment, if one is configured."""
+    return os.getenv("DATABASE_READ_URL") or None
+
+# Named engine settings, selected with DB_ENGINE_PROFILE. Pool settings apply
+# to every pooled database; "sqlite_pragmas" are run on each new SQLite
+# connection and "statement_cache_size" sizes the asyncpg prepared-statement
+# cache (set it to 0 behind PgBouncer in transaction mode).
+ENGINE_PROFILES = {
+    # SQLAlchemy and driver defaults, kept for comparison.
+    "stock": {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_pre_ping": False,
+        "pool_recycle": -1,
+        "statement_cache_size": 100,
+        "sqlite_pragmas": {},
+    },
+    # API serving: a moderate pool, connections checked before use and
+    # recycled before server-side idle timeouts close them.
+    "web": {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "statement_cache_size": 500,
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            "busy_timeout": 5000,
+        },
+    },
+    # Write-heavy workers: a larger steady pool and a longer busy timeout so
+    # concurrent SQLite writers queue instead of failing.
+    "ingest": {
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "statement_cache_size": 500,
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            "busy_timeout": 30000,
+            "wal_autocheckpoint": 10000,
+        },
+    },
+    # Behind PgBouncer in transaction pooling mode, where prepared statements
+    # cannot be reused across transactions.
+    "pgbouncer": {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "statement_cache_size": 0,
+        "sqlite_pragmas": {},
+    },
+}
+
+DEFAULT_ENGINE_PROFILE = "web"
+
+def get_engine_profile_name() -> str:
+    """Get the engine profile name from the environment."""
+    return os.getenv("DB_ENGINE_PROFILE", DEFAULT_ENGINE_PROFILE).lower()
+
+def get_engine_kwargs(db_url: str, profile_name: str) -> Dict[str, Any]:
+    """Build create_async_engine() keyword arguments for a profile and database URL."""
+    if profile_name not in ENGINE_PROFILES:
+        raise ValueError(
+            f"Unknown database engine profile {profile_name!r}; expected one of {', '.join(ENGINE_PROFILES)}"
+        )
+    profile = ENGINE_PROFILES[profile_name]
+    url = make_url(db_url)
+    kwargs: Dict[str, Any] = {}
+    # In-memory SQLite uses a single static connection, which takes no pool settings.
+    if not (url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")):
+        kwargs.update(
+            poolclass=MeteredAsyncAdaptedQueuePool,
+            pool_size=profile["pool_size"],
+            max_overflow=profile["max_overflow"],
+            pool_pre_ping=profile["pool_pre_ping"],
+            pool_recycle=profile["pool_recycle"],
+        )
+    if url.get_driver_name() == "asyncpg":
+        kwargs["connect_args"] = {
+            "prepared_statement_cache_size": profile["statement_cache_size"],
+            "statement_cache_size": profile["statement_cache_size"],
+        }
+    return kwargs
+
+def create_engine_for_profile(db_url: str, profile_name: str, **kwargs) -> AsyncEngine:
+    """Create an async engine configured by the named profile."""
+    db_engine = create_async_engine(db_url, **get_engine_kwargs(db_url, profile_name), **kwargs)
+    pragmas = ENGINE_PROFILES[profile_name]["sqlite_pragmas"]
+    if db_engine.dialect.name == "sqlite" and pragmas:
+        @event.listens_for(db_engine.sync_engine, "connect")
+        def apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
+    return db_engine
+
+# The engine is created by init_engine() from the app's lifespan, not when
+# this module is imported, so a pre-forking server can import the app before
+# any connection is opened. With DATABASE_READ_URL set, read-only routes get
+# sessions from a second engine on the replica.
+engine: Optional[AsyncEngine] = None
+AsyncSessionLocal: Optional[sessionmaker] = None
+read_engine: Optional[AsyncEngine] = None
+AsyncReadSessionLocal: Optional[sessionmaker] = None
+
+def get_pool_warmup() -> int:
+    """Get the number of connections to open at startup from the environment."""
+    return int(os.getenv("DB_POOL_WARMUP", "2"))
+
+def _session_factory(db_engine: AsyncEngine) -> sessionmaker:
+    return sessionmaker(
+        db_engine,
+        class_=AsyncSession,
         expire_on_commit=False,
         autoflush=False
     )
-    logger.info("Database engine and session factory created successfully")
-except Exception as e:
-    logger.error(f"Error creating database engine: {str(e)}")
-    raise
+
+def _create_engine() -> AsyncEngine:
+    global engine, AsyncSessionLocal, read_engine, AsyncReadSessionLocal
+    try:
+        engine = create_engine_for_profile(
+            get_db_url(),
+            get_engine_profile_name(),
+            echo=False,  # Set to True to log SQL
+            future=True
+        )
+        instrument_engine(engine)
+        AsyncSessionLocal = _session_factory(engine)
+        read_db_url = get_read_db_url()
+        if read_db_url:
+            read_engine = create_engine_for_profile(read_db_url, get_engine_profile_name(), echo=False, future=True)
+            instrument_engine(read_engine, "replica")
+            AsyncReadSessionLocal = _session_factory(read_engine)
+        logger.info(
+            "Database engine created with the %r profile%s",
+            get_engine_profile_name(), " and a read replica" if read_db_url else ""
+        )
+    except Exception as e:
+        logger.error("Error creating database engine: %s", e)
+        raise
+    return engine
+
+async def warm_up_engine(db_engine: AsyncEngine, connections: int) -> None:
+    """
+    Open up to `connections` pooled connections concurrently and run a
+    trivial query on each, so the first requests do not pay for connecting.
+    Engines without a queue pool (in-memory SQLite) get one connection.
+    """
+    if connections <= 0:
+        return
+    pool = db_engine.pool
+    connections = min(connections, pool.size()) if isinstance(pool, QueuePool) else 1
+    opened = await asyncio.gather(*(db_engine.connect().start() for _ in range(connections)))
+    try:
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in opened))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in opened))
+    logger.info("Database pool warmed up with %s connections", connections)
+
+async def init_engine(warmup: Optional[int] = None) -> AsyncEngine:
+    """
+    Create the engine and session factory (DATABASE_URL, DB_ENGINE_PROFILE),
+    and those of the replica if DATABASE_READ_URL is set, and warm up
+    DB_POOL_WARMUP pooled connections to each. Called on startup.
+    """
+    db_engine = engine if engine is not None else _create_engine()
+    warmup = get_pool_warmup() if warmup is None else warmup
+    await warm_up_engine(db_engine, warmup)
+    if read_engine is not None:
+        await warm_up_engine(read_engine, warmup)
+    return db_engine
+
+async def dispose_engine() -> None:
+    """Close every pooled connection and drop the engines. Called on shutdown."""
+    global engine, AsyncSessionLocal, read_engine, AsyncReadSessionLocal
+    if read_engine is not None:
+        await read_engine.dispose()
+    if engine is not None:
+        await engine.dispose()
+        logger.info("Database engine disposed")
+    engine = None
+    AsyncSessionLocal = None
+    read_engine = None
+    AsyncReadSessionLocal = None
+
+def get_session_factory() -> sessionmaker:
+    """
+    Return the session factory, creating the engine first if the lifespan
+    has not (scripts and tools that use the app without running it).
+    """
+    if AsyncSessionLocal is None:
+        _create_engine()
+    return AsyncSessionLocal
+
+def get_read_session_factory() -> sessionmaker:
+    """Return the replica's session factory, or the primary's when no replica is configured."""
+    factory = get_session_factory()
+    return AsyncReadSessionLocal if AsyncReadSessionLocal is not None else factory
+
+def record_client_write(request: Request) -> None:
+    """
+    Send the reads of the client behind `request` to the primary for the
+    next READ_YOUR_WRITES_WINDOW seconds. Called by routes that write.
+    """
+    if AsyncReadSessionLocal is not None:
+        read_your_writes.record_write(read_your_writes.client_key(request))
 
 async def get_db() -> AsyncSession:
-    """Dependency for getting an async database session."""
-    session = AsyncSessionLocal()
+    """Dependency for getting an async database session on the primary, for routes that write."""
+    session = get_session_factory()()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+def is_replica_session(session: AsyncSession) -> bool:
+    """Whether `session` reads from the replica, which may lag the primary."""
+    return session.info.get("replica", False)
+
+async def get_read_db(request: Request) -> AsyncSession:
+    """
+    Dependency for read-only routes: a session on the replica, or on the
+    primary when no replica is configured or the client wrote within the
+    read-your-writes window. Replica sessions are marked (see
+    is_replica_session).
+    """
+    factory = get_read_session_factory()
+    if factory is not AsyncSessionLocal and read_your_writes.reads_from_primary(read_your_writes.client_key(request)):
+        factory = AsyncSessionLocal
+    session = factory()
+    session.info["replica"] = factory is not AsyncSessionLocal
     try:
         yield session
     finally:
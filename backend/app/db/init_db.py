@@ -1,4 +1,5 @@
 import asyncio
+from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine
 from app.db.database import get_db_url
 from app.core.models import Base
@@ -20,6 +21,7 @@ async def init_db():
 
 def main():
     """Entry point for running database initialization directly."""
+    load_dotenv()
     asyncio.run(init_db())
 
 if __name__ == "__main__":
@@ -1,26 +1,71 @@
 import logging
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+# Read .env before importing the modules that take their settings from the
+# environment when they are imported.
+load_dotenv()
+
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 import traceback
 
+from app.core.compression import COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE, CompressionMiddleware
+from app.core.logging_config import configure_logging
+from app.core.metrics import CONTENT_TYPE, METRICS_ENABLED, MetricsMiddleware, render_metrics
+from app.db.database import dispose_engine, get_session_factory, init_engine
 from app.routers.analytics import analytics_router
-# Import models to ensure they're loaded
-from app.core import models
+from app.services.analytics_service import load_top_visits_service, record_purged_visits, record_written_visits
+from app.services.ingest_buffer import start_ingest_buffer, stop_ingest_buffer
+from app.services.partitions import start_visit_event_partitions, stop_visit_event_partitions
+from app.services.retention import start_retention_job, stop_retention_job
+from app.services.rollups import start_visit_rollups, stop_visit_rollups
+from app.services.unique_counts import start_unique_counters, stop_unique_counters
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# Configure logging (LOG_LEVEL, LOG_FORMAT, LOG_QUEUE, LOG_SAMPLE_RATES)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    On startup, create the database engine, warm up its pool, load the
+    in-memory top-K and start the background workers. On shutdown, stop the workers, flush buffered writes
+    and close every connection.
+    """
+    await init_engine()
+    try:
+        try:
+            async with get_session_factory()() as db:
+                await load_top_visits_service(db)
+        except Exception as e:
+            # GET /top loads it on first use instead.
+            logger.warning("Could not load the top-K on startup: %s", e)
+        await start_ingest_buffer(on_flush=record_written_visits)
+        await start_visit_event_partitions()
+        await start_retention_job(on_purge=record_purged_visits)
+        await start_unique_counters()
+        await start_visit_rollups()
+        try:
+            yield
+        finally:
+            await stop_retention_job()
+            await stop_visit_event_partitions()
+            await stop_ingest_buffer()
+            # After the ingest buffer, so its last flush is counted too.
+            await stop_unique_counters()
+            await stop_visit_rollups()
+    finally:
+        await dispose_engine()
+
 app = FastAPI(
     title="Chrome Extension Analytics API",
     description="API for tracking and analyzing web page visits",
     version="1.0.0",
-    debug=True  # Enable debug mode for development
+    debug=True,  # Enable debug mode for development
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -32,6 +77,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Brotli/gzip compression of responses larger than COMPRESSION_MIN_SIZE bytes
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# Request latency and in-flight metrics, served by GET /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include the analytics router with a prefix
 app.include_router(analytics_router, prefix="/api/analytics")
 
@@ -40,7 +93,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     """
     Handle validation errors (422 Unprocessable Entity)
     """
-    logger.error(f"Validation error: {str(exc)}")
+    logger.error("Validation error: %s", exc)
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": exc.errors(), "body": exc.body},
@@ -51,7 +104,7 @@ async def general_exception_handler(request: Request, exc: Exception):
     """
     Handle all other unexpected errors
     """
-    logger.error(f"Unexpected error: {str(exc)}")
+    logger.error("Unexpected error: %s", exc)
     logger.error(traceback.format_exc())
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -68,3 +121,11 @@ def health_check():
     Health check endpoint for monitoring
     """
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus scrape endpoint: request latency, in-flight requests, query
+    latency and connection pool usage.
+    """
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
@@ -1,45 +1,191 @@
-from datetime import datetime, timezone
-from sqlalchemy import select
+import importlib
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import Integer, bindparam, cast, delete, extract, func, insert, select, text, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
-from app.core.models import PageVisit
+from app.core.models import (
+    PageVisit,
+    PageVisitArchive,
+    VisitEvent,
+    VisitEventArchive,
+    VisitRollupState,
+    UniqueVisitSketch,
+    HourlyVisitRollup,
+    DailyVisitRollup
+)
 from app.core.schemas import VisitCreate
+from app.core.urls import url_hash, url_host
+
+# Modules of the dialect-specific INSERT constructs that support ON CONFLICT
+# ... DO UPDATE, imported on first use so only the dialect in use is loaded.
+_UPSERT_INSERTS = {
+    "postgresql": "sqlalchemy.dialects.postgresql",
+    "sqlite": "sqlalchemy.dialects.sqlite",
+}
+
+def build_visit_row(visit_data: VisitCreate, visited_at: datetime, total_visits: int = 1) -> Dict[str, Any]:
+    """
+    Build the page_visits column values for an incoming visit. The URL is
+    expected to be normalized already; its hash becomes the row key and its
+    host is stored for per-site aggregation.
+    """
+    return {
+        "url_hash": url_hash(visit_data.url),
+        "url": visit_data.url,
+        "host": url_host(visit_data.url),
+        "datetime_visited": visited_at,
+        "link_count": visit_data.link_count,
+        "word_count": visit_data.word_count,
+        "image_count": visit_data.image_count,
+        "total_visits": total_visits,
+    }
+
+def _merge_visits(visits: List[VisitCreate]) -> Dict[str, Dict[str, Any]]:
+    """
+    Collapse visits that share a URL into a single row. The visit counts are
+    summed and the metrics of the last occurrence are kept.
+    """
+    visited_at = datetime.utcnow()
+    merged: Dict[str, Dict[str, Any]] = {}
+    for visit_data in visits:
+        previous = merged.get(visit_data.url)
+        total_visits = previous["total_visits"] + 1 if previous else 1
+        merged[visit_data.url] = build_visit_row(visit_data, visited_at, total_visits)
+    return merged
+
+def _dialect_insert(db: AsyncSession, model):
+    """Return an INSERT for `model` that supports ON CONFLICT on the session's dialect."""
+    dialect_name = db.get_bind().dialect.name
+    module_name = _UPSERT_INSERTS.get(dialect_name)
+    if module_name is None:
+        # Not ValueError: routes answer that with 400, and this is a server misconfiguration.
+        raise RuntimeError(
+            f"Upsert is not supported for dialect {dialect_name!r}; expected one of {', '.join(_UPSERT_INSERTS)}"
+        )
+    return importlib.import_module(module_name).insert(model)
+
+def _upsert_page_visits_statement(db: AsyncSession, rows: List[Dict[str, Any]]):
+    """
+    Build a single INSERT ... ON CONFLICT (url_hash) DO UPDATE ... RETURNING statement
+    for the dialect bound to the session. Existing rows get their total_visits
+    incremented by the incoming count and their metrics overwritten.
+    """
+    stmt = _dialect_insert(db, PageVisit).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PageVisit.url_hash],
+        set_={
+            "total_visits": PageVisit.total_visits + stmt.excluded.total_visits,
+            "datetime_visited": stmt.excluded.datetime_visited,
+            "link_count": stmt.excluded.link_count,
+            "word_count": stmt.excluded.word_count,
+            "image_count": stmt.excluded.image_count,
+        },
+    )
+    return stmt.returning(PageVisit)
+
+def truncate_to_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def truncate_to_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+# Rollup table and bucket truncation for each supported granularity.
+ROLLUP_GRANULARITIES = {
+    "hour": (HourlyVisitRollup, truncate_to_hour),
+    "day": (DailyVisitRollup, truncate_to_day),
+}
+
+def _upsert_rollup_statement(db: AsyncSession, rollup, truncate, events: Sequence[Any]):
+    """
+    Build an upsert that adds visit_events rows to their (bucket_start, url_hash)
+    rollup buckets. The metrics of an event count once for each of its visits.
+    """
+    buckets: Dict[Tuple[datetime, int], Dict[str, Any]] = {}
+    for event in events:
+        key = (truncate(event.visited_at), event.url_hash)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {
+                "bucket_start": key[0],
+                "url_hash": key[1],
+                "visits": 0,
+                "link_count_sum": 0,
+                "word_count_sum": 0,
+                "image_count_sum": 0,
+            }
+        bucket["visits"] += event.visit_count
+        bucket["link_count_sum"] += event.link_count * event.visit_count
+        bucket["word_count_sum"] += event.word_count * event.visit_count
+        bucket["image_count_sum"] += event.image_count * event.visit_count
+
+    stmt = _dialect_insert(db, rollup).values(list(buckets.values()))
+    return stmt.on_conflict_do_update(
+        index_elements=[rollup.bucket_start, rollup.url_hash],
+        set_={
+            "visits": rollup.visits + stmt.excluded.visits,
+            "link_count_sum": rollup.link_count_sum + stmt.excluded.link_count_sum,
+            "word_count_sum": rollup.word_count_sum + stmt.excluded.word_count_sum,
+            "image_count_sum": rollup.image_count_sum + stmt.excluded.image_count_sum,
+        },
+    )
+
+async def _write_visit_rows(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[PageVisit]:
+    """
+    Upsert page_visits rows and append them to the visit event log, in one
+    transaction. Each row's total_visits is the number of visits it stands
+    for. The rollups are filled from the log in the background (see
+    app.services.rollups), so hot buckets are not written per request.
+    """
+    await db.execute(insert(VisitEvent).values([
+        {
+            "url_hash": row["url_hash"],
+            "url": row["url"],
+            "visited_at": row["datetime_visited"],
+            "visit_count": row["total_visits"],
+            "link_count": row["link_count"],
+            "word_count": row["word_count"],
+            "image_count": row["image_count"],
+        }
+        for row in rows
+    ]))
+
+    stmt = _upsert_page_visits_statement(db, rows)
+    result = await db.scalars(stmt, execution_options={"populate_existing": True})
+    records = result.all()
+    await db.commit()
+    return records
 
 async def create_or_update_visit_repository(db: AsyncSession, visit_data: VisitCreate) -> PageVisit:
     """
-    Look for an existing PageVisit record by URL. If found, updates the record by
-    incrementing total_visits and refreshing its metrics; otherwise, creates a new record.
-    """
-    stmt = select(PageVisit).where(PageVisit.url == visit_data.url)
-    result = await db.execute(stmt)
-    existing_visit = result.scalars().first()
-
-    if existing_visit:
-        # Update the existing record.
-        existing_visit.total_visits += 1
-        existing_visit.datetime_visited = datetime.utcnow()  # Using utcnow directly
-        existing_visit.link_count = visit_data.link_count
-        existing_visit.word_count = visit_data.word_count
-        existing_visit.image_count = visit_data.image_count
-
-        await db.commit()
-        await db.refresh(existing_visit)
-        return existing_visit
-    else:
-        # Create a new record with total_visits set to 1.
-        new_visit = PageVisit(
-            url=visit_data.url,
-            datetime_visited=datetime.utcnow(),  # Using utcnow directly
-            link_count=visit_data.link_count,
-            word_count=visit_data.word_count,
-            image_count=visit_data.image_count,
-            total_visits=1
-        )
-        db.add(new_visit)
-        await db.commit()
-        await db.refresh(new_visit)
-        return new_visit
+    Insert a new PageVisit record with total_visits set to 1, or, if the URL is
+    already known, atomically increment total_visits and refresh its metrics.
+    The page_visits write is a single INSERT ... ON CONFLICT ... RETURNING
+    statement, so concurrent first visits to the same URL cannot race on the
+    primary key. The visit is also appended to the event log.
+    """
+    records = await _write_visit_rows(db, [build_visit_row(visit_data, datetime.utcnow())])
+    return records[0]
+
+async def create_or_update_visits_repository(db: AsyncSession, visits: List[VisitCreate]) -> Dict[str, PageVisit]:
+    """
+    Persist a batch of visits with one bulk upsert in a single transaction.
+    Duplicate URLs are merged before reaching the database. Returns the
+    resulting records keyed by URL.
+    """
+    return await upsert_visit_rows_repository(db, list(_merge_visits(visits).values()))
+
+async def upsert_visit_rows_repository(db: AsyncSession, rows: List[Dict[str, Any]]) -> Dict[str, PageVisit]:
+    """
+    Persist pre-merged page_visits rows, one per URL, with one bulk upsert in a
+    single transaction. Each row's total_visits is the increment to apply.
+    Returns the resulting records keyed by URL.
+    """
+    if not rows:
+        return {}
+
+    records = await _write_visit_rows(db, rows)
+    return {record.url: record for record in records}
 
 async def get_current_metrics_repository(db: AsyncSession) -> Optional[PageVisit]:
     """Get the most recent page visit record."""
@@ -48,13 +194,501 @@ async def get_current_metrics_repository(db: AsyncSession) -> Optional[PageVisit
     return result.scalars().first()
 
 async def get_visit_by_url_repository(db: AsyncSession, url: str) -> Optional[PageVisit]:
-    """Get a specific page visit record by URL."""
-    stmt = select(PageVisit).where(PageVisit.url == url)
+    """
+    Get a specific page visit record by normalized URL. The lookup goes through
+    the hashed primary key; comparing the stored URL guards against collisions.
+    """
+    stmt = select(PageVisit).where(PageVisit.url_hash == url_hash(url), PageVisit.url == url)
     result = await db.execute(stmt)
     return result.scalars().first()
 
+# Newest first, with the URL hash as a tie-breaker so the order is total.
+_HISTORY_ORDER = (PageVisit.datetime_visited.desc(), PageVisit.url_hash.desc())
+
+# The columns of the Visit schema, in its field order.
+VISIT_COLUMNS = (
+    PageVisit.url,
+    PageVisit.link_count,
+    PageVisit.word_count,
+    PageVisit.image_count,
+    PageVisit.datetime_visited,
+    PageVisit.total_visits,
+)
+
+# Plain-row history pages: the Visit columns followed by the keyset tie-breaker.
+VISIT_ROW_COLUMNS = VISIT_COLUMNS + (PageVisit.url_hash,)
+
 async def get_all_visits_repository(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[PageVisit]:
-    """Get all page visit records with pagination."""
-    stmt = select(PageVisit).offset(skip).limit(limit)
+    """Get all page visit records with offset pagination."""
+    stmt = select(PageVisit).order_by(*_HISTORY_ORDER).offset(skip).limit(limit)
     result = await db.execute(stmt)
     return result.scalars().all()
+
+async def get_visits_after_repository(
+    db: AsyncSession, after: Optional[Tuple[datetime, int]] = None, limit: int = 100
+) -> List[PageVisit]:
+    """
+    Get page visit records with keyset pagination. `after` is the
+    (datetime_visited, url_hash) of the last record on the previous page; the
+    comparison is served by the composite index instead of skipping rows.
+    """
+    stmt = select(PageVisit).order_by(*_HISTORY_ORDER).limit(limit)
+    if after is not None:
+        stmt = stmt.where(tuple_(PageVisit.datetime_visited, PageVisit.url_hash) < tuple_(*after))
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def get_all_visit_rows_repository(db: AsyncSession, skip: int = 0, limit: int = 100) -> Sequence[Any]:
+    """
+    Like get_all_visits_repository, but returns plain column tuples (see
+    VISIT_ROW_COLUMNS) instead of ORM objects, skipping the identity map.
+    """
+    stmt = select(*VISIT_ROW_COLUMNS).order_by(*_HISTORY_ORDER).offset(skip).limit(limit)
+    result = await db.execute(stmt)
+    return result.all()
+
+async def get_visit_rows_after_repository(
+    db: AsyncSession, after: Optional[Tuple[datetime, int]] = None, limit: int = 100
+) -> Sequence[Any]:
+    """Like get_visits_after_repository, but returns plain column tuples (see VISIT_ROW_COLUMNS)."""
+    stmt = select(*VISIT_ROW_COLUMNS).order_by(*_HISTORY_ORDER).limit(limit)
+    if after is not None:
+        stmt = stmt.where(tuple_(PageVisit.datetime_visited, PageVisit.url_hash) < tuple_(*after))
+    result = await db.execute(stmt)
+    return result.all()
+
+async def lock_rollup_watermark_repository(db: AsyncSession, name: str) -> int:
+    """
+    Get the roll-up high-water mark `name` (0 if it was never set) and lock
+    it for the rest of the transaction, so only one process rolls up at a
+    time: FOR UPDATE on PostgreSQL, the write lock taken by the insert on SQLite.
+    """
+    stmt = _dialect_insert(db, VisitRollupState).values(
+        name=name, last_event_id=0, updated_at=datetime.utcnow()
+    ).on_conflict_do_nothing()
+    await db.execute(stmt)
+    stmt = select(VisitRollupState.last_event_id).where(VisitRollupState.name == name).with_for_update()
+    return (await db.execute(stmt)).scalar_one()
+
+async def set_rollup_watermark_repository(db: AsyncSession, name: str, last_event_id: int) -> None:
+    """Move the roll-up high-water mark `name` locked by lock_rollup_watermark_repository."""
+    stmt = (
+        update(VisitRollupState)
+        .where(VisitRollupState.name == name)
+        .values(last_event_id=last_event_id, updated_at=datetime.utcnow())
+    )
+    await db.execute(stmt)
+
+async def get_visit_events_after_repository(db: AsyncSession, after_id: int, limit: int) -> Sequence[Any]:
+    """Get up to `limit` visit_events rows with an id above `after_id`, in id order."""
+    stmt = (
+        select(
+            VisitEvent.id,
+            VisitEvent.url_hash,
+            VisitEvent.visited_at,
+            VisitEvent.visit_count,
+            VisitEvent.link_count,
+            VisitEvent.word_count,
+            VisitEvent.image_count,
+        )
+        .where(VisitEvent.id > after_id)
+        .order_by(VisitEvent.id)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+async def add_to_rollups_repository(db: AsyncSession, events: Sequence[Any]) -> None:
+    """Add visit_events rows (as read by get_visit_events_after_repository) to the hourly and daily rollups."""
+    if not events:
+        return
+    for rollup, truncate in ROLLUP_GRANULARITIES.values():
+        await db.execute(_upsert_rollup_statement(db, rollup, truncate, events))
+
+async def get_visit_rows_in_range_repository(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    before: Optional[Tuple[datetime, int]] = None,
+    limit: int = 100
+) -> Sequence[Any]:
+    """
+    Get plain column tuples (see VISIT_ROW_COLUMNS) of the pages visited in
+    [start, end), newest first, from a range scan of the
+    (datetime_visited, url_hash) index. `before` is the keyset position of
+    the last row of the previous page.
+    """
+    stmt = (
+        select(*VISIT_ROW_COLUMNS)
+        .where(PageVisit.datetime_visited >= start, PageVisit.datetime_visited < end)
+        .order_by(*_HISTORY_ORDER)
+        .limit(limit)
+    )
+    if before is not None:
+        stmt = stmt.where(tuple_(PageVisit.datetime_visited, PageVisit.url_hash) < tuple_(*before))
+    result = await db.execute(stmt)
+    return result.all()
+
+def _sqlite_bucket_index(column, start: datetime, width: float):
+    # julianday() has millisecond resolution; CAST truncates the
+    # non-negative offsets toward zero.
+    return cast((func.julianday(column) - func.julianday(start)) * 86400.0 / width, Integer)
+
+def _postgresql_bucket_index(column, start: datetime, width: float):
+    return cast(func.floor(extract("epoch", column - start) / width), Integer)
+
+# Expression numbering the buckets of `width` seconds from `start`, per dialect.
+_BUCKET_INDEXES = {
+    "postgresql": _postgresql_bucket_index,
+    "sqlite": _sqlite_bucket_index,
+}
+
+# The metrics /range aggregates per bucket, with their sum and max.
+RANGE_METRICS = (PageVisit.link_count, PageVisit.word_count, PageVisit.image_count, PageVisit.total_visits)
+
+async def get_visit_range_buckets_repository(
+    db: AsyncSession, start: datetime, end: datetime, width: float
+) -> Sequence[Any]:
+    """
+    Aggregate the pages visited in [start, end) into buckets of `width`
+    seconds counted from `start`, in the database: one row per non-empty
+    bucket with its index, the number of pages, and the sum and max of each
+    of RANGE_METRICS (as <metric>_sum and <metric>_max). The rows come from
+    a range scan of the (datetime_visited, url_hash) index.
+    """
+    dialect_name = db.get_bind().dialect.name
+    bucket_index = _BUCKET_INDEXES.get(dialect_name)
+    if bucket_index is None:
+        # Not ValueError: routes answer that with 400, and this is a server misconfiguration.
+        raise RuntimeError(
+            f"Range buckets are not supported for dialect {dialect_name!r}; "
+            f"expected one of {', '.join(_BUCKET_INDEXES)}"
+        )
+    index = bucket_index(PageVisit.datetime_visited, start, width).label("bucket")
+    aggregates = [func.count().label("count")]
+    for column in RANGE_METRICS:
+        aggregates.append(func.sum(column).label(f"{column.key}_sum"))
+        aggregates.append(func.max(column).label(f"{column.key}_max"))
+    stmt = (
+        select(index, *aggregates)
+        .where(PageVisit.datetime_visited >= start, PageVisit.datetime_visited < end)
+        .group_by(index)
+        .order_by(index)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+async def get_visit_timeseries_repository(
+    db: AsyncSession, granularity: str, start: datetime, end: datetime, url: Optional[str] = None
+):
+    """
+    Get visit totals per time bucket in [start, end) from the hourly or daily
+    rollups, optionally for a single normalized URL. Raw visit events are never scanned.
+    """
+    rollup, _ = ROLLUP_GRANULARITIES[granularity]
+    stmt = (
+        select(
+            rollup.bucket_start,
+            func.sum(rollup.visits).label("visits"),
+            func.sum(rollup.link_count_sum).label("link_count_sum"),
+            func.sum(rollup.word_count_sum).label("word_count_sum"),
+            func.sum(rollup.image_count_sum).label("image_count_sum"),
+        )
+        .where(rollup.bucket_start >= start, rollup.bucket_start < end)
+        .group_by(rollup.bucket_start)
+        .order_by(rollup.bucket_start)
+    )
+    if url is not None:
+        stmt = stmt.where(rollup.url_hash == url_hash(url))
+    result = await db.execute(stmt)
+    return result.all()
+
+async def get_top_visits_repository(db: AsyncSession, limit: int) -> List[PageVisit]:
+    """
+    Get the `limit` most visited pages, most visited first. Read from the end
+    of the (total_visits, url_hash) index, so only `limit` rows are touched.
+    """
+    stmt = select(PageVisit).order_by(PageVisit.total_visits.desc(), PageVisit.url_hash.desc()).limit(limit)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+# (day, counter, scope) of a stored distinct-count sketch.
+SketchKey = Tuple[date, str, str]
+
+# Sketch keys per statement, well below SQLite's limit on bound parameters.
+SKETCH_KEYS_PER_STATEMENT = 500
+
+async def get_unique_sketches_repository(
+    db: AsyncSession, counter: str, scope: str, start: date, end: date
+) -> Sequence[Any]:
+    """Get the stored (day, precision, registers) of a counter for the days in [start, end]."""
+    stmt = (
+        select(UniqueVisitSketch.day, UniqueVisitSketch.precision, UniqueVisitSketch.registers)
+        .where(
+            UniqueVisitSketch.counter == counter,
+            UniqueVisitSketch.scope == scope,
+            UniqueVisitSketch.day >= start,
+            UniqueVisitSketch.day <= end,
+        )
+        .order_by(UniqueVisitSketch.day)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+async def lock_unique_sketches_repository(
+    db: AsyncSession, keys: List[SketchKey], precision: int
+) -> Dict[SketchKey, Tuple[int, bytes]]:
+    """
+    Make sure a sketch row exists for each key and lock them for the rest of
+    the transaction, returning the stored (precision, registers) per key;
+    new rows have empty registers. Inserting the missing rows takes the
+    database's write lock on SQLite, and FOR UPDATE locks the rows on
+    PostgreSQL, so concurrent writers merge one after another.
+    """
+    now = datetime.utcnow()
+    key_columns = (UniqueVisitSketch.day, UniqueVisitSketch.counter, UniqueVisitSketch.scope)
+    stored: Dict[SketchKey, Tuple[int, bytes]] = {}
+    for offset in range(0, len(keys), SKETCH_KEYS_PER_STATEMENT):
+        chunk = keys[offset:offset + SKETCH_KEYS_PER_STATEMENT]
+        stmt = _dialect_insert(db, UniqueVisitSketch).values([
+            {"day": day, "counter": counter, "scope": scope, "precision": precision, "registers": b"", "updated_at": now}
+            for day, counter, scope in chunk
+        ]).on_conflict_do_nothing()
+        await db.execute(stmt)
+        stmt = (
+            select(*key_columns, UniqueVisitSketch.precision, UniqueVisitSketch.registers)
+            .where(tuple_(*key_columns).in_(chunk))
+            .with_for_update()
+        )
+        result = await db.execute(stmt)
+        stored.update({(row.day, row.counter, row.scope): (row.precision, row.registers) for row in result})
+    return stored
+
+async def update_unique_sketches_repository(
+    db: AsyncSession, sketches: Dict[SketchKey, Tuple[int, bytes]]
+) -> None:
+    """Store (precision, registers) for sketch rows locked by lock_unique_sketches_repository."""
+    if not sketches:
+        return
+    table = UniqueVisitSketch.__table__
+    stmt = (
+        update(table)
+        .where(
+            table.c.day == bindparam("key_day"),
+            table.c.counter == bindparam("key_counter"),
+            table.c.scope == bindparam("key_scope"),
+        )
+        .values(precision=bindparam("new_precision"), registers=bindparam("new_registers"), updated_at=bindparam("now"))
+    )
+    now = datetime.utcnow()
+    await db.execute(stmt, [
+        {
+            "key_day": day, "key_counter": counter, "key_scope": scope,
+            "new_precision": precision, "new_registers": registers, "now": now,
+        }
+        for (day, counter, scope), (precision, registers) in sketches.items()
+    ])
+
+# Sort orders of /domains: most visits, most pages, or host name.
+DOMAIN_SORTS = ("visits", "pages", "host")
+
+async def get_domain_stats_repository(
+    db: AsyncSession, sort: str = "visits", skip: int = 0, limit: int = 100
+) -> Sequence[Any]:
+    """
+    Get the number of pages, the visit total and the average page metrics per
+    host, with offset pagination. A single GROUP BY over the stored host
+    column, read from ix_page_visits_host.
+    """
+    visits = func.sum(PageVisit.total_visits).label("visits")
+    pages = func.count().label("pages")
+    # Ties are broken by host, so pages never overlap.
+    order_by = {
+        "visits": (visits.desc(), PageVisit.host),
+        "pages": (pages.desc(), PageVisit.host),
+        "host": (PageVisit.host,),
+    }[sort]
+    stmt = (
+        select(
+            PageVisit.host,
+            pages,
+            visits,
+            func.avg(PageVisit.link_count).label("avg_link_count"),
+            func.avg(PageVisit.word_count).label("avg_word_count"),
+            func.avg(PageVisit.image_count).label("avg_image_count"),
+        )
+        .group_by(PageVisit.host)
+        .order_by(*order_by)
+        .offset(skip)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+# Columns of an exported visit, in the order of the Visit schema.
+EXPORT_COLUMNS = VISIT_COLUMNS
+
+async def stream_visits_repository(db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[Sequence[Any]]:
+    """
+    Stream every page visit as plain column tuples (see EXPORT_COLUMNS), in
+    batches of `batch_size`, through a server-side cursor. No ORM objects are
+    built and at most one batch is held in memory.
+    """
+    stmt = (
+        select(*EXPORT_COLUMNS)
+        .order_by(PageVisit.url_hash)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    result = await db.stream(stmt)
+    try:
+        async for partition in result.partitions(batch_size):
+            yield partition
+    finally:
+        await result.close()
+
+STATS_COLUMNS = (
+    PageVisit.url_hash,
+    PageVisit.datetime_visited,
+    PageVisit.word_count,
+    PageVisit.link_count,
+    PageVisit.image_count,
+    PageVisit.total_visits,
+)
+
+async def stream_visit_stats_repository(
+    db: AsyncSession, since: Optional[datetime] = None, batch_size: int = 50000
+) -> AsyncIterator[Sequence[Any]]:
+    """
+    Stream the numeric columns of page visits (see STATS_COLUMNS) visited at
+    or after `since`, oldest first, in batches of `batch_size`.
+    """
+    stmt = (
+        select(*STATS_COLUMNS)
+        .order_by(PageVisit.datetime_visited)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    if since is not None:
+        stmt = stmt.where(PageVisit.datetime_visited >= since)
+    result = await db.stream(stmt)
+    try:
+        async for partition in result.partitions(batch_size):
+            yield partition
+    finally:
+        await result.close()
+
+# Retention: rows are moved out in small batches, each its own short
+# transaction committed by the caller, so no statement holds locks for long.
+RETENTION_TABLES = {
+    "page_visits": (PageVisit.__table__, PageVisit.datetime_visited, PageVisit.url_hash, PageVisitArchive.__table__),
+    "visit_events": (VisitEvent.__table__, VisitEvent.visited_at, VisitEvent.id, VisitEventArchive.__table__),
+}
+
+async def delete_expired_rows_repository(
+    db: AsyncSession, table_name: str, cutoff: datetime, batch_size: int = 1000
+) -> List[Dict[str, Any]]:
+    """
+    Delete up to `batch_size` of the oldest rows of `table_name` (page_visits
+    or visit_events) dated before `cutoff`, and return them as dicts. The
+    transaction is left open, so the caller can archive the rows before it
+    commits.
+    """
+    table, dated, key, _ = RETENTION_TABLES[table_name]
+    oldest = select(key).where(dated < cutoff).order_by(dated).limit(batch_size)
+    # Re-checking the date skips rows refreshed by a write since the subquery ran.
+    stmt = delete(table).where(key.in_(oldest.scalar_subquery()), dated < cutoff).returning(*table.c)
+    result = await db.execute(stmt)
+    return [dict(row) for row in result.mappings()]
+
+async def archive_rows_repository(db: AsyncSession, table_name: str, rows: List[Dict[str, Any]]) -> None:
+    """Insert rows removed from `table_name` into its archive table, in the caller's transaction."""
+    if not rows:
+        return
+    archive = RETENTION_TABLES[table_name][3]
+    await db.execute(insert(archive), [
+        {column.name: row[column.name] for column in archive.c if column.name in row}
+        for row in rows
+    ])
+
+def visit_event_partition_name(month: datetime) -> str:
+    return f"visit_events_p{month:%Y%m}"
+
+async def is_visit_events_partitioned_repository(db: AsyncSession) -> bool:
+    """Whether visit_events is a partitioned PostgreSQL table (see migration 0005)."""
+    if db.bind.dialect.name != "postgresql":
+        return False
+    result = await db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'visit_events' AND c.relnamespace = to_regnamespace(current_schema())"
+    ))
+    return result.first() is not None
+
+# Partition of visit_events for rows no monthly partition covers (migration 0005).
+VISIT_EVENTS_DEFAULT_PARTITION = "visit_events_default"
+
+async def create_visit_event_partition_repository(db: AsyncSession, month: datetime) -> int:
+    """
+    Create the monthly partition of visit_events starting at `month` (the
+    first of a month), if missing. Rows of that month already in the default
+    partition would make CREATE ... PARTITION OF fail, so they are moved
+    into the new table before it is attached. Returns the number of rows
+    moved. Creators are serialized with a transaction-level advisory lock.
+    """
+    name = visit_event_partition_name(month)
+    next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    bounds = f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+    await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('visit_events_partitions'))"))
+    if (await db.execute(text("SELECT to_regclass(:name)"), {"name": name})).scalar() is not None:
+        return 0
+    in_month = "visited_at >= :start AND visited_at < :end"
+    params = {"start": month, "end": next_month}
+    stray = await db.execute(
+        text(f"SELECT 1 FROM {VISIT_EVENTS_DEFAULT_PARTITION} WHERE {in_month} LIMIT 1"), params
+    )
+    if stray.first() is None:
+        await db.execute(text(f"CREATE TABLE {name} PARTITION OF visit_events {bounds}"))
+        return 0
+    columns = ", ".join(column.name for column in VisitEvent.__table__.columns)
+    await db.execute(text(f"CREATE TABLE {name} (LIKE visit_events INCLUDING DEFAULTS)"))
+    moved = await db.execute(text(
+        f"WITH moved AS (DELETE FROM {VISIT_EVENTS_DEFAULT_PARTITION} WHERE {in_month} RETURNING {columns}) "
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+    ), params)
+    # Attaching builds the partition's indexes and checks the default holds
+    # no more rows of the month.
+    await db.execute(text(f"ALTER TABLE visit_events ATTACH PARTITION {name} {bounds}"))
+    return moved.rowcount
+
+async def get_visit_event_partitions_repository(db: AsyncSession) -> List[Tuple[str, Optional[datetime]]]:
+    """
+    Return (name, upper bound) of each partition of visit_events. The upper
+    bound is None for the default partition.
+    """
+    result = await db.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'visit_events'::regclass"
+    ))
+    partitions = []
+    for name, bound in result.all():
+        if bound == "DEFAULT":
+            partitions.append((name, None))
+            continue
+        # FOR VALUES FROM ('2026-09-01 00:00:00') TO ('2026-10-01 00:00:00')
+        upper = bound.rsplit("TO ('", 1)[1].split("'", 1)[0]
+        partitions.append((name, datetime.fromisoformat(upper)))
+    return partitions
+
+async def detach_visit_event_partition_repository(db: AsyncSession, name: str) -> None:
+    """Detach a partition from visit_events; its rows leave the table at once."""
+    await db.execute(text(f"ALTER TABLE visit_events DETACH PARTITION {name}"))
+
+async def move_detached_partition_rows_repository(
+    db: AsyncSession, name: str, batch_size: int = 1000
+) -> List[Dict[str, Any]]:
+    """Delete and return up to `batch_size` rows of a detached visit_events partition."""
+    result = await db.execute(text(
+        f"DELETE FROM {name} WHERE id IN (SELECT id FROM {name} ORDER BY id LIMIT :batch_size) RETURNING *"
+    ), {"batch_size": batch_size})
+    return [dict(row) for row in result.mappings()]
+
+async def drop_detached_partition_repository(db: AsyncSession, name: str) -> None:
+    await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
@@ -1,64 +1,287 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date, datetime
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 import logging
+import os
 from pydantic import ValidationError
 
-from app.db.database import get_db
-from app.core.schemas import VisitCreate, Visit
+from app.db.database import get_db, get_read_db, is_replica_session, record_client_write
+from app.core.schemas import (
+    VisitCreate,
+    Visit,
+    VisitBatchItemResult,
+    VisitBatchResponse,
+    PageVisitHistoryResponse,
+    DomainStats,
+    TopVisitsResponse,
+    UniqueCountsResponse,
+    VisitRangeResponse,
+    TimeseriesResponse,
+    VisitStatsResponse
+)
 from app.services.analytics_service import (
-    create_or_update_visit_service,
+    create_or_update_visit_once_service,
+    create_or_update_visits_service,
+    get_idempotency_stats_service,
+    get_ingest_stats_service,
+    get_retention_stats_service,
+    get_rollup_stats_service,
+    get_stream_stats_service,
+    get_cache_stats_service,
     get_current_metrics_service,
     get_visit_by_url_service,
-    get_all_visits_service
+    get_all_visits_service,
+    get_visits_page_service,
+    get_visit_history_json_service,
+    get_visit_timeseries_service,
+    get_visit_range_service,
+    get_domain_stats_service,
+    get_top_visits_service,
+    get_top_visits_stats_service,
+    get_unique_counts_service,
+    get_unique_counts_stats_service,
+    get_visit_stats_service,
+    get_read_routing_stats_service,
+    export_visits_service,
+    subscribe_visits_service,
+    stream_visit_events_service
 )
+from app.services.data_version import data_version, etag_matches
+from app.services.visit_events import TooManySubscribers
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 analytics_router = APIRouter()
 
+# Serve /history from plain rows encoded with orjson instead of ORM objects
+# validated into Visit models. The response bodies are identical.
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+# Upper bound on items accepted by the batch endpoint, which keeps the bulk
+# upsert below the bind-parameter limits of the supported databases.
+MAX_BATCH_SIZE = 500
+
+# Idle seconds after which /stream sends a keepalive comment.
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
+
 @analytics_router.post("/", response_model=Visit, status_code=status.HTTP_200_OK)
-async def create_or_update_visit(visit_data: VisitCreate, db: AsyncSession = Depends(get_db)):
+async def create_or_update_visit(
+    visit_data: VisitCreate,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Create a new page visit record or update an existing one.
+
+    A repeated `Idempotency-Key` for the same URL within IDEMPOTENCY_WINDOW
+    seconds is not counted again: the stored visit is returned with an
+    `Idempotent-Replayed: true` header.
     """
     try:
-        result = await create_or_update_visit_service(db, visit_data)
+        result, replayed = await create_or_update_visit_once_service(db, visit_data, idempotency_key)
+        record_client_write(request)
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
         return result
     except ValidationError as e:
         # Handle validation errors
-        logger.error(f"Validation error: {str(e)}")
+        logger.error("Validation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=f"Validation error: {str(e)}"
         )
     except Exception as e:
         # Log the exception for debugging
-        logger.exception(f"Error creating/updating visit: {str(e)}")
+        logger.exception("Error creating/updating visit: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process visit data: {str(e)}"
         )
 
+@analytics_router.post("/batch", response_model=VisitBatchResponse, status_code=status.HTTP_200_OK)
+async def create_or_update_visits(
+    request: Request,
+    items: List[Dict[str, Any]] = Body(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Create or update page visit records for a batch of visits in one transaction.
+    Items are validated individually; invalid items are reported as rejected.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch size {len(items)} exceeds the maximum of {MAX_BATCH_SIZE}"
+        )
+
+    results: List[VisitBatchItemResult] = []
+    accepted: List[VisitCreate] = []
+    for index, item in enumerate(items):
+        try:
+            visit_data = VisitCreate.model_validate(item)
+        except ValidationError as e:
+            results.append(VisitBatchItemResult(
+                index=index,
+                url=item.get("url") if isinstance(item.get("url"), str) else None,
+                accepted=False,
+                error=str(e)
+            ))
+            continue
+        accepted.append(visit_data)
+        results.append(VisitBatchItemResult(index=index, url=visit_data.url, accepted=True))
+
+    try:
+        records = await create_or_update_visits_service(db, accepted)
+    except Exception as e:
+        logger.exception("Error creating/updating visit batch: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to process visit batch: {str(e)}"
+        )
+    record_client_write(request)
+
+    accepted_results = [item_result for item_result in results if item_result.accepted]
+    for item_result, record in zip(accepted_results, records):
+        item_result.visit = Visit.model_validate(record, from_attributes=True)
+
+    return VisitBatchResponse(
+        accepted=len(accepted),
+        rejected=len(results) - len(accepted),
+        results=results
+    )
+
+@analytics_router.get("/ingest/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_ingest_stats():
+    """
+    Get queue depth and flush latency numbers for the write-behind ingest buffer.
+    """
+    return get_ingest_stats_service()
+
+@analytics_router.get("/rollups/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_rollup_stats():
+    """
+    Get how far the background roll-up behind /timeseries has got.
+    """
+    return get_rollup_stats_service()
+
+@analytics_router.get("/retention/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_retention_stats():
+    """
+    Get rows aged out and partitions dropped by the retention job.
+    """
+    return get_retention_stats_service()
+
+@analytics_router.get("/cache/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_cache_stats():
+    """
+    Get hit, miss and eviction counters for the per-URL visit cache.
+    """
+    return get_cache_stats_service()
+
+@analytics_router.get("/idempotency/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_idempotency_stats():
+    """
+    Get the number of submissions checked for idempotency keys and dropped as duplicates.
+    """
+    return get_idempotency_stats_service()
+
+@analytics_router.get("/top/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_top_visits_stats():
+    """
+    Get the size, floor and reload count of the in-memory top-K.
+    """
+    return get_top_visits_stats_service()
+
+@analytics_router.get("/unique/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_unique_counts_stats():
+    """
+    Get sketch and flush counters of the approximate distinct counters.
+    """
+    return get_unique_counts_stats_service()
+
+@analytics_router.get("/routing/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_read_routing_stats():
+    """
+    Get how reads were routed between the replica and the primary.
+    """
+    return get_read_routing_stats_service()
+
+@analytics_router.get("/stream/stats", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_stream_stats():
+    """
+    Get subscriber counts and coalesced or dropped updates of the visit stream.
+    """
+    return get_stream_stats_service()
+
+@analytics_router.get("/stream", status_code=status.HTTP_200_OK)
+async def stream_visits(url: Optional[str] = None):
+    """
+    Stream newly written visits as Server-Sent Events, for every page or only
+    for `url`. Each `visit` event carries the same JSON as GET /current.
+    Updates a slow client has not read yet are coalesced per URL, and the
+    oldest are dropped once STREAM_MAX_PENDING URLs are pending.
+    """
+    try:
+        subscription = subscribe_visits_service(url)
+    except TooManySubscribers as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    return StreamingResponse(
+        stream_visit_events_service(subscription, STREAM_HEARTBEAT_INTERVAL),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def etag_headers(db: Optional[AsyncSession] = None) -> Dict[str, str]:
+    """
+    ETag and Cache-Control headers for read endpoints, from the current data
+    version. Read before the endpoint queries, so a write racing the query
+    only makes the next request refetch.
+
+    The version counts this process's writes to the primary, which says
+    nothing about what a lagging replica has replayed, so responses read
+    from the replica (`db`) get no ETag and are not stored.
+    """
+    if db is not None and is_replica_session(db):
+        return {"Cache-Control": "no-store"}
+    etag = data_version.etag()
+    if etag is None:
+        return {}
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+def is_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    """Whether the request's If-None-Match matches the ETag in `headers`."""
+    return etag_matches(request.headers.get("if-none-match"), headers.get("ETag"))
+
 @analytics_router.get("/current", response_model=Optional[Visit], status_code=status.HTTP_200_OK)
-async def get_current_metrics(db: AsyncSession = Depends(get_db)):
+async def get_current_metrics(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
     """
-    Get metrics for the most recently visited page.
+    Get metrics for the most recently visited page. Supports If-None-Match.
     """
+    cache_headers = etag_headers(db)
+    if is_not_modified(request, cache_headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    response.headers.update(cache_headers)
     try:
         result = await get_current_metrics_service(db)
         # If no visit exists, return null but with 200 OK status
         return result
     except Exception as e:
-        logger.exception(f"Error retrieving current metrics: {str(e)}")
+        logger.exception("Error retrieving current metrics: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get current metrics: {str(e)}"
         )
 
 @analytics_router.get("/url/{url:path}", response_model=Optional[Visit], status_code=status.HTTP_200_OK)
-async def get_visit_by_url(url: str, db: AsyncSession = Depends(get_db)):
+async def get_visit_by_url(url: str, db: AsyncSession = Depends(get_read_db)):
     """
     Get metrics for a specific URL.
     """
@@ -75,22 +298,254 @@ async def get_visit_by_url(url: str, db: AsyncSession = Depends(get_db)):
         # Re-raise HTTP exceptions to preserve their status codes
         raise
     except Exception as e:
-        logger.exception(f"Error retrieving visit by URL: {str(e)}")
+        logger.exception("Error retrieving visit by URL: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get metrics for URL: {str(e)}"
         )
 
-@analytics_router.get("/history", response_model=List[Visit], status_code=status.HTTP_200_OK)
-async def get_visit_history(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+@analytics_router.get(
+    "/history",
+    response_model=Union[List[Visit], PageVisitHistoryResponse],
+    status_code=status.HTTP_200_OK
+)
+async def get_visit_history(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
     """
-    Get historical visit data with pagination.
+    Get historical visit data with pagination, newest first.
+
+    Without `cursor`, `skip`/`limit` offset pagination returns a plain list.
+    Passing `cursor` (empty for the first page) switches to keyset pagination
+    and returns the page together with the `next_cursor` to request next.
+    Supports If-None-Match.
     """
+    cache_headers = etag_headers(db)
+    if is_not_modified(request, cache_headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    response.headers.update(cache_headers)
     try:
+        if FAST_JSON_RESPONSES:
+            return Response(
+                content=await get_visit_history_json_service(db, skip, limit, cursor),
+                media_type="application/json",
+                headers=cache_headers
+            )
+        if cursor is not None:
+            visits, next_cursor = await get_visits_page_service(db, cursor, limit)
+            return PageVisitHistoryResponse.model_validate(
+                {"visits": visits, "next_cursor": next_cursor}, from_attributes=True
+            )
         return await get_all_visits_service(db, skip, limit)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
-        logger.exception(f"Error retrieving visit history: {str(e)}")
+        logger.exception("Error retrieving visit history: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get visit history: {str(e)}"
         )
+
+@analytics_router.get("/range", response_model=VisitRangeResponse, status_code=status.HTTP_200_OK)
+async def get_visit_range(
+    request: Request,
+    response: Response,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: Optional[int] = Query(None, ge=1, le=1000),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Get the pages last visited between `start` and `end` (default: the last
+    24 hours), read from a range scan of the datetime_visited index.
+
+    With `bucket`, the range is split into that many equal buckets and each
+    non-empty one is returned with the number of pages and the sum and max
+    of each metric, aggregated in the database. Otherwise up to `limit`
+    visits are returned, newest first, with a `next_cursor` for the next
+    page. Supports If-None-Match.
+    """
+    cache_headers = etag_headers(db)
+    if is_not_modified(request, cache_headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    response.headers.update(cache_headers)
+    try:
+        return await get_visit_range_service(db, start, end, bucket, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.exception("Error retrieving visit range: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get visit range: {str(e)}"
+        )
+
+@analytics_router.get("/timeseries", response_model=TimeseriesResponse, status_code=status.HTTP_200_OK)
+async def get_visit_timeseries(
+    granularity: Literal["hour", "day"] = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    url: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get visits per hour or per day, across all pages or for a single URL.
+    Defaults to the last 24 hours (hourly) or 30 days (daily).
+    """
+    try:
+        return await get_visit_timeseries_service(db, granularity, start, end, url)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.exception("Error retrieving visit timeseries: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get visit timeseries: {str(e)}"
+        )
+
+@analytics_router.get("/top", response_model=TopVisitsResponse, status_code=status.HTTP_200_OK)
+async def get_top_visits(
+    request: Request,
+    response: Response,
+    k: int = Query(10, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the `k` most visited pages by total visits, most visited first, and
+    whether the answer is exact. Served from an in-memory top-K kept up to
+    date by the ingest path. Supports If-None-Match.
+    """
+    cache_headers = etag_headers()
+    if is_not_modified(request, cache_headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    response.headers.update(cache_headers)
+    try:
+        return await get_top_visits_service(db, k)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.exception("Error retrieving top visits: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get top visits: {str(e)}"
+        )
+
+@analytics_router.get("/unique", response_model=UniqueCountsResponse, status_code=status.HTTP_200_OK)
+async def get_unique_counts(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    host: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the approximate number of distinct pages visited (and, across all
+    sites, distinct hosts) per day and over the whole range from `start` to
+    `end` inclusive, for all sites or one `host`. Defaults to today (UTC).
+    Counts come from HyperLogLog sketches, with about `relative_error` error.
+    """
+    try:
+        return await get_unique_counts_service(db, start, end, host)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.exception("Error retrieving distinct counts: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get distinct counts: {str(e)}"
+        )
+
+@analytics_router.get("/domains", response_model=List[DomainStats], status_code=status.HTTP_200_OK)
+async def get_domain_stats(
+    request: Request,
+    response: Response,
+    sort: Literal["visits", "pages", "host"] = "visits",
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the number of pages, the visit total and the average page metrics
+    per host, sorted by visits, pages or host, with offset pagination.
+    Supports If-None-Match.
+    """
+    cache_headers = etag_headers()
+    if is_not_modified(request, cache_headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    response.headers.update(cache_headers)
+    try:
+        return await get_domain_stats_service(db, sort, skip, limit)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.exception("Error retrieving domain stats: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get domain stats: {str(e)}"
+        )
+
+@analytics_router.get("/stats", response_model=VisitStatsResponse, status_code=status.HTTP_200_OK)
+async def get_visit_stats(
+    percentiles: List[float] = Query([50, 90, 95, 99]),
+    bins: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get count, mean, percentiles and a histogram of the word, link and image
+    counts and visit totals across all pages. Served from an in-memory
+    snapshot that is refreshed at most every STATS_REFRESH_INTERVAL seconds.
+    """
+    try:
+        return await get_visit_stats_service(db, percentiles, bins)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.exception("Error retrieving visit stats: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get visit stats: {str(e)}"
+        )
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+@analytics_router.get("/export", status_code=status.HTTP_200_OK)
+async def export_visits(format: Literal["ndjson", "csv"] = "ndjson", db: AsyncSession = Depends(get_read_db)):
+    """
+    Stream every page visit as NDJSON or CSV, in chunks read through a
+    server-side cursor.
+    """
+    return StreamingResponse(
+        export_visits_service(db, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="visits.{format}"'}
+    )
@@ -1,62 +1,657 @@
+import base64
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, Iterable, List, Optional, Dict, Any, Sequence, Tuple, Union
 import logging
+import orjson
 
-from app.core.schemas import VisitCreate
+from app.core.schemas import (
+    DomainStats,
+    TopVisitsResponse,
+    UniqueCountsDay,
+    UniqueCountsResponse,
+    Visit,
+    VisitRangeBucket,
+    VisitRangeResponse,
+    VisitCreate,
+    TimeseriesPoint,
+    TimeseriesResponse
+)
 from app.repositories.analytics_repository import (
     create_or_update_visit_repository,
+    create_or_update_visits_repository,
     get_current_metrics_repository,
     get_visit_by_url_repository,
-    get_all_visits_repository
+    get_all_visits_repository,
+    get_visits_after_repository,
+    get_all_visit_rows_repository,
+    get_visit_rows_after_repository,
+    get_visit_timeseries_repository,
+    get_visit_rows_in_range_repository,
+    get_visit_range_buckets_repository,
+    get_domain_stats_repository,
+    get_top_visits_repository,
+    stream_visits_repository,
+    build_visit_row,
+    DOMAIN_SORTS,
+    EXPORT_COLUMNS,
+    VISIT_COLUMNS,
+    RANGE_METRICS,
+    ROLLUP_GRANULARITIES
 )
 from app.core.models import PageVisit
+from app.db.database import get_read_db_url
+from app.core.urls import normalize_url
+from app.services.data_version import data_version
+from app.services.idempotency import idempotency_keys
+from app.services.ingest_buffer import get_ingest_buffer
+from app.services.latest_visit import latest_visit_slot
+from app.services.retention import get_retention_job
+from app.services.read_your_writes import read_your_writes
+from app.services.rollups import visit_rollups
+from app.services.top_visits import top_visits
+from app.services.unique_counts import ALL_SITES, unique_counters
+from app.services.visit_cache import visit_cache
+from app.services.visit_events import Subscription, visit_broadcaster
+from app.services.visit_stats import DEFAULT_PERCENTILES, visit_stats_snapshot
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+async def record_written_visits(visits: Iterable[PageVisit]) -> None:
+    """
+    Update the in-memory read paths with records that were just written to the
+    database. Called for direct writes, batches and write-behind flushes.
+    """
+    visits = list(visits)
+    data_version.bump()
+    for visit in visits:
+        latest_visit_slot.offer(visit)
+        top_visits.offer(visit)
+        unique_counters.add(visit)
+        await visit_cache.set(visit)
+    await visit_stats_snapshot.offer(visits)
+    visit_broadcaster.publish(visits)
+
+async def record_purged_visits(urls: Iterable[str]) -> None:
+    """
+    Drop page visits removed by retention from the in-memory read paths.
+    The stats snapshot cannot remove single rows, so it is reloaded.
+    """
+    urls = set(urls)
+    data_version.bump()
+    visit_stats_snapshot.reset()
+    latest = latest_visit_slot.get()
+    if latest is not None and latest.url in urls:
+        latest_visit_slot.clear()
+    top_visits.remove(urls)
+    for url in urls:
+        await visit_cache.invalidate(url)
+
+def normalize_visit(visit_data: VisitCreate) -> VisitCreate:
+    """Normalization stage of the ingest path: canonicalize the visit's URL."""
+    normalized = normalize_url(visit_data.url)
+    if normalized == visit_data.url:
+        return visit_data
+    return visit_data.model_copy(update={"url": normalized})
+
 async def create_or_update_visit_service(db: AsyncSession, visit_data: VisitCreate) -> PageVisit:
     """
     Service layer for creating or updating a page visit record.
-    Includes validation and logging.
+    Includes validation and logging. The URL is normalized first, so
+    near-duplicate URLs share a record. When the write-behind buffer is
+    enabled the visit is queued and written later in a coalesced batch.
     """
-    logger.info(f"Processing visit data for URL: {visit_data.url}")
+    logger.info("Processing visit data for URL: %s", visit_data.url)
     try:
-        result = await create_or_update_visit_repository(db, visit_data)
-        logger.info(f"Successfully processed visit data for URL: {visit_data.url}")
+        visit_data = normalize_visit(visit_data)
+        ingest_buffer = get_ingest_buffer()
+        if ingest_buffer is not None:
+            result = await ingest_buffer.submit(visit_data)
+        else:
+            result = await create_or_update_visit_repository(db, visit_data)
+            await record_written_visits([result])
+        logger.info("Successfully processed visit data for URL: %s", visit_data.url)
         return result
     except Exception as e:
-        logger.error(f"Error in create_or_update_visit_service: {str(e)}")
+        logger.error("Error in create_or_update_visit_service: %s", e)
         raise
 
-async def get_current_metrics_service(db: AsyncSession) -> Optional[PageVisit]:
+async def create_or_update_visit_once_service(
+    db: AsyncSession, visit_data: VisitCreate, idempotency_key: Optional[str] = None
+) -> Tuple[Union[Visit, PageVisit], bool]:
+    """
+    Service layer for ingesting a visit at most once per idempotency key.
+    Returns the visit and whether the request was a duplicate. A duplicate
+    (same key and normalized URL within IDEMPOTENCY_WINDOW) is not written
+    again; it is answered with the stored visit as currently known.
+    """
+    if idempotency_key is None:
+        return await create_or_update_visit_service(db, visit_data), False
+    visit_data = normalize_visit(visit_data)
+    if not idempotency_keys.claim(idempotency_key, visit_data.url):
+        logger.info("Dropped duplicate visit for URL: %s", visit_data.url)
+        visit = await get_visit_by_url_service(db, visit_data.url)
+        if visit is None:
+            # Still waiting in the write-behind buffer.
+            visit = PageVisit(**build_visit_row(visit_data, datetime.utcnow()))
+        return visit, True
+    try:
+        return await create_or_update_visit_service(db, visit_data), False
+    except Exception:
+        idempotency_keys.release(idempotency_key, visit_data.url)
+        raise
+
+def get_idempotency_stats_service() -> Dict[str, Any]:
+    """
+    Service layer for reporting how many submissions were checked against
+    the idempotency keys and how many were dropped as duplicates.
+    """
+    return idempotency_keys.stats()
+
+async def create_or_update_visits_service(db: AsyncSession, visits: List[VisitCreate]) -> List[PageVisit]:
+    """
+    Service layer for persisting a batch of page visits in one transaction.
+    URLs are normalized before duplicates are merged. Returns the resulting
+    record for each input visit, in input order.
+    """
+    logger.info("Processing batch of %s visits", len(visits))
+    try:
+        visits = [normalize_visit(visit_data) for visit_data in visits]
+        records = await create_or_update_visits_repository(db, visits)
+        await record_written_visits(records.values())
+        logger.info("Successfully processed batch covering %s URLs", len(records))
+        return [records[visit_data.url] for visit_data in visits]
+    except Exception as e:
+        logger.error("Error in create_or_update_visits_service: %s", e)
+        raise
+
+def get_read_routing_stats_service() -> Dict[str, Any]:
+    """
+    Service layer for reporting reads routed to the replica or, within the
+    read-your-writes window, to the primary.
+    """
+    return {"replica": get_read_db_url() is not None, **read_your_writes.stats()}
+
+def get_cache_stats_service() -> Dict[str, Any]:
+    """
+    Service layer for reporting per-URL cache hit, miss and eviction counters.
+    """
+    return visit_cache.stats()
+
+def get_stream_stats_service() -> Dict[str, Any]:
+    """
+    Service layer for reporting subscriber counts and coalesced or dropped
+    updates of the visit stream.
+    """
+    return visit_broadcaster.stats()
+
+def subscribe_visits_service(url: Optional[str] = None) -> Subscription:
+    """
+    Service layer for subscribing to newly written visits, across all pages
+    or for one URL (normalized like incoming visits).
+    """
+    return visit_broadcaster.subscribe(normalize_url(url) if url else None)
+
+def get_rollup_stats_service() -> Dict[str, Any]:
+    """
+    Service layer for reporting the progress of the background roll-up of
+    visit events into the timeseries rollups.
+    """
+    return visit_rollups.stats()
+
+def get_retention_stats_service() -> Dict[str, Any]:
+    """
+    Service layer for reporting what the retention job has aged out.
+    """
+    retention_job = get_retention_job()
+    if retention_job is None:
+        return {"enabled": False}
+    return retention_job.stats()
+
+def get_ingest_stats_service() -> Dict[str, Any]:
+    """
+    Service layer for reporting write-behind buffer queue depth and flush latency.
+    """
+    ingest_buffer = get_ingest_buffer()
+    if ingest_buffer is None:
+        return {"enabled": False}
+    return ingest_buffer.stats()
+
+async def get_visit_stats_service(
+    db: AsyncSession, percentiles: Sequence[float] = DEFAULT_PERCENTILES, bins: int = 10
+) -> Dict[str, Any]:
+    """
+    Service layer for summary statistics of the per-page metrics, computed
+    from the in-memory column snapshot after refreshing it if it is stale.
+    """
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+    try:
+        await visit_stats_snapshot.refresh_if_stale(db)
+        return visit_stats_snapshot.describe(percentiles, bins)
+    except Exception as e:
+        logger.error("Error in get_visit_stats_service: %s", e)
+        raise
+
+async def get_current_metrics_service(db: AsyncSession) -> Optional[Union[Visit, PageVisit]]:
     """
     Service layer for getting metrics for the most recent page visit.
+    Answered from the in-memory latest-visit slot when it is filled; on a cold
+    start, or once the slot is older than LATEST_VISIT_MAX_AGE, the database
+    is queried and the slot refilled from the result.
     """
     logger.info("Retrieving current metrics")
+    latest = latest_visit_slot.get()
+    if latest is not None:
+        return latest
     try:
-        return await get_current_metrics_repository(db)
+        visit = await get_current_metrics_repository(db)
+        if visit is not None:
+            latest_visit_slot.load(visit)
+        return visit
     except Exception as e:
-        logger.error(f"Error in get_current_metrics_service: {str(e)}")
+        logger.error("Error in get_current_metrics_service: %s", e)
         raise
 
-async def get_visit_by_url_service(db: AsyncSession, url: str) -> Optional[PageVisit]:
+async def get_visit_by_url_service(db: AsyncSession, url: str) -> Optional[Union[Visit, PageVisit]]:
     """
     Service layer for getting metrics for a specific URL.
+    The URL is normalized the same way as on ingest, then looked up through
+    the per-URL visit cache.
     """
-    logger.info(f"Retrieving visit data for URL: {url}")
+    logger.info("Retrieving visit data for URL: %s", url)
+    url = normalize_url(url)
+    cached = await visit_cache.get(url)
+    if cached is not None:
+        return cached
     try:
-        return await get_visit_by_url_repository(db, url)
+        visit = await get_visit_by_url_repository(db, url)
+        if visit is not None:
+            await visit_cache.fill(visit)
+        return visit
     except Exception as e:
-        logger.error(f"Error in get_visit_by_url_service: {str(e)}")
+        logger.error("Error in get_visit_by_url_service: %s", e)
         raise
 
 async def get_all_visits_service(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[PageVisit]:
     """
     Service layer for getting historical visit data with pagination.
     """
-    logger.info(f"Retrieving all visits (skip={skip}, limit={limit})")
+    logger.info("Retrieving all visits (skip=%s, limit=%s)", skip, limit)
     try:
         return await get_all_visits_repository(db, skip, limit)
     except Exception as e:
-        logger.error(f"Error in get_all_visits_service: {str(e)}")
+        logger.error("Error in get_all_visits_service: %s", e)
         raise
+
+def encode_history_cursor(visit: PageVisit) -> str:
+    """Encode the keyset position of a visit as an opaque cursor."""
+    payload = json.dumps([visit.datetime_visited.isoformat(), visit.url_hash])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_history_cursor. Raises ValueError if it is malformed."""
+    try:
+        visited_at, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(visited_at), int(key)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+async def get_visits_page_service(
+    db: AsyncSession, cursor: Optional[str] = None, limit: int = 100, rows: bool = False
+) -> Tuple[List[PageVisit], Optional[str]]:
+    """
+    Service layer for getting historical visit data with keyset pagination.
+    An empty cursor starts from the first page. Returns the page and the
+    cursor of the next page, or None on the last page. With `rows`, the page
+    holds plain column tuples (see VISIT_ROW_COLUMNS) instead of ORM objects.
+    """
+    logger.info("Retrieving visits page (cursor=%r, limit=%s)", cursor, limit)
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    after = decode_history_cursor(cursor) if cursor else None
+    fetch_page = get_visit_rows_after_repository if rows else get_visits_after_repository
+    try:
+        # Fetch one extra row to learn whether another page follows.
+        visits = await fetch_page(db, after, limit + 1)
+    except Exception as e:
+        logger.error("Error in get_visits_page_service: %s", e)
+        raise
+    if len(visits) > limit:
+        visits = visits[:limit]
+        return visits, encode_history_cursor(visits[-1])
+    return visits, None
+
+VISIT_FIELDS = [column.key for column in VISIT_COLUMNS]
+
+def encode_visit_rows(rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Visit column tuples as dicts with the keys and key order of the Visit schema."""
+    return [dict(zip(VISIT_FIELDS, row)) for row in rows]
+
+async def get_visit_history_json_service(
+    db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+) -> bytes:
+    """
+    Service layer for the /history response body, encoded with orjson from
+    plain column tuples. The bytes match what the Visit and
+    PageVisitHistoryResponse models serialize to, without building ORM
+    objects or models.
+    """
+    if cursor is not None:
+        rows, next_cursor = await get_visits_page_service(db, cursor, limit, rows=True)
+        return orjson.dumps({"visits": encode_visit_rows(rows), "next_cursor": next_cursor})
+    logger.info("Retrieving all visits (skip=%s, limit=%s)", skip, limit)
+    try:
+        rows = await get_all_visit_rows_repository(db, skip, limit)
+    except Exception as e:
+        logger.error("Error in get_visit_history_json_service: %s", e)
+        raise
+    return orjson.dumps(encode_visit_rows(rows))
+
+# Window returned by the timeseries endpoint when no start is given.
+DEFAULT_TIMESERIES_WINDOWS = {
+    "hour": timedelta(hours=24),
+    "day": timedelta(days=30),
+}
+
+def _to_naive_utc(value: datetime) -> datetime:
+    """Visit timestamps are stored as naive UTC; normalize aware inputs to match."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+async def get_visit_timeseries_service(
+    db: AsyncSession,
+    granularity: str = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    url: Optional[str] = None
+) -> TimeseriesResponse:
+    """
+    Service layer for getting visits per hour or per day from the rollups.
+    Buckets without visits are omitted. Raises ValueError for an empty range.
+    """
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    end = _to_naive_utc(end) if end is not None else datetime.utcnow()
+    start = _to_naive_utc(start) if start is not None else end - DEFAULT_TIMESERIES_WINDOWS[granularity]
+    if start >= end:
+        raise ValueError("start must be before end")
+
+    # Align the start to its bucket so the first bucket is not cut off.
+    _, truncate = ROLLUP_GRANULARITIES[granularity]
+    start = truncate(start)
+    if url is not None:
+        url = normalize_url(url)
+
+    logger.info("Retrieving %s timeseries from %s to %s (url=%s)", granularity, start, end, url)
+    try:
+        rows = await get_visit_timeseries_repository(db, granularity, start, end, url)
+    except Exception as e:
+        logger.error("Error in get_visit_timeseries_service: %s", e)
+        raise
+
+    points = [
+        TimeseriesPoint(
+            bucket_start=row.bucket_start,
+            visits=row.visits,
+            avg_link_count=row.link_count_sum / row.visits,
+            avg_word_count=row.word_count_sum / row.visits,
+            avg_image_count=row.image_count_sum / row.visits,
+        )
+        for row in rows
+        if row.visits
+    ]
+    return TimeseriesResponse(granularity=granularity, start=start, end=end, url=url, points=points)
+
+# Window returned by the range endpoint when no start is given.
+DEFAULT_RANGE_WINDOW = timedelta(hours=24)
+
+# Most rows or buckets a /range response holds.
+MAX_RANGE_POINTS = 1000
+
+async def get_visit_range_service(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: Optional[int] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> VisitRangeResponse:
+    """
+    Service layer for the pages visited in [start, end), by datetime_visited.
+    Defaults to the last 24 hours. With `bucket`, the range is split into
+    that many equal buckets, aggregated in the database; buckets without
+    visits are omitted. Otherwise up to `limit` visits are returned, newest
+    first, with a cursor for the next page. Raises ValueError for an empty
+    range, a malformed cursor or a size above MAX_RANGE_POINTS.
+    """
+    end = _to_naive_utc(end) if end is not None else datetime.utcnow()
+    start = _to_naive_utc(start) if start is not None else end - DEFAULT_RANGE_WINDOW
+    if start >= end:
+        raise ValueError("start must be before end")
+    if max(bucket or 0, limit) > MAX_RANGE_POINTS:
+        raise ValueError(f"bucket and limit must be at most {MAX_RANGE_POINTS}")
+
+    if bucket is None:
+        logger.info("Retrieving visits from %s to %s (cursor=%r, limit=%s)", start, end, cursor, limit)
+        before = decode_history_cursor(cursor) if cursor else None
+        try:
+            # Fetch one extra row to learn whether another page follows.
+            rows = await get_visit_rows_in_range_repository(db, start, end, before, limit + 1)
+        except Exception as e:
+            logger.error("Error in get_visit_range_service: %s", e)
+            raise
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_history_cursor(rows[-1])
+        return VisitRangeResponse(start=start, end=end, visits=encode_visit_rows(rows), next_cursor=next_cursor)
+
+    width = (end - start).total_seconds() / bucket
+    logger.info("Retrieving %s buckets of visits from %s to %s", bucket, start, end)
+    try:
+        rows = await get_visit_range_buckets_repository(db, start, end, width)
+    except Exception as e:
+        logger.error("Error in get_visit_range_service: %s", e)
+        raise
+
+    merged: Dict[int, Dict[str, int]] = {}
+    for row in rows:
+        # Rounding can put a visit at a bucket edge one bucket off the range.
+        index = min(max(row.bucket, 0), bucket - 1)
+        totals = merged.get(index)
+        if totals is None:
+            merged[index] = dict(row._mapping)
+            continue
+        totals["count"] += row.count
+        for column in RANGE_METRICS:
+            totals[f"{column.key}_sum"] += getattr(row, f"{column.key}_sum")
+            totals[f"{column.key}_max"] = max(totals[f"{column.key}_max"], getattr(row, f"{column.key}_max"))
+    buckets = [
+        VisitRangeBucket(
+            bucket_start=start + timedelta(seconds=index * width),
+            bucket_end=start + timedelta(seconds=(index + 1) * width) if index < bucket - 1 else end,
+            **{key: value for key, value in totals.items() if key != "bucket"},
+        )
+        for index, totals in sorted(merged.items())
+    ]
+    return VisitRangeResponse(start=start, end=end, bucket_seconds=width, buckets=buckets)
+
+async def load_top_visits_service(db: AsyncSession) -> None:
+    """Fill the in-memory top-K from the database. Called on startup."""
+    if not top_visits.enabled:
+        return
+    try:
+        await top_visits.refresh(db)
+    except Exception as e:
+        logger.error("Error in load_top_visits_service: %s", e)
+        raise
+
+async def get_top_visits_service(db: AsyncSession, k: int = 10) -> TopVisitsResponse:
+    """
+    Service layer for getting the `k` most visited pages. Answered from the
+    in-memory top-K, which is reloaded first when it cannot answer exactly;
+    with the top-K disabled, the database is queried. Raises ValueError when
+    `k` exceeds TOP_K_CAPACITY.
+    """
+    if k > top_visits.capacity:
+        raise ValueError(f"k must be at most {top_visits.capacity}")
+    logger.info("Retrieving top %s visits", k)
+    try:
+        if not top_visits.enabled:
+            visits = await get_top_visits_repository(db, k)
+            return TopVisitsResponse(k=k, exact=True, visits=visits)
+        await top_visits.ensure_exact(db, k)
+    except Exception as e:
+        logger.error("Error in get_top_visits_service: %s", e)
+        raise
+    # A refresh interval means other workers write too, and their writes
+    # since the last reload are not reflected.
+    exact = top_visits.is_exact(k) and top_visits.refresh_interval <= 0
+    return TopVisitsResponse(k=k, exact=exact, visits=top_visits.top(k))
+
+def get_top_visits_stats_service() -> Dict[str, Any]:
+    """Service layer for the in-memory top-K's size and counters."""
+    return top_visits.stats()
+
+# Longest range of days /unique merges in one request.
+MAX_UNIQUE_COUNT_DAYS = 366
+
+async def get_unique_counts_service(
+    db: AsyncSession,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    host: Optional[str] = None
+) -> UniqueCountsResponse:
+    """
+    Service layer for approximate distinct counts of pages (and, across all
+    sites, hosts) per day and over [start, end], for all sites or one host.
+    Defaults to today (UTC). Raises ValueError for an empty or too long range.
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end
+    if start > end:
+        raise ValueError("start must not be after end")
+    if (end - start).days >= MAX_UNIQUE_COUNT_DAYS:
+        raise ValueError(f"The range can span at most {MAX_UNIQUE_COUNT_DAYS} days")
+    scope = host.strip().lower() if host else ALL_SITES
+
+    logger.info("Retrieving distinct counts from %s to %s (host=%s)", start, end, host)
+    try:
+        pages_by_day, pages = await unique_counters.estimate(db, "pages", scope, start, end)
+        hosts_by_day: Dict[date, float] = {}
+        hosts = None
+        if scope == ALL_SITES:
+            hosts_by_day, hosts = await unique_counters.estimate(db, "hosts", ALL_SITES, start, end)
+    except Exception as e:
+        logger.error("Error in get_unique_counts_service: %s", e)
+        raise
+
+    days = [
+        UniqueCountsDay(
+            day=day,
+            pages=round(pages_by_day[day]),
+            hosts=round(hosts_by_day[day]) if day in hosts_by_day else None,
+        )
+        for day in pages_by_day
+    ]
+    return UniqueCountsResponse(
+        start=start,
+        end=end,
+        host=scope or None,
+        pages=round(pages),
+        hosts=round(hosts) if hosts is not None else None,
+        relative_error=1.04 / (1 << unique_counters.precision) ** 0.5,
+        days=days,
+    )
+
+def get_unique_counts_stats_service() -> Dict[str, Any]:
+    """Service layer for the distinct counters' sketch and flush counters."""
+    return unique_counters.stats()
+
+async def get_domain_stats_service(
+    db: AsyncSession, sort: str = "visits", skip: int = 0, limit: int = 100
+) -> List[DomainStats]:
+    """
+    Service layer for getting visit totals and average page metrics per host.
+    Raises ValueError for an unknown sort order.
+    """
+    if sort not in DOMAIN_SORTS:
+        raise ValueError(f"Unsupported sort: {sort}")
+    logger.info("Retrieving domain stats (sort=%s, skip=%s, limit=%s)", sort, skip, limit)
+    try:
+        rows = await get_domain_stats_repository(db, sort, skip, limit)
+    except Exception as e:
+        logger.error("Error in get_domain_stats_service: %s", e)
+        raise
+    return [DomainStats.model_validate(row, from_attributes=True) for row in rows]
+
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+def _encode_ndjson(rows) -> bytes:
+    lines = []
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        record["datetime_visited"] = record["datetime_visited"].isoformat()
+        lines.append(json.dumps(record))
+    lines.append("")
+    return "\n".join(lines).encode()
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            value.isoformat() if isinstance(value, datetime) else value for value in row
+        )
+    return buffer.getvalue().encode()
+
+EXPORT_FORMATS = {
+    "ndjson": _encode_ndjson,
+    "csv": _encode_csv,
+}
+
+async def export_visits_service(
+    db: AsyncSession, export_format: str = "ndjson", batch_size: int = 1000
+) -> AsyncIterator[bytes]:
+    """
+    Service layer for exporting every page visit as NDJSON or CSV. Yields one
+    encoded chunk per database batch, so memory use does not depend on the
+    size of the table.
+    """
+    encode = EXPORT_FORMATS[export_format]
+    logger.info("Exporting all visits as %s", export_format)
+    if export_format == "csv":
+        yield _encode_csv([EXPORT_FIELDS])
+    try:
+        async for rows in stream_visits_repository(db, batch_size):
+            yield encode(rows)
+    except Exception as e:
+        logger.error("Error in export_visits_service: %s", e)
+        raise
+
+async def stream_visit_events_service(
+    subscription: Subscription, heartbeat_interval: float = 15.0
+) -> AsyncIterator[bytes]:
+    """
+    Service layer for the Server-Sent Events stream of newly written visits.
+    Yields one `visit` event per update and a comment line after
+    `heartbeat_interval` idle seconds, which keeps proxies from closing the
+    connection and lets the server notice disconnected clients. The
+    subscription is released when the stream ends.
+    """
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            payload = await subscription.get(timeout=heartbeat_interval)
+            if payload is None:
+                yield b": keepalive\n\n"
+            else:
+                yield b"event: visit\ndata: " + payload + b"\n\n"
+    finally:
+        visit_broadcaster.unsubscribe(subscription)
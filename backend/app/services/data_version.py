@@ -0,0 +1,55 @@
+import os
+import secrets
+import time
+from typing import Optional
+
+class DataVersion:
+    """
+    Counter of writes to page visits, bumped by the ingest path, from which
+    the read endpoints derive their ETags. An unchanged version means no
+    write has gone through this process since, so a client holding the
+    matching ETag can be answered with 304 without touching the database.
+
+    The counter is per process. The random epoch keeps ETags from different
+    processes or restarts from ever matching. With several workers, each one
+    only sees its own writes; `window` (seconds) bounds how long a worker
+    can keep answering 304 after another worker changed the data, by rolling
+    the ETag over every `window` seconds. A `window` of 0 never rolls over,
+    which is only safe with a single worker.
+    """
+
+    def __init__(self, enabled: bool = True, window: float = 5.0):
+        self.enabled = enabled
+        self.window = window
+        self.epoch = secrets.token_hex(4)
+        self.value = 0
+
+    def bump(self) -> None:
+        self.value += 1
+
+    def etag(self, now: Optional[float] = None) -> Optional[str]:
+        """The weak ETag of the current version, or None when ETags are disabled."""
+        if not self.enabled:
+            return None
+        tag = f"{self.epoch}-{self.value}"
+        if self.window:
+            tag += f"-{int((now if now is not None else time.time()) // self.window)}"
+        return f'W/"{tag}"'
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`."""
+    if not if_none_match or etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+data_version = DataVersion(
+    enabled=os.getenv("ETAGS_ENABLED", "true").lower() in ("1", "true", "yes"),
+    window=float(os.getenv("ETAG_WINDOW", "5")),
+)
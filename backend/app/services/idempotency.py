@@ -0,0 +1,106 @@
+import hashlib
+import os
+import time
+from typing import Any, Dict, Optional, Set
+
+class IdempotencyKeys:
+    """
+    Remembers recently seen idempotency keys so repeated submissions of the
+    same visit can be answered without another write.
+
+    Keys live in two generations of 64-bit fingerprints. A key is a duplicate
+    if either generation holds it; every `window` seconds the older
+    generation is discarded and the current one takes its place, so a key is
+    remembered for at least `window` and at most twice `window` seconds. A
+    generation holds at most `max_keys` fingerprints; when it fills up it is
+    rotated early, which shortens the window instead of growing memory. The
+    keys are per process, so with several workers a retry that lands on
+    another worker is written again.
+    """
+
+    def __init__(self, enabled: bool = True, window: float = 600, max_keys: int = 100_000):
+        self.enabled = enabled
+        self.window = window
+        self.max_keys = max_keys
+        self._current: Set[int] = set()
+        self._previous: Set[int] = set()
+        self._rotated_at: Optional[float] = None
+        self.checked = 0
+        self.duplicates = 0
+        self.rotations = 0
+        self.early_rotations = 0
+
+    @staticmethod
+    def fingerprint(key: str, scope: str) -> int:
+        """
+        64-bit hash of `key` within `scope` (the visit's URL), so a key reused
+        for another page is not taken for a duplicate.
+        """
+        digest = hashlib.blake2b(f"{scope}\0{key}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def _rotate(self, now: float) -> None:
+        self._previous, self._current = self._current, set()
+        self._rotated_at = now
+        self.rotations += 1
+
+    def claim(self, key: str, scope: str, now: Optional[float] = None) -> bool:
+        """
+        Record `key` and return True if it was not seen within the window,
+        False if it is a duplicate. The check and the insert run without
+        awaiting, so concurrent requests with the same key cannot both claim it.
+        """
+        if not self.enabled:
+            return True
+        now = time.monotonic() if now is None else now
+        if self._rotated_at is None:
+            self._rotated_at = now
+        elapsed = now - self._rotated_at
+        if elapsed >= self.window:
+            self._rotate(now)
+            if elapsed >= 2 * self.window:
+                # Idle for more than a whole window: the old keys have expired too.
+                self._previous = set()
+        self.checked += 1
+        fingerprint = self.fingerprint(key, scope)
+        if fingerprint in self._current or fingerprint in self._previous:
+            self.duplicates += 1
+            return False
+        if len(self._current) >= self.max_keys:
+            self._rotate(now)
+            self.early_rotations += 1
+        self._current.add(fingerprint)
+        return True
+
+    def release(self, key: str, scope: str) -> None:
+        """Forget a claimed key, so a retry after a failed write is not dropped."""
+        fingerprint = self.fingerprint(key, scope)
+        self._current.discard(fingerprint)
+        self._previous.discard(fingerprint)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window_seconds": self.window,
+            "max_keys": self.max_keys,
+            "keys": len(self._current) + len(self._previous),
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "rotations": self.rotations,
+            "early_rotations": self.early_rotations,
+        }
+
+    def clear(self) -> None:
+        self._current = set()
+        self._previous = set()
+        self._rotated_at = None
+        self.checked = 0
+        self.duplicates = 0
+        self.rotations = 0
+        self.early_rotations = 0
+
+idempotency_keys = IdempotencyKeys(
+    enabled=os.getenv("IDEMPOTENCY_ENABLED", "true").lower() in ("1", "true", "yes"),
+    window=float(os.getenv("IDEMPOTENCY_WINDOW", "600")),
+    max_keys=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000")),
+)
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.models import PageVisit
+from app.core.schemas import VisitCreate
+from app.repositories.analytics_repository import build_visit_row, upsert_visit_rows_repository
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class IngestBuffer:
+    """
+    In-process write-behind buffer for page visits.
+
+    Visits are queued on a bounded asyncio queue and merged per URL by a
+    background task: visit counts are summed and the latest metrics win. The
+    merged rows are written with one bulk upsert whenever `flush_size` URLs are
+    pending or `flush_interval` seconds have passed since the last flush,
+    whichever comes first. `flush_interval` is therefore the durability window:
+    the longest a visit can sit in memory before it is persisted. `on_flush`,
+    if given, is awaited with the records returned by each successful flush;
+    an error it raises is logged and counted, and the buffer keeps running.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        max_queue_size: int = 10000,
+        flush_size: int = 500,
+        flush_interval: float = 1.0,
+        on_flush: Optional[Callable[[List[PageVisit]], Awaitable[None]]] = None,
+    ):
+        self._session_factory = session_factory
+        self._on_flush = on_flush
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self.flush_count = 0
+        self.failed_flush_count = 0
+        self.failed_on_flush_count = 0
+        self.flushed_visits = 0
+        self.last_flush_rows = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Start the background flush task."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                "Ingest write-behind buffer started (flush_size=%s, flush_interval=%ss)",
+                self.flush_size,
+                self.flush_interval,
+            )
+
+    async def stop(self) -> None:
+        """Stop the background task and flush everything still buffered."""
+        if self._task is not None:
+            # Holding the flush lock means the task is never cancelled halfway
+            # through a write.
+            async with self._flush_lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while not self._queue.empty() or self._pending:
+            self._drain_queue()
+            if not await self.flush():
+                logger.error("Ingest buffer stopped with %s URLs not persisted", len(self._pending))
+                break
+        logger.info("Ingest write-behind buffer stopped")
+
+    async def submit(self, visit_data: VisitCreate) -> PageVisit:
+        """
+        Queue a visit for a later write. Waits for room if the queue is full.
+        Returns a transient PageVisit describing the accepted visit; its
+        total_visits only counts this visit, since the stored total is not
+        known until the buffer is flushed.
+        """
+        visited_at = datetime.utcnow()
+        await self._queue.put((visit_data, visited_at))
+        return PageVisit(**build_visit_row(visit_data, visited_at))
+
+    async def flush(self) -> int:
+        """Write all merged rows to the database. Returns the number of URLs written."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            rows, self._pending = self._pending, {}
+
+            start = time.perf_counter()
+            try:
+                async with self._session_factory() as session:
+                    records = await upsert_visit_rows_repository(session, list(rows.values()))
+            except Exception as e:
+                self.failed_flush_count += 1
+                logger.error("Error flushing ingest buffer, keeping %s URLs for retry: %s", len(rows), e)
+                for row in rows.values():
+                    self._merge_row(row)
+                return 0
+
+            latency = time.perf_counter() - start
+            self.flush_count += 1
+            self.flushed_visits += sum(row["total_visits"] for row in rows.values())
+            self.last_flush_rows = len(rows)
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_latency += latency
+            if self._on_flush is not None:
+                try:
+                    await self._on_flush(list(records.values()))
+                except Exception as e:
+                    # The rows are committed; retrying them would count their visits twice.
+                    self.failed_on_flush_count += 1
+                    logger.error("Error in ingest buffer on_flush after writing %s URLs: %s", len(rows), e)
+            return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and flush latency numbers for monitoring."""
+        return {
+            "enabled": True,
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "pending_urls": len(self._pending),
+            "pending_visits": sum(row["total_visits"] for row in self._pending.values()),
+            "flush_size": self.flush_size,
+            "durability_window_seconds": self.flush_interval,
+            "flush_count": self.flush_count,
+            "failed_flush_count": self.failed_flush_count,
+            "failed_on_flush_count": self.failed_on_flush_count,
+            "flushed_visits": self.flushed_visits,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_latency_ms": self.last_flush_latency * 1000,
+            "max_flush_latency_ms": self.max_flush_latency * 1000,
+            "avg_flush_latency_ms": (
+                self.total_flush_latency / self.flush_count * 1000 if self.flush_count else 0.0
+            ),
+        }
+
+    def _merge_row(self, row: Dict[str, Any]) -> None:
+        """Merge a row into the pending set, summing counts and keeping the latest metrics."""
+        previous = self._pending.get(row["url"])
+        if previous is not None:
+            row = dict(row, total_visits=previous["total_visits"] + row["total_visits"])
+        self._pending[row["url"]] = row
+
+    def _drain_queue(self) -> None:
+        """Move everything currently queued into the pending set without waiting."""
+        while len(self._pending) < self.flush_size:
+            try:
+                visit_data, visited_at = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            self._merge_row(build_visit_row(visit_data, visited_at))
+
+    async def _run(self) -> None:
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                visit_data, visited_at = await asyncio.wait_for(self._queue.get(), timeout)
+                self._merge_row(build_visit_row(visit_data, visited_at))
+                self._drain_queue()
+            except asyncio.TimeoutError:
+                pass
+
+            if len(self._pending) >= self.flush_size or time.monotonic() >= deadline:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    # flush() keeps failed writes for retry; whatever else
+                    # went wrong must not end the task, or nothing would
+                    # drain the queue and submit() would block once it fills.
+                    logger.error("Unexpected error in ingest buffer flush: %s", e)
+                deadline = time.monotonic() + self.flush_interval
+
+_ingest_buffer: Optional[IngestBuffer] = None
+
+def get_ingest_buffer() -> Optional[IngestBuffer]:
+    """Return the running write-behind buffer, or None when writes go straight to the database."""
+    return _ingest_buffer
+
+async def start_ingest_buffer(
+    session_factory: Optional[Callable] = None,
+    on_flush: Optional[Callable[[List[PageVisit]], Awaitable[None]]] = None,
+) -> Optional[IngestBuffer]:
+    """
+    Start the write-behind buffer if INGEST_WRITE_BEHIND is enabled. The queue
+    bound, flush size and durability window (flush interval in seconds) are
+    read from INGEST_QUEUE_SIZE, INGEST_FLUSH_SIZE and INGEST_FLUSH_INTERVAL.
+    """
+    global _ingest_buffer
+    if os.getenv("INGEST_WRITE_BEHIND", "false").lower() not in ("1", "true", "yes"):
+        return None
+
+    if session_factory is None:
+        from app.db.database import get_session_factory
+        session_factory = get_session_factory()
+
+    _ingest_buffer = IngestBuffer(
+        session_factory,
+        max_queue_size=int(os.getenv("INGEST_QUEUE_SIZE", "10000")),
+        flush_size=int(os.getenv("INGEST_FLUSH_SIZE", "500")),
+        flush_interval=float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0")),
+        on_flush=on_flush,
+    )
+    await _ingest_buffer.start()
+    return _ingest_buffer
+
+async def stop_ingest_buffer() -> None:
+    """Flush and stop the write-behind buffer, if one is running."""
+    global _ingest_buffer
+    if _ingest_buffer is not None:
+        await _ingest_buffer.stop()
+        _ingest_buffer = None
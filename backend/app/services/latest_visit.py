@@ -0,0 +1,59 @@
+import os
+import time
+from typing import Optional
+
+from app.core.models import PageVisit
+from app.core.schemas import Visit
+
+class LatestVisitSlot:
+    """
+    Holds a snapshot of the most recently visited page so GET /current can be
+    answered from memory. The ingest path offers every visit it writes; the
+    slot keeps whichever is newest by datetime_visited. The slot is per
+    process, so with several workers each one only sees its own writes: once
+    the slot is older than `max_age` seconds, get() reports it empty and the
+    caller re-reads the newest row from the database, picking up the others'
+    writes. A `max_age` of 0 never re-reads (single worker).
+    """
+
+    def __init__(self, enabled: bool = True, max_age: float = 5.0):
+        self.enabled = enabled
+        self.max_age = max_age
+        self._visit: Optional[Visit] = None
+        self._filled_monotonic: Optional[float] = None
+
+    def get(self, now: Optional[float] = None) -> Optional[Visit]:
+        """Return the latest visit, or None if the slot is empty, expired or disabled."""
+        if not self.enabled or self._visit is None:
+            return None
+        if self.max_age > 0:
+            now = time.monotonic() if now is None else now
+            if now - self._filled_monotonic >= self.max_age:
+                return None
+        return self._visit
+
+    def offer(self, visit: PageVisit, now: Optional[float] = None) -> None:
+        """Store a snapshot of `visit` if it is at least as recent as the current one."""
+        if not self.enabled:
+            return
+        current = self._visit
+        if current is None:
+            self.load(visit, now)
+        elif visit.datetime_visited >= current.datetime_visited:
+            self._visit = Visit.model_validate(visit, from_attributes=True)
+
+    def load(self, visit: PageVisit, now: Optional[float] = None) -> None:
+        """Replace the slot with the newest row read from the database and restart its `max_age`."""
+        if not self.enabled:
+            return
+        self._visit = Visit.model_validate(visit, from_attributes=True)
+        self._filled_monotonic = time.monotonic() if now is None else now
+
+    def clear(self) -> None:
+        self._visit = None
+        self._filled_monotonic = None
+
+latest_visit_slot = LatestVisitSlot(
+    enabled=os.getenv("LATEST_VISIT_IN_MEMORY", "true").lower() in ("1", "true", "yes"),
+    max_age=float(os.getenv("LATEST_VISIT_MAX_AGE", "5")),
+)
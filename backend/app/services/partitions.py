@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories.analytics_repository import (
+    create_visit_event_partition_repository,
+    is_visit_events_partitioned_repository
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+class VisitEventPartitions:
+    """
+    Background task creating the monthly visit_events partitions of the
+    current month and the next `months_ahead` on PostgreSQL, when the table
+    is partitioned (migration 0005). It runs on startup and then every
+    `interval` seconds whether or not retention is on, so new visits land in
+    their month's partition rather than piling up in the default one. Rows
+    of a month already in the default partition are moved into the month's
+    partition when it is created, in one transaction. On other databases it
+    does nothing.
+    """
+
+    def __init__(self, months_ahead: int = 2, interval: float = 86400):
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self._session_factory: Optional[Callable] = None
+        self._task: Optional[asyncio.Task] = None
+        self.run_count = 0
+        self.failed_run_count = 0
+        self.moved_rows = 0
+        self.last_run_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def ensure(self, db: AsyncSession, now: Optional[datetime] = None) -> int:
+        """Create the missing partitions. Returns the rows moved out of the default partition."""
+        start = time.perf_counter()
+        try:
+            moved = 0
+            if await is_visit_events_partitioned_repository(db):
+                current = month_start(now or datetime.utcnow())
+                for months in range(self.months_ahead + 1):
+                    moved += await create_visit_event_partition_repository(db, add_months(current, months))
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            self.failed_run_count += 1
+            logger.error("Error creating visit_events partitions: %s", e)
+            raise
+        self.run_count += 1
+        self.moved_rows += moved
+        self.last_run_seconds = time.perf_counter() - start
+        if moved:
+            logger.info("Moved %s visit_events rows out of the default partition", moved)
+        return moved
+
+    async def start(self, session_factory: Callable) -> None:
+        """Start the background task; the first run happens right away."""
+        self._session_factory = session_factory
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self._session_factory() as session:
+                    await self.ensure(session)
+            except Exception:
+                # Already logged; retried on the next run.
+                pass
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "months_ahead": self.months_ahead,
+            "run_count": self.run_count,
+            "failed_run_count": self.failed_run_count,
+            "moved_rows": self.moved_rows,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+visit_event_partitions = VisitEventPartitions(
+    months_ahead=int(os.getenv("PARTITIONS_AHEAD", "2")),
+    interval=float(os.getenv("PARTITIONS_INTERVAL", "86400")),
+)
+
+async def start_visit_event_partitions(session_factory: Optional[Callable] = None) -> None:
+    """Start creating visit_events partitions ahead in the background."""
+    if session_factory is None:
+        from app.db.database import get_session_factory
+        session_factory = get_session_factory()
+    await visit_event_partitions.start(session_factory)
+
+async def stop_visit_event_partitions() -> None:
+    await visit_event_partitions.stop()
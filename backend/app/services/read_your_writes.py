@@ -0,0 +1,85 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from starlette.requests import Request
+
+class ReadYourWrites:
+    """
+    Remembers which clients wrote within the last `window` seconds, so their
+    reads go to the primary database instead of a replica that may not have
+    replayed their write yet (a popup that just posted still sees its own
+    visit).
+
+    A client is identified by its `X-Client-Id` header, or else by its
+    address. At most `max_clients` recent writers are remembered; when more
+    write within the window, the least recent ones are forgotten early and
+    read from the replica again. The writers are per process, so with
+    several workers a read that lands on another worker may miss the write.
+    """
+
+    def __init__(self, window: float = 5.0, max_clients: int = 10_000):
+        self.window = window
+        self.max_clients = max_clients
+        self.clear()
+
+    def clear(self) -> None:
+        # Client -> monotonic time until which its reads go to the primary,
+        # least recent writer first.
+        self._writers: "OrderedDict[str, float]" = OrderedDict()
+        self.writes = 0
+        self.primary_reads = 0
+        self.replica_reads = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    @staticmethod
+    def client_key(request: Request) -> str:
+        """The client a request comes from: its X-Client-Id header, or else its address."""
+        client_id = request.headers.get("x-client-id")
+        if client_id:
+            return "id:" + client_id[:255]
+        return "addr:" + (request.client.host if request.client else "")
+
+    def record_write(self, client: str, now: Optional[float] = None) -> None:
+        """Send the reads of `client` to the primary for the next `window` seconds."""
+        if not self.enabled:
+            return
+        now = time.monotonic() if now is None else now
+        self.writes += 1
+        self._writers[client] = now + self.window
+        self._writers.move_to_end(client)
+        while len(self._writers) > self.max_clients:
+            self._writers.popitem(last=False)
+            self.evictions += 1
+
+    def reads_from_primary(self, client: str, now: Optional[float] = None) -> bool:
+        """Whether a read by `client` has to go to the primary to see its own writes."""
+        deadline = self._writers.get(client)
+        if deadline is not None:
+            now = time.monotonic() if now is None else now
+            if now < deadline:
+                self.primary_reads += 1
+                return True
+            del self._writers[client]
+        self.replica_reads += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "recent_writers": len(self._writers),
+            "writes": self.writes,
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads,
+            "evictions": self.evictions,
+        }
+
+read_your_writes = ReadYourWrites(
+    window=float(os.getenv("READ_YOUR_WRITES_WINDOW", "5")),
+    max_clients=int(os.getenv("READ_YOUR_WRITES_MAX_CLIENTS", "10000")),
+)
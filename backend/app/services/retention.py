@@ -0,0 +1,274 @@
+import asyncio
+import gzip
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+
+from app.repositories.analytics_repository import (
+    archive_rows_repository,
+    delete_expired_rows_repository,
+    detach_visit_event_partition_repository,
+    drop_detached_partition_repository,
+    get_visit_event_partitions_repository,
+    is_visit_events_partitioned_repository,
+    move_detached_partition_rows_repository,
+    RETENTION_TABLES
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where aged-out rows go: an archive table in the same database, gzipped
+# NDJSON files in RETENTION_ARCHIVE_DIR, or nowhere.
+ARCHIVE_MODES = ("table", "file", "none")
+
+class ArchiveFiles:
+    """
+    Appends aged-out rows to one gzipped NDJSON file per table and day in
+    `directory`. Every batch is written as its own gzip member and synced to
+    disk before the rows are deleted, so a crash can at worst archive a batch
+    twice, never lose one.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, table_name: str, day: datetime) -> str:
+        return os.path.join(self.directory, f"{table_name}-{day:%Y%m%d}.ndjson.gz")
+
+    def _write(self, path: str, rows: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        data = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+        with open(path, "ab") as f:
+            f.write(gzip.compress(data, compresslevel=6))
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def write(self, table_name: str, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            await asyncio.to_thread(self._write, self.path(table_name, datetime.utcnow()), rows)
+
+class RetentionJob:
+    """
+    Background job ageing out page_visits and visit_events rows dated more
+    than `days` days ago.
+
+    Rows are deleted in batches of `batch_size`, each in its own short
+    transaction, with `batch_pause` seconds between batches so the job never
+    holds locks for long or starves the API of connections. Deleted rows are
+    archived first (to the archive tables or to files, see ARCHIVE_MODES), in
+    the same transaction for tables and before the commit for files.
+
+    On PostgreSQL, when visit_events is partitioned by month (migration
+    0005), partitions entirely older than the cutoff are detached instead,
+    which removes their rows from the table at once; they are then archived
+    and dropped. The partitions of the coming months are created by
+    app.services.partitions, which runs whether or not retention is on.
+    `on_purge`, if given, is awaited with the URLs of the page_visits rows
+    removed by each batch.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        days: int,
+        archive: str = "table",
+        archive_dir: str = "./archive",
+        batch_size: int = 1000,
+        batch_pause: float = 0.1,
+        interval: float = 3600,
+        on_purge: Optional[Callable[[List[str]], Awaitable[None]]] = None,
+    ):
+        if archive not in ARCHIVE_MODES:
+            raise ValueError(f"Unknown retention archive mode {archive!r}; expected one of {', '.join(ARCHIVE_MODES)}")
+        self._session_factory = session_factory
+        self._on_purge = on_purge
+        self._task: Optional[asyncio.Task] = None
+        self._run_lock = asyncio.Lock()
+        self._batch_lock = asyncio.Lock()
+        self.days = days
+        self.archive = archive
+        self.archive_files = ArchiveFiles(archive_dir) if archive == "file" else None
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+
+        self.run_count = 0
+        self.failed_run_count = 0
+        self.purged_rows: Dict[str, int] = {name: 0 for name in RETENTION_TABLES}
+        self.dropped_partitions = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        return (now or datetime.utcnow()) - timedelta(days=self.days)
+
+    async def start(self) -> None:
+        """Start the background task; the first run happens right away."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                "Retention job started (days=%s, archive=%s, interval=%ss)", self.days, self.archive, self.interval
+            )
+
+    async def stop(self) -> None:
+        """Stop the background task, letting a batch in progress finish first."""
+        if self._task is not None:
+            async with self._batch_lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Retention job stopped")
+
+    async def _archive(self, session, table_name: str, rows: List[Dict[str, Any]]) -> None:
+        if self.archive == "table":
+            await archive_rows_repository(session, table_name, rows)
+        elif self.archive == "file":
+            await self.archive_files.write(table_name, rows)
+
+    async def _purge_batch(self, table_name: str, cutoff: datetime) -> int:
+        async with self._batch_lock, self._session_factory() as session:
+            rows = await delete_expired_rows_repository(session, table_name, cutoff, self.batch_size)
+            if rows:
+                await self._archive(session, table_name, rows)
+            await session.commit()
+        self.purged_rows[table_name] += len(rows)
+        if rows and table_name == "page_visits" and self._on_purge is not None:
+            await self._on_purge([row["url"] for row in rows])
+        return len(rows)
+
+    async def _manage_partitions(self, cutoff: datetime) -> None:
+        async with self._batch_lock, self._session_factory() as session:
+            if not await is_visit_events_partitioned_repository(session):
+                return
+            expired = [
+                name for name, upper in await get_visit_event_partitions_repository(session)
+                if upper is not None and upper <= cutoff
+            ]
+            for name in expired:
+                await detach_visit_event_partition_repository(session, name)
+            await session.commit()
+
+        for name in expired:
+            # The partition is no longer part of visit_events, so emptying it
+            # in batches does not lock anything the API uses.
+            if self.archive != "none":
+                while True:
+                    async with self._batch_lock, self._session_factory() as session:
+                        rows = await move_detached_partition_rows_repository(session, name, self.batch_size)
+                        await self._archive(session, "visit_events", rows)
+                        await session.commit()
+                    self.purged_rows["visit_events"] += len(rows)
+                    if len(rows) < self.batch_size:
+                        break
+                    await asyncio.sleep(self.batch_pause)
+            async with self._batch_lock, self._session_factory() as session:
+                await drop_detached_partition_repository(session, name)
+                await session.commit()
+            self.dropped_partitions += 1
+            logger.info("Dropped visit_events partition %s", name)
+
+    async def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Age out everything older than the cutoff. Returns the rows removed per table."""
+        async with self._run_lock:
+            start = time.perf_counter()
+            cutoff = self.cutoff(now)
+            before = dict(self.purged_rows)
+            try:
+                await self._manage_partitions(cutoff)
+                for table_name in RETENTION_TABLES:
+                    while await self._purge_batch(table_name, cutoff) == self.batch_size:
+                        await asyncio.sleep(self.batch_pause)
+            except Exception as e:
+                self.failed_run_count += 1
+                logger.error("Error in retention run: %s", e)
+                raise
+            finally:
+                self.last_run_at = datetime.utcnow()
+                self.last_run_seconds = time.perf_counter() - start
+            self.run_count += 1
+            removed = {name: self.purged_rows[name] - before[name] for name in RETENTION_TABLES}
+            logger.info("Retention run removed %s rows older than %s", removed, cutoff)
+            return removed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                # Already logged; try again at the next interval.
+                pass
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "running": self.running,
+            "days": self.days,
+            "archive": self.archive,
+            "batch_size": self.batch_size,
+            "interval_seconds": self.interval,
+            "run_count": self.run_count,
+            "failed_run_count": self.failed_run_count,
+            "purged_rows": dict(self.purged_rows),
+            "dropped_partitions": self.dropped_partitions,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+_retention_job: Optional[RetentionJob] = None
+
+def get_retention_job() -> Optional[RetentionJob]:
+    """Return the running retention job, or None when retention is off."""
+    return _retention_job
+
+async def start_retention_job(
+    session_factory: Optional[Callable] = None,
+    on_purge: Optional[Callable[[List[str]], Awaitable[None]]] = None,
+) -> Optional[RetentionJob]:
+    """
+    Start the retention job if RETENTION_DAYS is set to a positive number of
+    days. The archive mode, archive directory, batch size, pause between
+    batches and run interval are read from RETENTION_ARCHIVE,
+    RETENTION_ARCHIVE_DIR, RETENTION_BATCH_SIZE, RETENTION_BATCH_PAUSE and
+    RETENTION_INTERVAL.
+    """
+    global _retention_job
+    days = int(os.getenv("RETENTION_DAYS", "0"))
+    if days <= 0:
+        return None
+
+    if session_factory is None:
+        from app.db.database import get_session_factory
+        session_factory = get_session_factory()
+
+    _retention_job = RetentionJob(
+        session_factory,
+        days=days,
+        archive=os.getenv("RETENTION_ARCHIVE", "table"),
+        archive_dir=os.getenv("RETENTION_ARCHIVE_DIR", "./archive"),
+        batch_size=int(os.getenv("RETENTION_BATCH_SIZE", "1000")),
+        batch_pause=float(os.getenv("RETENTION_BATCH_PAUSE", "0.1")),
+        interval=float(os.getenv("RETENTION_INTERVAL", "3600")),
+        on_purge=on_purge,
+    )
+    await _retention_job.start()
+    return _retention_job
+
+async def stop_retention_job() -> None:
+    """Stop the retention job, if one is running."""
+    global _retention_job
+    if _retention_job is not None:
+        await _retention_job.stop()
+        _retention_job = None
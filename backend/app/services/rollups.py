@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories.analytics_repository import (
+    add_to_rollups_repository,
+    get_visit_events_after_repository,
+    lock_rollup_watermark_repository,
+    set_rollup_watermark_repository
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Name of the high-water mark row in visit_rollup_state.
+WATERMARK = "visit_rollups"
+
+class VisitRollups:
+    """
+    Background task adding new visit_events rows to the hourly and daily
+    rollups every `interval` seconds, so the ingest path only appends to the
+    log and the rollup rows of a hot page are written once per batch
+    instead of once per visit.
+
+    Events are rolled up in id order, in batches of `batch_size`, and a
+    high-water mark stored in visit_rollup_state records the last one
+    applied, in the same transaction as the rollup upserts, so every event
+    is counted exactly once. On PostgreSQL, ids are handed out before the
+    inserting transactions commit, so a missing id may belong to a
+    transaction that has not committed yet: the roll-up stops in front of
+    it and waits. An id still missing after `gap_timeout` seconds is taken
+    to belong to a rolled-back write and skipped. The mark is locked while
+    a batch is applied, so several processes can run the task.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        interval: float = 5.0,
+        batch_size: int = 5000,
+        gap_timeout: float = 60.0,
+    ):
+        self.enabled = enabled
+        self.interval = interval
+        self.batch_size = batch_size
+        self.gap_timeout = gap_timeout
+        self._session_factory: Optional[Callable] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        # First id of each gap -> monotonic time it was first seen.
+        self._gaps: Dict[int, float] = {}
+        self.last_event_id = 0
+        self.rolled_up_events = 0
+        self.skipped_ids = 0
+        self.run_count = 0
+        self.failed_run_count = 0
+        self.last_run_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _roll_up_batch(self, db: AsyncSession, now: float) -> bool:
+        """Apply one batch. Returns whether more events may be waiting."""
+        watermark = await lock_rollup_watermark_repository(db, WATERMARK)
+        events = await get_visit_events_after_repository(db, watermark, self.batch_size)
+        expected = watermark + 1
+        applied = []
+        stalled = False
+        for event in events:
+            if event.id != expected:
+                first_seen = self._gaps.setdefault(expected, now)
+                if now - first_seen < self.gap_timeout:
+                    stalled = True
+                    break
+                logger.warning("Skipping visit_events ids %s to %s in the rollups", expected, event.id - 1)
+                self.skipped_ids += event.id - expected
+            applied.append(event)
+            expected = event.id + 1
+        if not applied:
+            await db.rollback()
+            return False
+        await add_to_rollups_repository(db, applied)
+        await set_rollup_watermark_repository(db, WATERMARK, applied[-1].id)
+        await db.commit()
+        self.last_event_id = applied[-1].id
+        self.rolled_up_events += len(applied)
+        self._gaps = {start: seen for start, seen in self._gaps.items() if start > self.last_event_id}
+        return not stalled and len(events) == self.batch_size
+
+    async def roll_up(self, db: AsyncSession, now: Optional[float] = None) -> int:
+        """Add every event logged since the last run to the rollups. Returns how many were added."""
+        now = time.monotonic() if now is None else now
+        async with self._lock:
+            start = time.perf_counter()
+            before = self.rolled_up_events
+            try:
+                while await self._roll_up_batch(db, now):
+                    pass
+            except Exception as e:
+                await db.rollback()
+                self.failed_run_count += 1
+                logger.error("Error rolling up visit events: %s", e)
+                raise
+            self.run_count += 1
+            self.last_run_seconds = time.perf_counter() - start
+            return self.rolled_up_events - before
+
+    async def start(self, session_factory: Callable) -> None:
+        """Start rolling up every `interval` seconds with sessions from `session_factory`."""
+        self._session_factory = session_factory
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Visit rollups started (interval=%ss)", self.interval)
+
+    async def stop(self) -> None:
+        """Stop the background task and roll up what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                async with self._session_factory() as session:
+                    await self.roll_up(session)
+            except Exception:
+                # Already logged; the next start picks the events up.
+                pass
+            logger.info("Visit rollups stopped")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self._session_factory() as session:
+                    await self.roll_up(session)
+            except Exception:
+                # Already logged; retried on the next run.
+                pass
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "last_event_id": self.last_event_id,
+            "rolled_up_events": self.rolled_up_events,
+            "skipped_ids": self.skipped_ids,
+            "pending_gaps": len(self._gaps),
+            "run_count": self.run_count,
+            "failed_run_count": self.failed_run_count,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+visit_rollups = VisitRollups(
+    enabled=os.getenv("ROLLUP_ENABLED", "true").lower() in ("1", "true", "yes"),
+    interval=float(os.getenv("ROLLUP_INTERVAL", "5")),
+    batch_size=int(os.getenv("ROLLUP_BATCH_SIZE", "5000")),
+    gap_timeout=float(os.getenv("ROLLUP_GAP_TIMEOUT", "60")),
+)
+
+async def start_visit_rollups(session_factory: Optional[Callable] = None) -> None:
+    """Start rolling up visit events in the background, if enabled."""
+    if not visit_rollups.enabled:
+        return
+    if session_factory is None:
+        from app.db.database import get_session_factory
+        session_factory = get_session_factory()
+    await visit_rollups.start(session_factory)
+
+async def stop_visit_rollups() -> None:
+    """Stop the background roll-up and apply what is left."""
+    await visit_rollups.stop()
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.models import PageVisit
+from app.core.schemas import Visit
+from app.repositories.analytics_repository import get_top_visits_repository
+
+class TopVisits:
+    """
+    The `capacity` most-visited pages by total_visits, kept in memory so
+    GET /top reads the first K entries of an already sorted list.
+
+    The ingest path offers every visit it writes, with the total_visits the
+    database returned. Totals only grow, so a page outside the tracked set
+    can only enter it through a write, and the set stays the true top
+    `capacity` as long as every write is seen. `floor` bounds the total of
+    every page outside the set; a top-K answer is exact when its K-th entry
+    is at or above it. Pages removed by retention leave the set short, and
+    pages written after that may rank above untracked ones, which makes
+    answers approximate until the set is reloaded from the database, which
+    reads `capacity` rows from the total_visits index.
+
+    Like the latest-visit slot, the set is per process: with several
+    workers each one only sees its own writes between reloads.
+    """
+
+    def __init__(self, enabled: bool = True, capacity: int = 1000, refresh_interval: float = 0):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.refresh_interval = refresh_interval
+        self._lock = asyncio.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self._visits: Dict[str, Visit] = {}
+        # (-total_visits, url), so the most visited page comes first.
+        self._order: List[Tuple[int, str]] = []
+        self._floor = 0
+        self._pending: Optional[List[Visit]] = None
+        self._loaded_monotonic: Optional[float] = None
+        self.loads = 0
+        self.offers = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_monotonic is not None
+
+    def needs_load(self) -> bool:
+        """Whether the set was never loaded or is older than `refresh_interval` seconds."""
+        if self._loaded_monotonic is None:
+            return True
+        return self.refresh_interval > 0 and time.monotonic() - self._loaded_monotonic >= self.refresh_interval
+
+    def load(self, visits: Iterable[PageVisit]) -> None:
+        """
+        Replace the set with `visits`, the most visited pages in descending
+        order of total_visits, at most `capacity` of them.
+        """
+        pending, self._pending = self._pending or [], None
+        self._visits = {}
+        self._order = []
+        for visit in visits:
+            snapshot = Visit.model_validate(visit, from_attributes=True)
+            self._visits[snapshot.url] = snapshot
+            self._order.append((-snapshot.total_visits, snapshot.url))
+        self._order.sort()
+        # A full set may have left pages out; none of them has more visits
+        # than the last one read.
+        self._floor = -self._order[-1][0] if len(self._order) >= self.capacity else 0
+        for snapshot in pending:
+            self._offer(snapshot)
+        self._loaded_monotonic = time.monotonic()
+        self.loads += 1
+
+    async def refresh(self, db: AsyncSession) -> None:
+        """Reload the set from the database."""
+        async with self._lock:
+            # Offers made while the query runs are replayed on top of its
+            # result, in case they committed after the query's snapshot.
+            self._pending = []
+            try:
+                visits = await get_top_visits_repository(db, self.capacity)
+            except Exception:
+                self._pending = None
+                raise
+            self.load(visits)
+
+    async def ensure_exact(self, db: AsyncSession, k: int) -> None:
+        """Reload the set if it was never loaded, is stale, or cannot answer `k` exactly."""
+        if self.needs_load() or not self.is_exact(k):
+            await self.refresh(db)
+
+    def _remove(self, url: str) -> None:
+        snapshot = self._visits.pop(url)
+        position = bisect_left(self._order, (-snapshot.total_visits, url))
+        del self._order[position]
+
+    def _offer(self, snapshot: Visit) -> None:
+        current = self._visits.get(snapshot.url)
+        if current is not None:
+            if snapshot.total_visits < current.total_visits:
+                # An older write, reported after a newer one.
+                return
+            self._remove(snapshot.url)
+        elif len(self._order) >= self.capacity:
+            lowest_total = -self._order[-1][0]
+            if snapshot.total_visits <= lowest_total:
+                self._floor = max(self._floor, snapshot.total_visits)
+                return
+            _, evicted_url = self._order.pop()
+            del self._visits[evicted_url]
+            self._floor = max(self._floor, lowest_total)
+        self._visits[snapshot.url] = snapshot
+        insort(self._order, (-snapshot.total_visits, snapshot.url))
+
+    def offer(self, visit: PageVisit) -> None:
+        """Record the new total_visits of a page that was just written."""
+        if not self.enabled:
+            return
+        self.offers += 1
+        current = self._visits.get(visit.url)
+        if (
+            current is None
+            and len(self._order) >= self.capacity
+            and visit.total_visits <= -self._order[-1][0]
+            and self._pending is None
+        ):
+            # The common case for a long tail of pages: not a candidate, so
+            # no snapshot is built.
+            self._floor = max(self._floor, visit.total_visits)
+            return
+        snapshot = Visit.model_validate(visit, from_attributes=True)
+        if self._pending is not None:
+            self._pending.append(snapshot)
+        self._offer(snapshot)
+
+    def remove(self, urls: Iterable[str]) -> None:
+        """Drop pages deleted from the database."""
+        for url in urls:
+            if url in self._visits:
+                self._remove(url)
+
+    def is_exact(self, k: int) -> bool:
+        """Whether the first `k` entries are the true top `k` (as far as this process has seen)."""
+        if len(self._order) < k:
+            return self._floor == 0
+        return -self._order[k - 1][0] >= self._floor
+
+    def top(self, k: int) -> List[Visit]:
+        """The `k` most visited pages, most visited first."""
+        return [self._visits[url] for _, url in self._order[:k]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "tracked": len(self._order),
+            "floor": self._floor,
+            "loads": self.loads,
+            "offers": self.offers,
+        }
+
+top_visits = TopVisits(
+    enabled=os.getenv("TOP_K_ENABLED", "true").lower() in ("1", "true", "yes"),
+    capacity=int(os.getenv("TOP_K_CAPACITY", "1000")),
+    refresh_interval=float(os.getenv("TOP_K_REFRESH_INTERVAL", "0")),
+)
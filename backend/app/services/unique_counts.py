@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.hyperloglog import HyperLogLog
+from app.core.models import PageVisit
+from app.core.urls import url_hash, url_host
+from app.repositories.analytics_repository import (
+    get_unique_sketches_repository,
+    lock_unique_sketches_repository,
+    update_unique_sketches_repository,
+    SketchKey
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Distinct pages, and distinct hosts (only counted across all sites).
+COUNTERS = ("pages", "hosts")
+
+# Scope of the counters kept across all sites.
+ALL_SITES = ""
+
+class UniqueCounters:
+    """
+    Approximate distinct counts of pages and hosts visited per day, overall
+    and per host, kept as HyperLogLog sketches (see app.core.hyperloglog).
+
+    The ingest path adds every visit it writes to the sketches of its day.
+    Sketches changed since the last flush are merged into the stored ones
+    (register by register, so every process's visits are kept) every
+    `flush_interval` seconds by a background task, and once more when it
+    stops. Sketches of days older than `keep_days` are dropped from memory
+    once flushed. Reads merge the stored sketches with this process's
+    unflushed ones, so they include its visits right away.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        precision: int = 14,
+        per_host: bool = True,
+        flush_interval: float = 10.0,
+        keep_days: int = 2,
+    ):
+        self.enabled = enabled
+        self.precision = precision
+        self.per_host = per_host
+        self.flush_interval = flush_interval
+        self.keep_days = keep_days
+        self._session_factory: Optional[Callable] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self._sketches: Dict[SketchKey, HyperLogLog] = {}
+        self._dirty: Set[SketchKey] = set()
+        self.added = 0
+        self.flush_count = 0
+        self.failed_flush_count = 0
+        self.flushed_sketches = 0
+        self.last_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _add(self, key: SketchKey, value: int) -> None:
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = HyperLogLog(self.precision)
+        if sketch.add_hash(value):
+            self._dirty.add(key)
+
+    def add(self, visit: PageVisit) -> None:
+        """Count a visit that was just written."""
+        if not self.enabled:
+            return
+        day = visit.datetime_visited.date()
+        url = visit.url
+        # Rows returned by the upsert already carry both.
+        host = visit.host or url_host(url)
+        page = visit.url_hash or url_hash(url)
+        self._add((day, "pages", ALL_SITES), page)
+        self._add((day, "hosts", ALL_SITES), url_hash(host))
+        if self.per_host and host:
+            self._add((day, "pages", host), page)
+        self.added += 1
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Merge the sketches changed since the last flush into the stored ones. Returns how many were written."""
+        async with self._flush_lock:
+            keys = sorted(self._dirty)
+            if not keys:
+                return 0
+            start = time.perf_counter()
+            # Changes made from here on mark their sketch dirty again.
+            self._dirty = set()
+            try:
+                stored = await lock_unique_sketches_repository(db, keys, self.precision)
+                updates: Dict[SketchKey, Tuple[int, bytes]] = {}
+                for key in keys:
+                    merged = HyperLogLog(self.precision)
+                    merged.merge(self._sketches[key])
+                    precision, registers = stored.get(key, (self.precision, b""))
+                    if registers and precision == self.precision:
+                        merged.merge_registers(zlib.decompress(registers))
+                    elif registers:
+                        logger.warning(
+                            "Replacing stored %s sketch with precision %s by one with precision %s",
+                            key, precision, self.precision
+                        )
+                    updates[key] = (self.precision, merged.to_bytes())
+                await update_unique_sketches_repository(db, updates)
+                await db.commit()
+            except Exception as e:
+                self._dirty.update(keys)
+                self.failed_flush_count += 1
+                logger.error("Error flushing distinct-count sketches: %s", e)
+                raise
+            self.flush_count += 1
+            self.flushed_sketches += len(keys)
+            self.last_flush_seconds = time.perf_counter() - start
+            self._evict()
+            return len(keys)
+
+    def _evict(self) -> None:
+        oldest = datetime.utcnow().date() - timedelta(days=self.keep_days - 1)
+        for key in [key for key in self._sketches if key[0] < oldest and key not in self._dirty]:
+            del self._sketches[key]
+
+    async def estimate(
+        self, db: AsyncSession, counter: str, scope: str, start: date, end: date
+    ) -> Tuple[Dict[date, float], float]:
+        """
+        Estimated distinct count of `counter` in `scope` for each day in
+        [start, end], and for the whole range (the size of the union, not
+        the sum of the days).
+        """
+        days: Dict[date, HyperLogLog] = {}
+        for row in await get_unique_sketches_repository(db, counter, scope, start, end):
+            if row.registers and row.precision == self.precision:
+                days.setdefault(row.day, HyperLogLog(self.precision)).merge_registers(zlib.decompress(row.registers))
+        for (day, key_counter, key_scope), sketch in list(self._sketches.items()):
+            if key_counter == counter and key_scope == scope and start <= day <= end:
+                days.setdefault(day, HyperLogLog(self.precision)).merge(sketch)
+        union = HyperLogLog.union(days.values(), self.precision)
+        return {day: sketch.estimate() for day, sketch in sorted(days.items())}, union.estimate()
+
+    async def start(self, session_factory: Callable) -> None:
+        """Start flushing every `flush_interval` seconds with sessions from `session_factory`."""
+        self._session_factory = session_factory
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Distinct counters started (precision=%s, interval=%ss)", self.precision, self.flush_interval)
+
+    async def stop(self) -> None:
+        """Stop the background task and flush what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                async with self._session_factory() as session:
+                    await self.flush(session)
+            except Exception:
+                # Already logged; the unflushed counts are lost with the process.
+                pass
+            logger.info("Distinct counters stopped")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                async with self._session_factory() as session:
+                    await self.flush(session)
+            except Exception:
+                # Already logged; the sketches stay dirty for the next flush.
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "precision": self.precision,
+            "relative_error": HyperLogLog(self.precision).relative_error,
+            "sketches": len(self._sketches),
+            "dirty": len(self._dirty),
+            "added": self.added,
+            "flush_count": self.flush_count,
+            "failed_flush_count": self.failed_flush_count,
+            "flushed_sketches": self.flushed_sketches,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+unique_counters = UniqueCounters(
+    enabled=os.getenv("UNIQUE_COUNTS_ENABLED", "true").lower() in ("1", "true", "yes"),
+    precision=int(os.getenv("UNIQUE_COUNTS_PRECISION", "14")),
+    per_host=os.getenv("UNIQUE_COUNTS_PER_HOST", "true").lower() in ("1", "true", "yes"),
+    flush_interval=float(os.getenv("UNIQUE_COUNTS_FLUSH_INTERVAL", "10")),
+)
+
+async def start_unique_counters(session_factory: Optional[Callable] = None) -> None:
+    """Start flushing the distinct counters in the background, if they are enabled."""
+    if not unique_counters.enabled:
+        return
+    if session_factory is None:
+        from app.db.database import get_session_factory
+        session_factory = get_session_factory()
+    await unique_counters.start(session_factory)
+
+async def stop_unique_counters() -> None:
+    """Stop the background flush and write what is left."""
+    await unique_counters.stop()
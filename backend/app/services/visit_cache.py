@@ -0,0 +1,184 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.models import PageVisit
+from app.core.schemas import Visit
+
+class CacheBackend(ABC):
+    """
+    Storage interface for the per-URL visit cache. Values are opaque bytes so
+    that a shared cache (for example Redis or memcached) can implement the
+    same interface as the in-process default.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the value stored under `key`, or None on a miss or expiry."""
+
+    @abstractmethod
+    async def peek(self, key: str) -> Optional[bytes]:
+        """Like get(), without counting a lookup or marking the entry as used."""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Store `value` under `key` for `ttl` seconds."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove `key` if present."""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Remove every entry."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters plus current usage."""
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    Process-local LRU cache with per-entry expiry, bounded by the total size of
+    the stored keys and values in bytes and, optionally, by entry count.
+    """
+
+    # Rough per-entry bookkeeping cost (dict slot, tuple, float) counted against max_bytes.
+    ENTRY_OVERHEAD_BYTES = 120
+
+    def __init__(self, max_bytes: int, max_entries: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _entry_size(self, key: str, value: bytes) -> int:
+        return len(key.encode()) + len(value) + self.ENTRY_OVERHEAD_BYTES
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._bytes -= self._entry_size(key, value)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def peek(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        size = self._entry_size(key, value)
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._bytes += size
+        while self._bytes > self.max_bytes or (
+            self.max_entries is not None and len(self._entries) > self.max_entries
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class VisitCache:
+    """
+    Read-through cache of per-URL visit records in front of the database.
+    Records are stored as the JSON of the Visit schema. The ingest path
+    overwrites the entry of every URL it writes; the TTL bounds how long an
+    entry can miss writes made by other workers.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 60.0, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+
+    async def get(self, url: str) -> Optional[Visit]:
+        if not self.enabled:
+            return None
+        value = await self.backend.get(url)
+        return Visit.model_validate_json(value) if value is not None else None
+
+    async def set(self, visit: PageVisit) -> None:
+        if not self.enabled:
+            return
+        value = Visit.model_validate(visit, from_attributes=True).model_dump_json().encode()
+        await self.backend.set(visit.url, value, self.ttl)
+
+    async def fill(self, visit: PageVisit) -> None:
+        """
+        Store a record read from the database after a miss, unless the entry
+        was set meanwhile from a newer one: an ingest that committed after
+        the read must not be overwritten with the older values. Totals and
+        visit times only grow, so they tell which record is newer.
+        """
+        if not self.enabled:
+            return
+        current = await self.backend.peek(visit.url)
+        if current is not None:
+            cached = Visit.model_validate_json(current)
+            if (cached.total_visits, cached.datetime_visited) >= (visit.total_visits, visit.datetime_visited):
+                return
+        await self.set(visit)
+
+    async def invalidate(self, url: str) -> None:
+        if self.enabled:
+            await self.backend.delete(url)
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.backend.stats(), enabled=self.enabled, ttl_seconds=self.ttl)
+
+visit_cache = VisitCache(
+    InMemoryCacheBackend(
+        max_bytes=int(os.getenv("VISIT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        max_entries=int(os.environ["VISIT_CACHE_MAX_ENTRIES"]) if os.getenv("VISIT_CACHE_MAX_ENTRIES") else None,
+    ),
+    ttl=float(os.getenv("VISIT_CACHE_TTL", "60")),
+    enabled=os.getenv("VISIT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from app.core.models import PageVisit
+from app.core.schemas import Visit
+
+class Subscription:
+    """
+    One subscriber's pending updates, keyed by URL. A newer update for a URL
+    that is still pending replaces the older one (coalescing), and when
+    `max_pending` distinct URLs are pending the oldest is dropped, so a slow
+    consumer holds at most `max_pending` updates no matter how far behind it is.
+    """
+
+    def __init__(self, url: Optional[str], max_pending: int):
+        self.url = url
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, bytes]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self.coalesced = 0
+        self.dropped = 0
+
+    def push(self, url: str, payload: bytes) -> None:
+        if url in self._pending:
+            self._pending[url] = payload
+            self._pending.move_to_end(url)
+            self.coalesced += 1
+        else:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[url] = payload
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Wait for the oldest pending update; None if `timeout` seconds pass first."""
+        if not self._pending:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        _, payload = self._pending.popitem(last=False)
+        return payload
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+class TooManySubscribers(Exception):
+    """Raised when the broadcaster already has its maximum number of subscribers."""
+
+class VisitBroadcaster:
+    """
+    Fans out visits written by this process to stream subscribers. Each visit
+    is encoded once and pushed to every matching subscription without
+    waiting, so the ingest path never blocks on a slow client. Like the
+    latest-visit slot, the broadcaster is per process: with several workers,
+    a subscriber only receives the visits written by the worker it is
+    connected to.
+    """
+
+    def __init__(self, enabled: bool = True, max_subscribers: int = 1000, max_pending: int = 100):
+        self.enabled = enabled
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        # Weak references, so a subscription whose stream was abandoned before
+        # it could unsubscribe goes away with it.
+        self._subscriptions: "weakref.WeakSet[Subscription]" = weakref.WeakSet()
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def subscribe(self, url: Optional[str] = None) -> Subscription:
+        """Subscribe to every visit, or only to visits of the normalized `url`."""
+        if len(self._subscriptions) >= self.max_subscribers:
+            raise TooManySubscribers(f"Subscriber limit of {self.max_subscribers} reached")
+        subscription = Subscription(url, self.max_pending)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.discard(subscription)
+            self.coalesced += subscription.coalesced
+            self.dropped += subscription.dropped
+
+    def publish(self, visits: Iterable[PageVisit]) -> None:
+        if not self.enabled or not self._subscriptions:
+            return
+        for visit in visits:
+            payload = None
+            for subscription in list(self._subscriptions):
+                if subscription.url is not None and subscription.url != visit.url:
+                    continue
+                if payload is None:
+                    payload = Visit.model_validate(visit, from_attributes=True).model_dump_json().encode()
+                subscription.push(visit.url, payload)
+            if payload is not None:
+                self.published += 1
+
+    def stats(self) -> Dict[str, Any]:
+        subscriptions = list(self._subscriptions)
+        return {
+            "enabled": self.enabled,
+            "subscribers": len(subscriptions),
+            "max_subscribers": self.max_subscribers,
+            "max_pending": self.max_pending,
+            "pending": sum(subscription.pending() for subscription in subscriptions),
+            "published": self.published,
+            "coalesced": self.coalesced + sum(subscription.coalesced for subscription in subscriptions),
+            "dropped": self.dropped + sum(subscription.dropped for subscription in subscriptions),
+        }
+
+    def reset(self) -> None:
+        self._subscriptions.clear()
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+visit_broadcaster = VisitBroadcaster(
+    enabled=os.getenv("STREAM_ENABLED", "true").lower() in ("1", "true", "yes"),
+    max_subscribers=int(os.getenv("STREAM_MAX_SUBSCRIBERS", "1000")),
+    max_pending=int(os.getenv("STREAM_MAX_PENDING", "100")),
+)
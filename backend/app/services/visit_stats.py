@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.models import PageVisit
+from app.repositories.analytics_repository import STATS_COLUMNS as STATS_ROW_COLUMNS, stream_visit_stats_repository
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Metric columns summarized by GET /stats, in the order the repository returns them.
+STATS_COLUMNS = tuple(column.key for column in STATS_ROW_COLUMNS[2:])
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+class VisitStatsSnapshot:
+    """
+    Column-store snapshot of page_visits held in NumPy arrays, one int64 array
+    per metric plus a url_hash -> row index map. The first refresh loads the
+    table in batches; later refreshes only read rows whose datetime_visited is
+    at or past the high-water mark of the previous refresh (minus
+    `overlap_seconds`), overwriting the rows they touch. A write-behind flush
+    or a retried write can commit long after its datetime_visited, past the
+    overlap, so the process also `offer()`s every row it writes; only rows
+    written by other processes depend on the overlap. Rows removed from the database stay in the snapshot
+    until `reset()` is called. NumPy is only imported, and the arrays only
+    allocated, on the first refresh, so serving requests that never ask for
+    stats does not pay for either.
+    """
+
+    def __init__(self, batch_size: int = 50000, overlap_seconds: float = 5.0, refresh_interval: float = 5.0):
+        self.batch_size = batch_size
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.refresh_interval = refresh_interval
+        self._lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop all loaded rows so the next refresh reloads the whole table."""
+        self._index: Dict[int, int] = {}
+        self._columns: Dict[str, "np.ndarray"] = {}
+        self._size = 0
+        self.high_water: Optional[datetime] = None
+        self.refreshed_at: Optional[datetime] = None
+        self._refreshed_monotonic: Optional[float] = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _reserve(self, capacity: int) -> None:
+        import numpy as np
+
+        current = len(self._columns[STATS_COLUMNS[0]]) if self._columns else 0
+        if capacity <= current:
+            return
+        new_capacity = max(capacity, current * 2, 1024)
+        for name in STATS_COLUMNS:
+            grown = np.zeros(new_capacity, dtype=np.int64)
+            if name in self._columns:
+                grown[:self._size] = self._columns[name][:self._size]
+            self._columns[name] = grown
+
+    def _apply(self, rows: Sequence[Sequence[Any]]) -> None:
+        """Insert or overwrite a batch of (url_hash, datetime_visited, *STATS_COLUMNS) rows."""
+        import numpy as np
+
+        self._reserve(self._size + len(rows))
+        positions = np.empty(len(rows), dtype=np.int64)
+        for i, row in enumerate(rows):
+            position = self._index.get(row[0])
+            if position is None:
+                position = self._index[row[0]] = self._size
+                self._size += 1
+            positions[i] = position
+        values = np.array([row[2:] for row in rows], dtype=np.int64)
+        for offset, name in enumerate(STATS_COLUMNS):
+            self._columns[name][positions] = values[:, offset]
+
+    def _advance_high_water(self, rows: Sequence[Sequence[Any]]) -> None:
+        batch_high_water = max(row[1] for row in rows)
+        if self.high_water is None or batch_high_water > self.high_water:
+            self.high_water = batch_high_water
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Load rows changed since the last refresh. Returns the number of rows read."""
+        async with self._lock:
+            since = self.high_water - self.overlap if self.high_water is not None else None
+            read = 0
+            async for rows in stream_visit_stats_repository(db, since, self.batch_size):
+                self._apply(rows)
+                self._advance_high_water(rows)
+                read += len(rows)
+            self.refreshed_at = datetime.utcnow()
+            self._refreshed_monotonic = time.monotonic()
+            return read
+
+    async def offer(self, visits: Iterable[PageVisit]) -> None:
+        """
+        Overwrite the rows of visits this process just committed. Does not
+        move the high-water mark, which only tracks what refreshes have read.
+        Nothing is done before the first refresh, which loads every row.
+        """
+        if self.refreshed_at is None:
+            return
+        rows = [
+            (visit.url_hash, visit.datetime_visited, *(getattr(visit, name) for name in STATS_COLUMNS))
+            for visit in visits
+        ]
+        if not rows:
+            return
+        async with self._lock:
+            # A refresh that read the rows before this write committed has
+            # applied them by now; these values are newer.
+            self._apply(rows)
+
+    async def refresh_if_stale(self, db: AsyncSession) -> None:
+        """Refresh when the last refresh is older than `refresh_interval` seconds."""
+        if (
+            self._refreshed_monotonic is None
+            or time.monotonic() - self._refreshed_monotonic >= self.refresh_interval
+        ):
+            await self.refresh(db)
+
+    def column(self, name: str) -> "np.ndarray":
+        """The loaded values of a metric column (a view, not a copy)."""
+        if name not in self._columns:
+            import numpy as np
+
+            if name not in STATS_COLUMNS:
+                raise KeyError(name)
+            return np.zeros(0, dtype=np.int64)
+        return self._columns[name][:self._size]
+
+    def describe(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES, bins: int = 10) -> Dict[str, Any]:
+        """Count, mean, spread, percentiles and a histogram for each metric column."""
+        import numpy as np
+
+        columns = {}
+        for name in STATS_COLUMNS:
+            values = self.column(name)
+            if values.size == 0:
+                columns[name] = {"count": 0, "percentiles": {}, "histogram": {"bin_edges": [], "counts": []}}
+                continue
+            counts, edges = np.histogram(values, bins=bins)
+            columns[name] = {
+                "count": int(values.size),
+                "mean": float(values.mean()),
+                "std": float(values.std()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+                "percentiles": {
+                    f"p{p:g}": float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))
+                },
+                "histogram": {"bin_edges": edges.tolist(), "counts": counts.tolist()},
+            }
+        return {
+            "count": self._size,
+            "refreshed_at": self.refreshed_at,
+            "high_water": self.high_water,
+            "columns": columns,
+        }
+
+visit_stats_snapshot = VisitStatsSnapshot(
+    batch_size=int(os.getenv("STATS_BATCH_SIZE", "50000")),
+    refresh_interval=float(os.getenv("STATS_REFRESH_INTERVAL", "5")),
+)
@@ -6,9 +6,19 @@ import pytest
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.main import app
+from app.services.data_version import data_version
 from app.core.models import Base, PageVisit
+from app.services.idempotency import idempotency_keys
+from app.services.latest_visit import latest_visit_slot
+from app.services.read_your_writes import read_your_writes
+from app.services.rollups import visit_rollups
+from app.services.top_visits import top_visits
+from app.services.unique_counts import unique_counters
+from app.services.visit_cache import visit_cache
+from app.services.visit_events import visit_broadcaster
+from app.services.visit_stats import visit_stats_snapshot
 
 # Ensure the backend folder (parent of "app") is in sys.path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -34,6 +44,31 @@ def event_loop():
     yield loop
     loop.close()
 
+@pytest_asyncio.fixture(autouse=True)
+async def reset_in_memory_state(monkeypatch):
+    """Clear in-process read paths so state does not leak between tests."""
+    # An ETag rolling over mid-test would turn an expected 304 into a 200.
+    monkeypatch.setattr(data_version, "window", 0)
+    latest_visit_slot.clear()
+    await visit_cache.clear()
+    visit_stats_snapshot.reset()
+    visit_broadcaster.reset()
+    idempotency_keys.clear()
+    top_visits.clear()
+    unique_counters.clear()
+    read_your_writes.clear()
+    visit_rollups.clear()
+    yield
+    latest_visit_slot.clear()
+    await visit_cache.clear()
+    visit_stats_snapshot.reset()
+    visit_broadcaster.reset()
+    idempotency_keys.clear()
+    top_visits.clear()
+    unique_counters.clear()
+    read_your_writes.clear()
+    visit_rollups.clear()
+
 @pytest_asyncio.fixture(scope="function")
 async def session() -> AsyncSession:
     """Create a fresh database for each test function."""
@@ -52,12 +87,13 @@ async def session() -> AsyncSession:
 @pytest_asyncio.fixture
 async def async_client(session) -> AsyncClient:
     """Get a test client for the FastAPI app."""
-    # Define an override for the get_db dependency
+    # Define an override for the get_db and get_read_db dependencies
     async def override_get_db():
         yield session
     
-    # Register the override
+    # Register the overrides; reads and writes share the test database
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     
     # Use ASGITransport for newer versions of httpx
     transport = ASGITransport(app=app)
@@ -66,3 +102,4 @@ async def async_client(session) -> AsyncClient:
 
     # Remove the override after the test
     app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_read_db, None)
@@ -1,18 +1,46 @@
+import asyncio
 import pytest
+from types import SimpleNamespace
 import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import event, select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.db.database import Base
+from app.core.models import PageVisit, VisitEvent, HourlyVisitRollup
+from app.core.urls import url_hash
 from app.core.schemas import VisitCreate
+from app.services.rollups import VisitRollups
 from app.repositories.analytics_repository import (
+    _dialect_insert,
     create_or_update_visit_repository,
+    create_or_update_visits_repository,
     get_current_metrics_repository,
     get_visit_by_url_repository,
     get_all_visits_repository,
+    get_visit_timeseries_repository,
+    get_domain_stats_repository,
+    get_visit_rows_in_range_repository,
+    get_visit_range_buckets_repository,
 )
 
+def _session_for_dialect(name: str):
+    """Stand-in for a session bound to a database of dialect `name`."""
+    return SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=SimpleNamespace(name=name)))
+
+def test_upsert_rejects_unsupported_dialect():
+    with pytest.raises(RuntimeError, match="expected one of postgresql, sqlite"):
+        _dialect_insert(_session_for_dialect("mysql"), PageVisit)
+
+@pytest.mark.asyncio
+async def test_range_buckets_reject_unsupported_dialect():
+    with pytest.raises(RuntimeError, match="expected one of postgresql, sqlite"):
+        await get_visit_range_buckets_repository(
+            _session_for_dialect("mysql"), datetime(2026, 1, 1), datetime(2026, 1, 2), 3600
+        )
+
 # Use an in-memory SQLite database that persists across connections.
 DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
@@ -108,3 +136,166 @@ async def test_get_all_visits(session: AsyncSession):
     assert len(visits) == len(urls)
     returned_urls = {visit.url for visit in visits}
     assert set(urls) == returned_urls
+
+@pytest.mark.asyncio
+async def test_create_or_update_visits_batch(session: AsyncSession):
+    # Seed an existing record so the batch exercises both insert and update.
+    await create_or_update_visit_repository(session, VisitCreate(
+        url="http://example.com/a", link_count=1, word_count=10, image_count=0
+    ))
+
+    batch = [
+        VisitCreate(url="http://example.com/a", link_count=2, word_count=20, image_count=1),
+        VisitCreate(url="http://example.com/b", link_count=3, word_count=30, image_count=2),
+        VisitCreate(url="http://example.com/a", link_count=4, word_count=40, image_count=3),
+    ]
+    records = await create_or_update_visits_repository(session, batch)
+
+    # Duplicate URLs are merged: counts summed, last metrics kept.
+    assert set(records) == {"http://example.com/a", "http://example.com/b"}
+    assert records["http://example.com/a"].total_visits == 3
+    assert records["http://example.com/a"].link_count == 4
+    assert records["http://example.com/b"].total_visits == 1
+
+    visit = await get_visit_by_url_repository(session, "http://example.com/a")
+    assert visit.total_visits == 3
+    assert visit.word_count == 40
+
+@pytest.mark.asyncio
+async def test_concurrent_upserts_do_not_lose_increments(tmp_path):
+    # A file-backed database so every task gets its own connection, the way
+    # separate uvicorn workers would.
+    file_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'stress.db'}")
+    FileSessionLocal = sessionmaker(file_engine, class_=AsyncSession, expire_on_commit=False)
+    async with file_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    statements = []
+
+    @event.listens_for(file_engine.sync_engine, "before_cursor_execute")
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    visit_data = VisitCreate(
+        url="http://example.com/hot",
+        link_count=1,
+        word_count=10,
+        image_count=0
+    )
+    concurrency = 50
+
+    async def visit():
+        async with FileSessionLocal() as task_session:
+            return await create_or_update_visit_repository(task_session, visit_data)
+
+    try:
+        results = await asyncio.gather(*(visit() for _ in range(concurrency)))
+
+        # Every call succeeded, including the racing first visits.
+        assert len(results) == concurrency
+        # Two statements per visit: the event log append and the page_visits
+        # upsert. The rollups are filled in the background.
+        assert len(statements) == 2 * concurrency
+        assert all(statement.lstrip().upper().startswith("INSERT") for statement in statements)
+        for table in ("page_visits", "visit_events"):
+            assert sum(f"INTO {table} " in statement for statement in statements) == concurrency
+        # No lost increments; each caller observed a distinct count.
+        assert sorted(result.total_visits for result in results) == list(range(1, concurrency + 1))
+        async with FileSessionLocal() as check_session:
+            stored = await get_visit_by_url_repository(check_session, "http://example.com/hot")
+            assert stored.total_visits == concurrency
+    finally:
+        await file_engine.dispose()
+
+@pytest.mark.asyncio
+async def test_visits_are_logged_and_rolled_up(session: AsyncSession):
+    await create_or_update_visit_repository(session, VisitCreate(
+        url="http://example.com/a", link_count=2, word_count=10, image_count=1
+    ))
+    await create_or_update_visits_repository(session, [
+        VisitCreate(url="http://example.com/a", link_count=4, word_count=30, image_count=1),
+        VisitCreate(url="http://example.com/a", link_count=4, word_count=30, image_count=1),
+        VisitCreate(url="http://example.com/b", link_count=1, word_count=5, image_count=0),
+    ])
+
+    # The event log is append-only; a merged batch row records its visit count.
+    events = (await session.execute(select(VisitEvent).order_by(VisitEvent.id))).scalars().all()
+    assert [(e.url, e.visit_count) for e in events] == [
+        ("http://example.com/a", 1),
+        ("http://example.com/a", 2),
+        ("http://example.com/b", 1),
+    ]
+
+    # The rollups are only filled by the background roll-up.
+    assert (await session.execute(select(HourlyVisitRollup))).scalars().all() == []
+    assert await VisitRollups().roll_up(session) == 3
+
+    rollup = (await session.execute(
+        select(HourlyVisitRollup).where(HourlyVisitRollup.url_hash == url_hash("http://example.com/a"))
+    )).scalars().one()
+    assert rollup.visits == 3
+    assert rollup.link_count_sum == 2 + 4 * 2
+
+    now = datetime.utcnow()
+    for granularity in ("hour", "day"):
+        rows = await get_visit_timeseries_repository(
+            session, granularity, now - timedelta(days=1), now + timedelta(days=1)
+        )
+        assert len(rows) == 1
+        assert rows[0].visits == 4
+
+    rows = await get_visit_timeseries_repository(
+        session, "hour", now - timedelta(days=1), now + timedelta(days=1), "http://example.com/b"
+    )
+    assert [row.visits for row in rows] == [1]
+
+@pytest.mark.asyncio
+async def test_domain_stats_group_pages_by_stored_host(session: AsyncSession):
+    await create_or_update_visits_repository(session, [
+        VisitCreate(url="https://a.example.com/1", link_count=2, word_count=10, image_count=0),
+        VisitCreate(url="https://a.example.com/1", link_count=2, word_count=10, image_count=0),
+        VisitCreate(url="https://a.example.com/2", link_count=4, word_count=30, image_count=2),
+        VisitCreate(url="https://b.example.com:8080/", link_count=1, word_count=5, image_count=1),
+        VisitCreate(url="https://c.example.com/", link_count=1, word_count=5, image_count=1),
+        VisitCreate(url="https://c.example.com/", link_count=1, word_count=5, image_count=1),
+        VisitCreate(url="https://c.example.com/", link_count=1, word_count=5, image_count=1),
+    ])
+
+    rows = await get_domain_stats_repository(session)
+    assert [(row.host, row.pages, row.visits) for row in rows] == [
+        ("a.example.com", 2, 3),
+        ("c.example.com", 1, 3),
+        ("b.example.com", 1, 1),
+    ]
+    # Averages are per page, not per visit.
+    assert (rows[0].avg_link_count, rows[0].avg_word_count, rows[0].avg_image_count) == (3, 20, 1)
+
+    rows = await get_domain_stats_repository(session, sort="pages", skip=1, limit=1)
+    assert [row.host for row in rows] == ["b.example.com"]
+    rows = await get_domain_stats_repository(session, sort="host")
+    assert [row.host for row in rows] == ["a.example.com", "b.example.com", "c.example.com"]
+
+@pytest.mark.asyncio
+async def test_range_rows_and_buckets(session: AsyncSession):
+    start = datetime(2026, 1, 1)
+    for minute, words in ((0, 10), (5, 30), (9, 20), (10, 5), (59, 1), (60, 100)):
+        url = f"https://example.com/{minute}"
+        session.add(PageVisit(
+            url_hash=url_hash(url), url=url, datetime_visited=start + timedelta(minutes=minute, seconds=30),
+            link_count=1, word_count=words, image_count=0, total_visits=minute + 1,
+        ))
+    await session.commit()
+    end = start + timedelta(hours=1)
+
+    rows = await get_visit_rows_in_range_repository(session, start, end, limit=3)
+    assert [row.url for row in rows] == ["https://example.com/59", "https://example.com/10", "https://example.com/9"]
+    rows = await get_visit_rows_in_range_repository(
+        session, start, end, before=(rows[-1].datetime_visited, rows[-1].url_hash), limit=10
+    )
+    assert [row.url for row in rows] == ["https://example.com/5", "https://example.com/0"]
+
+    # Six 10-minute buckets; the visit at 01:00:30 is past the end.
+    rows = await get_visit_range_buckets_repository(session, start, end, 600.0)
+    assert [
+        (row.bucket, row.count, row.word_count_sum, row.word_count_max, row.total_visits_max) for row in rows
+    ] == [(0, 3, 60, 30, 10), (1, 1, 5, 5, 11), (5, 1, 1, 1, 60)]
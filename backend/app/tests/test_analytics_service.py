@@ -1,11 +1,20 @@
+import asyncio
+import tracemalloc
+from datetime import datetime, timedelta
 import pytest
 import pytest_asyncio
+from sqlalchemy import insert
+from app.core.models import PageVisit
+from app.core.urls import url_hash
 from app.core.schemas import VisitCreate
+from app.services.latest_visit import latest_visit_slot
 from app.services.analytics_service import (
     create_or_update_visit_service,
     get_current_metrics_service,
     get_visit_by_url_service,
     get_all_visits_service,
+    get_visits_page_service,
+    export_visits_service,
 )
 
 # Note: The "session" fixture will be provided by conftest.py.
@@ -83,3 +92,127 @@ async def test_service_get_all_visits(session):
     assert len(visits) == len(urls)
     returned_urls = {visit.url for visit in visits}
     assert set(urls) == returned_urls
+
+@pytest.mark.asyncio
+async def test_service_get_visits_page_walks_all_pages(session):
+    urls = [f"http://example.com/page/{i}" for i in range(5)]
+    for url in urls:
+        visit_data = VisitCreate(url=url, link_count=1, word_count=10, image_count=0)
+        await create_or_update_visit_service(session, visit_data)
+
+    seen = []
+    cursor = ""
+    pages = 0
+    while cursor is not None:
+        visits, cursor = await get_visits_page_service(session, cursor, limit=2)
+        seen.extend(visit.url for visit in visits)
+        pages += 1
+
+    # Every record appears exactly once, newest first.
+    assert pages == 3
+    assert sorted(seen) == sorted(urls)
+    offset_order = [visit.url for visit in await get_all_visits_service(session, 0, 10)]
+    assert seen == offset_order
+
+@pytest.mark.asyncio
+async def test_service_get_visits_page_rejects_invalid_cursor(session):
+    with pytest.raises(ValueError):
+        await get_visits_page_service(session, "not-a-cursor", limit=2)
+
+@pytest.mark.asyncio
+async def test_service_get_visits_page_rejects_empty_pages(session):
+    with pytest.raises(ValueError):
+        await get_visits_page_service(session, "", limit=0)
+
+@pytest.mark.asyncio
+async def test_service_current_metrics_served_from_memory(session):
+    visit_data = VisitCreate(
+        url="http://example.com/service_latest",
+        link_count=2,
+        word_count=20,
+        image_count=1,
+    )
+    await create_or_update_visit_service(session, visit_data)
+
+    # The ingest path filled the slot, so no database session is needed.
+    current = await get_current_metrics_service(None)
+    assert current.url == "http://example.com/service_latest"
+    assert current.total_visits == 1
+
+    # On a cold start the slot is refilled from the database.
+    latest_visit_slot.clear()
+    current = await get_current_metrics_service(session)
+    assert current.url == "http://example.com/service_latest"
+    assert latest_visit_slot.get().url == "http://example.com/service_latest"
+
+@pytest.mark.asyncio
+async def test_service_current_metrics_picks_up_other_workers_after_max_age(session, monkeypatch):
+    monkeypatch.setattr(latest_visit_slot, "max_age", 0.05)
+    visit_data = VisitCreate(url="http://example.com/this_worker", link_count=1, word_count=10, image_count=0)
+    await create_or_update_visit_service(session, visit_data)
+
+    # Another worker writes a newer visit straight to the database.
+    await session.execute(insert(PageVisit), [{
+        "url_hash": url_hash("http://example.com/other_worker"), "url": "http://example.com/other_worker",
+        "datetime_visited": datetime.utcnow() + timedelta(seconds=1), "link_count": 0, "word_count": 0,
+        "image_count": 0, "total_visits": 1,
+    }])
+    await session.commit()
+    assert (await get_current_metrics_service(None)).url == "http://example.com/this_worker"
+
+    await asyncio.sleep(0.06)
+    assert (await get_current_metrics_service(session)).url == "http://example.com/other_worker"
+    assert (await get_current_metrics_service(None)).url == "http://example.com/other_worker"
+
+@pytest.mark.asyncio
+async def test_service_normalizes_urls_on_ingest_and_lookup(session):
+    for url in (
+        "https://Example.com/article?id=7&utm_source=mail",
+        "https://example.com/article?id=7#comments",
+    ):
+        visit_data = VisitCreate(url=url, link_count=1, word_count=10, image_count=0)
+        visit = await create_or_update_visit_service(session, visit_data)
+
+    # Both variants land on the same record, stored under the canonical URL.
+    assert visit.url == "https://example.com/article?id=7"
+    assert visit.total_visits == 2
+
+    found = await get_visit_by_url_service(session, "https://EXAMPLE.com/article?id=7&fbclid=x")
+    assert found.total_visits == 2
+
+async def _seed_visits(session, start, count):
+    await session.execute(insert(PageVisit), [
+        {
+            "url_hash": url_hash(f"http://example.com/export/{i}"),
+            "url": f"http://example.com/export/{i}",
+            "datetime_visited": datetime(2024, 1, 1),
+            "link_count": i,
+            "word_count": 100,
+            "image_count": 1,
+            "total_visits": 1,
+        }
+        for i in range(start, start + count)
+    ])
+    await session.commit()
+
+async def _export_peak_memory(session):
+    tracemalloc.start()
+    try:
+        exported = 0
+        async for chunk in export_visits_service(session, "ndjson", batch_size=200):
+            exported += chunk.count(b"\n")
+        return exported, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@pytest.mark.asyncio
+async def test_service_export_memory_stays_flat(session):
+    await _seed_visits(session, 0, 1000)
+    small_count, small_peak = await _export_peak_memory(session)
+
+    await _seed_visits(session, 1000, 9000)
+    large_count, large_peak = await _export_peak_memory(session)
+
+    assert (small_count, large_count) == (1000, 10000)
+    # Ten times the rows must not mean ten times the memory.
+    assert large_peak < small_peak * 2
@@ -1,7 +1,18 @@
+import asyncio
+import csv
+import io
+import json
 import pytest
 import pytest_asyncio
+from datetime import datetime, timedelta
 from httpx import AsyncClient, ASGITransport
+from sqlalchemy import event, insert
+from app.core.models import PageVisit
+from app.core.urls import url_hash
 from app.main import app
+from app.routers import analytics
+from app.services.rollups import visit_rollups
+from app.services.top_visits import top_visits
 
 # The async_client fixture is provided by conftest.py.
 # We assume conftest.py has overridden the get_db dependency appropriately.
@@ -69,3 +80,349 @@ async def test_get_by_url_and_history(async_client: AsyncClient):
     assert len(history_data) == 2
     urls = {visit["url"] for visit in history_data}
     assert urls == {"http://example.com/test", "http://example.com/test2"}
+
+@pytest.mark.asyncio
+async def test_batch_create_or_update(async_client: AsyncClient):
+    payload = [
+        {"url": "http://example.com/batch", "link_count": 1, "word_count": 10, "image_count": 0},
+        {"url": "http://example.com/batch", "link_count": 2, "word_count": 20, "image_count": 1},
+        {"url": "http://example.com/invalid", "link_count": "many"},
+    ]
+    response = await async_client.post("/api/analytics/batch", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["accepted"] == 2
+    assert data["rejected"] == 1
+
+    results = data["results"]
+    assert [item["accepted"] for item in results] == [True, True, False]
+    assert results[0]["visit"]["total_visits"] == 2
+    assert results[1]["visit"]["link_count"] == 2
+    assert results[2]["url"] == "http://example.com/invalid"
+    assert results[2]["error"]
+
+@pytest.mark.asyncio
+async def test_history_cursor_pagination(async_client: AsyncClient):
+    for i in range(3):
+        payload = {"url": f"http://example.com/cursor/{i}", "link_count": 1, "word_count": 10, "image_count": 0}
+        response = await async_client.post("/api/analytics/", json=payload)
+        assert response.status_code == 200
+
+    response = await async_client.get("/api/analytics/history", params={"cursor": "", "limit": 2})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page["visits"]) == 2
+    assert first_page["next_cursor"]
+
+    response = await async_client.get(
+        "/api/analytics/history", params={"cursor": first_page["next_cursor"], "limit": 2}
+    )
+    second_page = response.json()
+    assert len(second_page["visits"]) == 1
+    assert second_page["next_cursor"] is None
+
+    response = await async_client.get("/api/analytics/history", params={"cursor": "garbage"})
+    assert response.status_code == 400
+
+    # Out-of-range paging is rejected up front instead of failing mid-page.
+    for params in ({"cursor": "", "limit": 0}, {"cursor": "", "limit": -1}, {"limit": 1001}, {"skip": -1}):
+        response = await async_client.get("/api/analytics/history", params=params)
+        assert response.status_code == 422, params
+
+@pytest.mark.asyncio
+async def test_timeseries(async_client: AsyncClient, session):
+    payload = {"url": "http://example.com/series", "link_count": 4, "word_count": 100, "image_count": 2}
+    for _ in range(3):
+        response = await async_client.post("/api/analytics/", json=payload)
+        assert response.status_code == 200
+    # What the background roll-up does every ROLLUP_INTERVAL seconds.
+    await visit_rollups.roll_up(session)
+
+    response = await async_client.get("/api/analytics/timeseries", params={"granularity": "hour"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["granularity"] == "hour"
+    assert len(data["points"]) == 1
+    assert data["points"][0]["visits"] == 3
+    assert data["points"][0]["avg_link_count"] == 4
+
+    response = await async_client.get(
+        "/api/analytics/timeseries", params={"granularity": "day", "url": "http://example.com/other"}
+    )
+    assert response.status_code == 200
+    assert response.json()["points"] == []
+
+    response = await async_client.get("/api/analytics/timeseries", params={"granularity": "minute"})
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_top(async_client: AsyncClient, monkeypatch):
+    for url, visits in (("http://example.com/a", 1), ("http://example.com/b", 3), ("http://example.com/c", 2)):
+        for _ in range(visits):
+            payload = {"url": url, "link_count": 1, "word_count": 10, "image_count": 0}
+            response = await async_client.post("/api/analytics/", json=payload)
+            assert response.status_code == 200
+
+    response = await async_client.get("/api/analytics/top", params={"k": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["k"] == 2
+    assert data["exact"] is True
+    assert [(visit["url"], visit["total_visits"]) for visit in data["visits"]] == [
+        ("http://example.com/b", 3), ("http://example.com/c", 2),
+    ]
+
+    monkeypatch.setattr(top_visits, "capacity", 5)
+    response = await async_client.get("/api/analytics/top", params={"k": 6})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_unique(async_client: AsyncClient):
+    for url in ("http://example.com/a", "http://example.com/b", "http://example.com/b", "http://other.org/"):
+        payload = {"url": url, "link_count": 1, "word_count": 10, "image_count": 0}
+        response = await async_client.post("/api/analytics/", json=payload)
+        assert response.status_code == 200
+
+    response = await async_client.get("/api/analytics/unique")
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["pages"], data["hosts"]) == (3, 2)
+    assert [(day["pages"], day["hosts"]) for day in data["days"]] == [(3, 2)]
+    assert data["start"] == data["end"] == data["days"][0]["day"]
+
+    response = await async_client.get("/api/analytics/unique", params={"host": "Example.com"})
+    data = response.json()
+    assert (data["host"], data["pages"], data["hosts"]) == ("example.com", 2, None)
+
+    response = await async_client.get("/api/analytics/unique", params={"start": "2026-02-01", "end": "2026-01-01"})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_range(async_client: AsyncClient):
+    start = datetime.utcnow() - timedelta(minutes=1)
+    for i in range(3):
+        payload = {"url": f"http://example.com/range/{i}", "link_count": i, "word_count": 10 * i, "image_count": 1}
+        response = await async_client.post("/api/analytics/", json=payload)
+        assert response.status_code == 200
+    end = datetime.utcnow() + timedelta(minutes=1)
+    window = {"start": start.isoformat(), "end": end.isoformat()}
+
+    response = await async_client.get("/api/analytics/range", params={**window, "limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["buckets"] is None
+    assert [visit["url"] for visit in data["visits"]] == ["http://example.com/range/2", "http://example.com/range/1"]
+    response = await async_client.get("/api/analytics/range", params={**window, "limit": 2, "cursor": data["next_cursor"]})
+    data = response.json()
+    assert [visit["url"] for visit in data["visits"]] == ["http://example.com/range/0"]
+    assert data["next_cursor"] is None
+
+    response = await async_client.get("/api/analytics/range", params={**window, "bucket": 1})
+    data = response.json()
+    assert data["visits"] is None
+    assert len(data["buckets"]) == 1
+    bucket = data["buckets"][0]
+    assert (bucket["count"], bucket["link_count_sum"], bucket["word_count_max"]) == (3, 3, 20)
+
+    response = await async_client.get("/api/analytics/range", params={"start": end.isoformat(), "end": start.isoformat()})
+    assert response.status_code == 400
+    response = await async_client.get("/api/analytics/range", params={**window, "bucket": 1001})
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_domains(async_client: AsyncClient):
+    for url in ("http://Example.com/a", "http://example.com/b", "http://example.com/b", "http://other.org/"):
+        payload = {"url": url, "link_count": 2, "word_count": 100, "image_count": 1}
+        response = await async_client.post("/api/analytics/", json=payload)
+        assert response.status_code == 200
+
+    response = await async_client.get("/api/analytics/domains")
+    assert response.status_code == 200
+    assert response.json() == [
+        {"host": "example.com", "pages": 2, "visits": 3, "avg_link_count": 2, "avg_word_count": 100, "avg_image_count": 1},
+        {"host": "other.org", "pages": 1, "visits": 1, "avg_link_count": 2, "avg_word_count": 100, "avg_image_count": 1},
+    ]
+
+    response = await async_client.get("/api/analytics/domains", params={"sort": "host", "skip": 1, "limit": 1})
+    assert [domain["host"] for domain in response.json()] == ["other.org"]
+
+    response = await async_client.get("/api/analytics/domains", params={"sort": "url"})
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson_and_csv(async_client: AsyncClient):
+    for i in range(3):
+        payload = {"url": f"http://example.com/export/{i}", "link_count": i, "word_count": 10, "image_count": 0}
+        response = await async_client.post("/api/analytics/", json=payload)
+        assert response.status_code == 200
+
+    response = await async_client.get("/api/analytics/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert {record["url"] for record in records} == {f"http://example.com/export/{i}" for i in range(3)}
+    assert set(records[0]) == {"url", "link_count", "word_count", "image_count", "datetime_visited", "total_visits"}
+
+    response = await async_client.get("/api/analytics/export", params={"format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["url", "link_count", "word_count", "image_count", "datetime_visited", "total_visits"]
+    assert len(rows) == 4
+
+@pytest.mark.asyncio
+async def test_stats(async_client: AsyncClient):
+    for i in range(4):
+        payload = {"url": f"http://example.com/stats/{i}", "link_count": i, "word_count": 100 * i, "image_count": 1}
+        response = await async_client.post("/api/analytics/", json=payload)
+        assert response.status_code == 200
+
+    response = await async_client.get("/api/analytics/stats", params={"percentiles": [50], "bins": 3})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 4
+    words = data["columns"]["word_count"]
+    assert words["mean"] == 150
+    assert words["percentiles"] == {"p50": 150}
+    assert sum(words["histogram"]["counts"]) == 4
+    assert len(words["histogram"]["bin_edges"]) == 4
+
+    response = await async_client.get("/api/analytics/stats", params={"percentiles": [101]})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_history_fast_serialization_matches_models(async_client: AsyncClient, session, monkeypatch):
+    urls = ["http://example.com/ünïcode/ページ", 'http://example.com/q?a="b"&c=\\d', "http://example.com/plain"]
+    for url in urls:
+        payload = {"url": url, "link_count": 1, "word_count": 2, "image_count": 3}
+        response = await async_client.post("/api/analytics/", json=payload)
+        assert response.status_code == 200
+    # A timestamp without microseconds, which serializes without a fraction.
+    await session.execute(insert(PageVisit), [{
+        "url_hash": url_hash("http://example.com/whole-second"), "url": "http://example.com/whole-second",
+        "datetime_visited": datetime(2026, 1, 1, 12, 0, 0), "link_count": 0, "word_count": 0,
+        "image_count": 0, "total_visits": 7,
+    }])
+    await session.commit()
+
+    for params in ({}, {"skip": 1, "limit": 2}, {"cursor": ""}, {"cursor": "", "limit": 2}):
+        monkeypatch.setattr(analytics, "FAST_JSON_RESPONSES", False)
+        expected = await async_client.get("/api/analytics/history", params=params)
+        monkeypatch.setattr(analytics, "FAST_JSON_RESPONSES", True)
+        fast = await async_client.get("/api/analytics/history", params=params)
+        assert fast.status_code == expected.status_code == 200
+        assert fast.headers["content-type"] == expected.headers["content-type"]
+        assert fast.content == expected.content
+
+@pytest.mark.asyncio
+async def test_conditional_get_skips_database(async_client: AsyncClient, session):
+    payload = {"url": "http://example.com/etag", "link_count": 1, "word_count": 2, "image_count": 3}
+    response = await async_client.post("/api/analytics/", json=payload)
+    assert response.status_code == 200
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(session.bind.sync_engine, "before_cursor_execute", listener)
+    try:
+        for path in ("/api/analytics/current", "/api/analytics/history"):
+            first = await async_client.get(path)
+            etag = first.headers["etag"]
+            assert first.status_code == 200
+            statements.clear()
+            cached = await async_client.get(path, headers={"If-None-Match": etag})
+            assert cached.status_code == 304
+            assert cached.content == b""
+            assert statements == []
+    finally:
+        event.remove(session.bind.sync_engine, "before_cursor_execute", listener)
+
+    # A write changes the version, so the old ETag no longer matches.
+    response = await async_client.post("/api/analytics/", json=payload)
+    refreshed = await async_client.get("/api/analytics/current", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["etag"] != etag
+    assert refreshed.json()["total_visits"] == 2
+
+@pytest.mark.asyncio
+async def test_large_responses_are_compressed(async_client: AsyncClient):
+    batch = [
+        {"url": f"http://example.com/compressed/{i}", "link_count": i, "word_count": 10, "image_count": 1}
+        for i in range(50)
+    ]
+    response = await async_client.post("/api/analytics/batch", json=batch)
+    assert response.status_code == 200
+
+    plain = await async_client.get("/api/analytics/history", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    for encoding in ("br", "gzip"):
+        response = await async_client.get("/api/analytics/history", headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(plain.content)
+        assert response.content == plain.content
+
+    # Responses under the size threshold are sent as they are.
+    small = await async_client.get("/api/analytics/current", headers={"Accept-Encoding": "br"})
+    assert "content-encoding" not in small.headers
+
+    export = await async_client.get("/api/analytics/export", headers={"Accept-Encoding": "gzip"})
+    assert export.headers["content-encoding"] == "gzip"
+    assert len(export.text.splitlines()) == 50
+
+@pytest.mark.asyncio
+async def test_stream_pushes_visits_for_subscribed_url(async_client: AsyncClient):
+    # httpx's ASGITransport buffers whole responses, so drive the event
+    # stream through the ASGI interface directly.
+    messages = asyncio.Queue()
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/analytics/stream", "raw_path": b"/api/analytics/stream",
+        "query_string": b"url=https://Example.com/streamed", "root_path": "",
+        "headers": [(b"host", b"test")], "client": ("test", 1234), "server": ("test", 80),
+    }
+    stream = asyncio.create_task(app(scope, receive, messages.put))
+    start = await asyncio.wait_for(messages.get(), 5)
+    assert start["status"] == 200
+    assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+    assert (await asyncio.wait_for(messages.get(), 5))["body"].startswith(b"retry:")
+
+    for url in ("https://example.com/other", "https://example.com/streamed"):
+        payload = {"url": url, "link_count": 1, "word_count": 2, "image_count": 3}
+        assert (await async_client.post("/api/analytics/", json=payload)).status_code == 200
+
+    body = (await asyncio.wait_for(messages.get(), 5))["body"]
+    assert body.startswith(b"event: visit\ndata: ")
+    assert json.loads(body.split(b"data: ", 1)[1])["url"] == "https://example.com/streamed"
+    assert messages.empty()
+    assert (await async_client.get("/api/analytics/stream/stats")).json()["subscribers"] == 1
+
+    disconnected.set()
+    await asyncio.wait_for(stream, 5)
+    assert (await async_client.get("/api/analytics/stream/stats")).json()["subscribers"] == 0
+
+@pytest.mark.asyncio
+async def test_idempotency_key_drops_duplicate_posts(async_client: AsyncClient):
+    payload = {"url": "https://example.com/once", "link_count": 1, "word_count": 2, "image_count": 3}
+    headers = {"Idempotency-Key": "visit-1"}
+    first = await async_client.post("/api/analytics/", json=payload, headers=headers)
+    assert first.status_code == 200
+    assert "idempotent-replayed" not in first.headers
+
+    retry = await async_client.post("/api/analytics/", json=payload, headers=headers)
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json()["total_visits"] == 1
+
+    # Without a key, or with a new one, the visit is counted.
+    assert (await async_client.post("/api/analytics/", json=payload)).json()["total_visits"] == 2
+    response = await async_client.post("/api/analytics/", json=payload, headers={"Idempotency-Key": "visit-2"})
+    assert response.json()["total_visits"] == 3
+
+    stats = (await async_client.get("/api/analytics/idempotency/stats")).json()
+    assert stats["checked"] == 3
+    assert stats["duplicates"] == 1
@@ -0,0 +1,18 @@
+from app.services.data_version import DataVersion, etag_matches
+
+def test_etag_changes_on_writes_and_rolls_over_with_the_window():
+    version = DataVersion()
+    assert version.window == 5.0
+    etag = version.etag(now=100.0)
+    assert version.etag(now=104.9) == etag
+    # Another worker's write is not seen here; the window bounds the 304s.
+    assert version.etag(now=105.0) != etag
+
+    version.bump()
+    assert version.etag(now=100.0) != etag
+
+def test_etag_without_window_only_changes_on_writes():
+    version = DataVersion(window=0)
+    etag = version.etag(now=0.0)
+    assert version.etag(now=1e9) == etag
+    assert etag_matches(f"{etag}, W/\"other\"", etag)
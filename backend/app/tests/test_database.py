@@ -0,0 +1,111 @@
+import subprocess
+import sys
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from app.core.models import Base, PageVisit
+from app.db import database
+from app.db.database import ENGINE_PROFILES, create_engine_for_profile, get_engine_kwargs
+from app.services.data_version import data_version
+
+@pytest.mark.asyncio
+async def test_sqlite_profile_applies_pragmas(tmp_path):
+    engine = create_engine_for_profile(f"sqlite+aiosqlite:///{tmp_path / 'profile.db'}", "ingest")
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 30000
+        assert engine.pool.size() == ENGINE_PROFILES["ingest"]["pool_size"]
+    finally:
+        await engine.dispose()
+
+def test_engine_kwargs_per_backend():
+    # In-memory SQLite gets no pool settings; asyncpg gets the statement cache size.
+    assert get_engine_kwargs("sqlite+aiosqlite:///:memory:", "web") == {}
+    kwargs = get_engine_kwargs("postgresql+asyncpg://user:secret@db/analytics", "pgbouncer")
+    assert kwargs["pool_pre_ping"] is True
+    assert kwargs["connect_args"]["prepared_statement_cache_size"] == 0
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        get_engine_kwargs("sqlite+aiosqlite:///:memory:", "turbo")
+
+@pytest.mark.asyncio
+async def test_init_engine_warms_up_pool_and_dispose_closes_it(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'lifespan.db'}")
+    monkeypatch.setenv("DB_ENGINE_PROFILE", "web")
+    assert database.engine is None
+    engine = await database.init_engine(warmup=3)
+    try:
+        assert engine.pool.checkedin() == 3
+        async with database.get_session_factory()() as session:
+            assert (await session.execute(text("SELECT 1"))).scalar() == 1
+    finally:
+        await database.dispose_engine()
+    assert database.engine is None and database.AsyncSessionLocal is None
+
+@pytest.mark.asyncio
+async def test_reads_go_to_the_replica_except_for_recent_writers(tmp_path, monkeypatch):
+    from app.main import app
+
+    # Two SQLite files stand in for the primary and a replica that has not
+    # caught up yet.
+    monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv("DATABASE_READ_URL", f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    await database.init_engine(warmup=1)
+    try:
+        assert database.read_engine.pool.checkedin() == 1
+        for db_engine in (database.engine, database.read_engine):
+            async with db_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            payload = {"url": "http://example.com/a", "link_count": 1, "word_count": 10, "image_count": 0}
+            response = await client.post("/api/analytics/", json=payload, headers={"X-Client-Id": "popup"})
+            assert response.status_code == 200
+
+            response = await client.get("/api/analytics/history", headers={"X-Client-Id": "dashboard"})
+            assert response.json() == []
+            response = await client.get("/api/analytics/history", headers={"X-Client-Id": "popup"})
+            assert [visit["url"] for visit in response.json()] == ["http://example.com/a"]
+
+            response = await client.get("/api/analytics/routing/stats")
+            stats = response.json()
+            assert (stats["replica"], stats["primary_reads"], stats["replica_reads"]) == (True, 1, 1)
+
+            # Replica reads carry no ETag, so a client cannot keep revalidating
+            # a stale body once the replica has caught up.
+            response = await client.get("/api/analytics/history", headers={"X-Client-Id": "dashboard"})
+            assert "etag" not in response.headers
+            assert response.headers["cache-control"] == "no-store"
+            # What the primary's write counter would have tagged the stale body with.
+            stale_etag = data_version.etag()
+            async with database.engine.connect() as primary:
+                rows = (await primary.execute(PageVisit.__table__.select())).mappings().all()
+            async with database.read_engine.begin() as replica:
+                await replica.execute(PageVisit.__table__.insert(), [dict(row) for row in rows])
+            response = await client.get(
+                "/api/analytics/history", headers={"X-Client-Id": "dashboard", "If-None-Match": stale_etag}
+            )
+            assert response.status_code == 200
+            assert [visit["url"] for visit in response.json()] == ["http://example.com/a"]
+
+            # Reads from the primary keep their ETags.
+            response = await client.get("/api/analytics/history", headers={"X-Client-Id": "popup"})
+            assert response.headers["etag"]
+    finally:
+        await database.dispose_engine()
+    assert database.read_engine is None and database.AsyncReadSessionLocal is None
+
+def test_importing_the_app_opens_nothing():
+    # A fresh interpreter: no engine is created and NumPy and the unused
+    # dialects are not imported until they are needed.
+    code = (
+        "import sys; import app.main; from app.db import database; "
+        "print(database.engine is None, 'numpy' in sys.modules, "
+        "'sqlalchemy.dialects.postgresql' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["True", "False", "False"]
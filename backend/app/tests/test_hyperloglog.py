@@ -0,0 +1,52 @@
+import random
+import pytest
+from app.core.hyperloglog import HyperLogLog
+
+def random_hashes(count: int, seed: int):
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(count)]
+
+@pytest.mark.parametrize("count", [0, 1, 100, 5000, 200000])
+def test_estimate_is_within_a_few_standard_errors(count):
+    sketch = HyperLogLog(14)
+    for value in random_hashes(count, seed=count):
+        sketch.add_hash(value)
+    assert abs(sketch.estimate() - count) <= max(1, 4 * sketch.relative_error * count)
+
+def test_merge_estimates_the_union():
+    first, second, union = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    # Half of the second sketch's inputs are also in the first one.
+    hashes = random_hashes(30000, seed=1)
+    for value in hashes[:20000]:
+        first.add_hash(value)
+        union.add_hash(value)
+    for value in hashes[10000:]:
+        second.add_hash(value)
+        union.add_hash(value)
+
+    merged = HyperLogLog.union([first, second], 12)
+    assert merged.registers() == union.registers()
+    first.merge_registers(second.registers())
+    assert first.registers() == union.registers()
+    assert abs(merged.estimate() - 30000) <= 4 * merged.relative_error * 30000
+
+def test_sparse_and_dense_sketches_agree_and_roundtrip():
+    hashes = random_hashes(3000, seed=2)
+    sparse = HyperLogLog(14)
+    for value in hashes[:50]:
+        assert sparse.add_hash(value)
+    # Adding a hash again changes nothing.
+    assert not sparse.add_hash(hashes[0])
+    dense = HyperLogLog.from_bytes(sparse.to_bytes(), 14)
+    assert dense.estimate() == sparse.estimate()
+
+    for value in hashes:
+        sparse.add_hash(value)
+        dense.add_hash(value)
+    assert sparse.registers() == dense.registers()
+    assert len(sparse.to_bytes()) < sparse.size
+
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(sparse.to_bytes(), 12)
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(sparse)
@@ -0,0 +1,41 @@
+from app.services.idempotency import IdempotencyKeys
+
+def test_duplicates_within_window_are_rejected():
+    keys = IdempotencyKeys(window=10)
+    assert keys.claim("key-1", "https://example.com/a", now=0)
+    assert not keys.claim("key-1", "https://example.com/a", now=5)
+    # The same key for another page is a different submission.
+    assert keys.claim("key-1", "https://example.com/b", now=5)
+    assert keys.stats()["duplicates"] == 1
+    assert keys.stats()["checked"] == 3
+
+def test_keys_expire_after_two_rotations():
+    keys = IdempotencyKeys(window=10)
+    assert keys.claim("key-1", "https://example.com/a", now=0)
+    # Rotated once: the key moved to the previous generation and is still known.
+    assert not keys.claim("key-1", "https://example.com/a", now=12)
+    # Rotated again: the generation holding the key is gone.
+    assert keys.claim("key-1", "https://example.com/a", now=22)
+    # After a whole idle window both generations are dropped at once.
+    assert keys.claim("key-2", "https://example.com/a", now=23)
+    assert keys.claim("key-2", "https://example.com/a", now=50)
+
+def test_generations_are_bounded():
+    keys = IdempotencyKeys(window=10, max_keys=2)
+    for n in range(5):
+        assert keys.claim(f"key-{n}", "https://example.com/a", now=0)
+    stats = keys.stats()
+    assert stats["keys"] <= 4
+    assert stats["early_rotations"] == 2
+    assert keys.claim("key-0", "https://example.com/a", now=0)
+
+def test_release_allows_retry():
+    keys = IdempotencyKeys(window=10)
+    assert keys.claim("key-1", "https://example.com/a", now=0)
+    keys.release("key-1", "https://example.com/a")
+    assert keys.claim("key-1", "https://example.com/a", now=1)
+
+def test_disabled_accepts_everything():
+    keys = IdempotencyKeys(enabled=False)
+    assert keys.claim("key-1", "https://example.com/a")
+    assert keys.claim("key-1", "https://example.com/a")
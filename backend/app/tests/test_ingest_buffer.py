@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import Base
+from app.core.schemas import VisitCreate
+from app.repositories.analytics_repository import get_visit_by_url_repository
+from app.services.ingest_buffer import IngestBuffer
+
+@pytest_asyncio.fixture(scope="function")
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'buffer.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+def make_visit(url: str, link_count: int = 1) -> VisitCreate:
+    return VisitCreate(url=url, link_count=link_count, word_count=10, image_count=0)
+
+@pytest.mark.asyncio
+async def test_buffer_coalesces_visits_per_url(session_factory):
+    buffer = IngestBuffer(session_factory, flush_size=100, flush_interval=60)
+    await buffer.start()
+
+    for link_count in range(1, 6):
+        await buffer.submit(make_visit("http://example.com/hot", link_count))
+    await buffer.submit(make_visit("http://example.com/cold"))
+    await buffer.stop()
+
+    # Everything is written in one coalesced flush on shutdown.
+    assert buffer.flush_count == 1
+    assert buffer.last_flush_rows == 2
+    async with session_factory() as session:
+        hot = await get_visit_by_url_repository(session, "http://example.com/hot")
+        cold = await get_visit_by_url_repository(session, "http://example.com/cold")
+    assert hot.total_visits == 5
+    assert hot.link_count == 5
+    assert cold.total_visits == 1
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_on_size_threshold(session_factory):
+    buffer = IngestBuffer(session_factory, flush_size=3, flush_interval=60)
+    await buffer.start()
+    try:
+        for i in range(3):
+            await buffer.submit(make_visit(f"http://example.com/{i}"))
+        for _ in range(50):
+            if buffer.flush_count:
+                break
+            await asyncio.sleep(0.01)
+        assert buffer.flush_count == 1
+        assert buffer.stats()["pending_urls"] == 0
+    finally:
+        await buffer.stop()
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_within_durability_window(session_factory):
+    buffer = IngestBuffer(session_factory, flush_size=100, flush_interval=0.05)
+    await buffer.start()
+    try:
+        await buffer.submit(make_visit("http://example.com/timed"))
+        await asyncio.sleep(0.2)
+        assert buffer.flush_count == 1
+        stats = buffer.stats()
+        assert stats["queue_depth"] == 0
+        assert stats["flushed_visits"] == 1
+        assert stats["last_flush_latency_ms"] > 0
+    finally:
+        await buffer.stop()
+
+@pytest.mark.asyncio
+async def test_buffer_keeps_running_when_on_flush_raises(session_factory):
+    flushed = []
+
+    async def on_flush(records):
+        if not flushed:
+            flushed.append(None)
+            raise RuntimeError("subscriber failed")
+        flushed.extend(record.url for record in records)
+
+    buffer = IngestBuffer(session_factory, flush_size=1, flush_interval=60, on_flush=on_flush)
+    await buffer.start()
+    try:
+        for flushes, url in enumerate(("http://example.com/first", "http://example.com/second"), 1):
+            await buffer.submit(make_visit(url))
+            for _ in range(50):
+                if buffer.flush_count == flushes:
+                    break
+                await asyncio.sleep(0.01)
+        assert buffer.running
+        assert buffer.flush_count == 2
+        assert buffer.failed_on_flush_count == 1
+        assert flushed == [None, "http://example.com/second"]
+    finally:
+        await buffer.stop()
+
+    # The first visit was written once, not retried.
+    async with session_factory() as session:
+        first = await get_visit_by_url_repository(session, "http://example.com/first")
+    assert first.total_visits == 1
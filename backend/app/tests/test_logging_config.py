@@ -0,0 +1,63 @@
+import io
+import json
+import logging
+import queue
+import pytest
+from app.core.logging_config import (
+    DroppingQueueHandler,
+    SamplingFilter,
+    configure_logging,
+    shutdown_logging,
+)
+
+@pytest.fixture
+def restore_logging():
+    yield
+    configure_logging()
+
+def _record(name: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, "message %s", ("arg",), None)
+
+def test_sampling_filter_uses_most_specific_logger_rate():
+    sampler = SamplingFilter({"app": 1.0, "app.services.analytics_service": 0.0})
+    assert not sampler.filter(_record("app.services.analytics_service"))
+    assert sampler.filter(_record("app.services.analytics_service", logging.ERROR))
+    assert sampler.filter(_record("app.routers.analytics"))
+    assert sampler.filter(_record("uvicorn"))
+
+def test_queue_handler_drops_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record("app"))
+    handler.handle(_record("app"))
+    assert handler.dropped == 1
+    assert handler.queue.qsize() == 1
+
+def test_queued_json_logging(restore_logging):
+    stream = io.StringIO()
+    configure_logging(level="info", log_format="json", use_queue=True, stream=stream,
+                      sample_rates={"test.sampled": 0.0})
+    logging.getLogger("test.kept").info("visit for %s", "http://example.com")
+    logging.getLogger("test.sampled").info("dropped")
+    logging.getLogger("test.sampled").warning("kept")
+    shutdown_logging()
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(entry["logger"], entry["message"]) for entry in entries] == [
+        ("test.kept", "visit for http://example.com"),
+        ("test.sampled", "kept"),
+    ]
+    assert entries[0]["level"] == "INFO"
+
+def test_queued_json_logging_keeps_exceptions(restore_logging):
+    stream = io.StringIO()
+    configure_logging(level="info", log_format="json", use_queue=True, stream=stream)
+    try:
+        raise ValueError("bad visit")
+    except ValueError:
+        logging.getLogger("test.errors").exception("write failed for %s", "http://example.com")
+    shutdown_logging()
+
+    [entry] = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert entry["message"] == "write failed for http://example.com"
+    assert entry["exception"].startswith("Traceback")
+    assert "ValueError: bad visit" in entry["exception"]
@@ -0,0 +1,60 @@
+import threading
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from app.core.metrics import Gauge, Histogram, instrument_engine, render_metrics
+from app.db.database import create_engine_for_profile
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_latency_seconds", "Test latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, ("/a",))
+
+    lines = histogram.collect()
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{route="/a"} 4' in lines
+    assert 'test_latency_seconds_sum{route="/a"} 3.65' in lines
+
+def test_gauge_sums_per_thread_shards():
+    gauge = Gauge("test_in_flight", "Test gauge.")
+
+    def work():
+        for _ in range(1000):
+            gauge.inc()
+        gauge.dec(amount=10)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert "test_in_flight 3960" in gauge.collect()
+
+@pytest.mark.asyncio
+async def test_engine_query_and_pool_metrics(tmp_path):
+    engine = create_engine_for_profile(f"sqlite+aiosqlite:///{tmp_path / 'metrics.db'}", "web")
+    instrument_engine(engine, "metrics-test")
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            output = render_metrics()
+            assert 'db_pool_connections_checked_out{engine="metrics-test"} 1' in output
+    finally:
+        await engine.dispose()
+
+    output = render_metrics()
+    assert 'db_query_duration_seconds_count{engine="metrics-test",operation="SELECT"}' in output
+    assert 'db_pool_checkout_wait_seconds_count{engine="metrics-test"}' in output
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_routes(async_client: AsyncClient):
+    response = await async_client.get("/api/analytics/url/http://example.com/missing")
+    assert response.status_code == 404
+
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'handler="get_visit_by_url",status="404"' in response.text
+    assert 'http_requests_in_flight{method="GET"} 1' in response.text
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.partitions import VisitEventPartitions, add_months
+
+def test_add_months_wraps_years():
+    assert add_months(datetime(2026, 11, 1), 2) == datetime(2027, 1, 1)
+    assert add_months(datetime(2026, 1, 1), -1) == datetime(2025, 12, 1)
+
+@pytest.mark.asyncio
+async def test_partitions_are_skipped_on_unpartitioned_tables(session):
+    partitions = VisitEventPartitions()
+    assert await partitions.ensure(session) == 0
+    assert partitions.stats()["run_count"] == 1
+    assert partitions.stats()["failed_run_count"] == 0
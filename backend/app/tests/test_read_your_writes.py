@@ -0,0 +1,24 @@
+from app.services.read_your_writes import ReadYourWrites
+
+def test_recent_writers_read_from_the_primary_until_the_window_ends():
+    tracker = ReadYourWrites(window=5)
+    assert not tracker.reads_from_primary("popup", now=0)
+    tracker.record_write("popup", now=10)
+    assert tracker.reads_from_primary("popup", now=14.9)
+    assert not tracker.reads_from_primary("dashboard", now=14.9)
+    assert not tracker.reads_from_primary("popup", now=15)
+    assert tracker.stats()["recent_writers"] == 0
+
+    # A zero window turns routing to the primary off.
+    tracker = ReadYourWrites(window=0)
+    tracker.record_write("popup", now=0)
+    assert not tracker.reads_from_primary("popup", now=0)
+
+def test_least_recent_writers_are_forgotten_first():
+    tracker = ReadYourWrites(window=60, max_clients=2)
+    tracker.record_write("a", now=0)
+    tracker.record_write("b", now=1)
+    tracker.record_write("a", now=2)
+    tracker.record_write("c", now=3)
+    assert [tracker.reads_from_primary(client, now=4) for client in "abc"] == [True, False, True]
+    assert tracker.stats()["evictions"] == 1
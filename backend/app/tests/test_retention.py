@@ -0,0 +1,88 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import Base, PageVisit, PageVisitArchive, VisitEvent, VisitEventArchive
+from app.core.schemas import VisitCreate
+from app.repositories.analytics_repository import build_visit_row, upsert_visit_rows_repository
+from app.services.analytics_service import get_visit_by_url_service, record_purged_visits
+from app.services.retention import RetentionJob
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+@pytest_asyncio.fixture(scope="function")
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'retention.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        rows = [
+            build_visit_row(VisitCreate(url=f"http://example.com/{age}", link_count=1, word_count=2, image_count=3),
+                            NOW - timedelta(days=age))
+            for age in (1, 10, 40, 50, 60)
+        ]
+        await upsert_visit_rows_repository(session, rows)
+    yield factory
+    await engine.dispose()
+
+async def count(session_factory, model) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(model))
+
+@pytest.mark.asyncio
+async def test_expired_rows_move_to_archive_tables_in_batches(session_factory):
+    purged = []
+
+    async def on_purge(urls):
+        purged.append(urls)
+
+    job = RetentionJob(session_factory, days=30, batch_size=2, batch_pause=0, on_purge=on_purge)
+    removed = await job.run_once(now=NOW)
+
+    assert removed == {"page_visits": 3, "visit_events": 3}
+    assert await count(session_factory, PageVisit) == 2
+    assert await count(session_factory, PageVisitArchive) == 3
+    assert await count(session_factory, VisitEvent) == 2
+    assert await count(session_factory, VisitEventArchive) == 3
+    # Two batches of at most two rows, oldest first.
+    assert [sorted(urls) for urls in purged] == [
+        ["http://example.com/50", "http://example.com/60"], ["http://example.com/40"]
+    ]
+    assert job.stats()["run_count"] == 1
+
+    # Nothing left to do on the next run.
+    assert await job.run_once(now=NOW) == {"page_visits": 0, "visit_events": 0}
+
+@pytest.mark.asyncio
+async def test_expired_rows_are_archived_to_gzip_files(session_factory, tmp_path):
+    job = RetentionJob(session_factory, days=30, archive="file", archive_dir=str(tmp_path / "archive"), batch_pause=0)
+    await job.run_once(now=NOW)
+
+    files = sorted(path.name for path in (tmp_path / "archive").iterdir())
+    assert [name.split("-")[0] for name in files] == ["page_visits", "visit_events"]
+    with gzip.open(tmp_path / "archive" / files[0], "rt") as f:
+        archived = [json.loads(line) for line in f]
+    assert sorted(row["url"] for row in archived) == [f"http://example.com/{age}" for age in (40, 50, 60)]
+    assert await count(session_factory, PageVisitArchive) == 0
+    assert await count(session_factory, PageVisit) == 2
+
+@pytest.mark.asyncio
+async def test_purged_visits_leave_the_read_paths(session_factory):
+    async with session_factory() as session:
+        assert await get_visit_by_url_service(session, "http://example.com/60") is not None
+    job = RetentionJob(session_factory, days=30, archive="none", batch_pause=0, on_purge=record_purged_visits)
+    await job.run_once(now=NOW)
+    async with session_factory() as session:
+        # Cached before the purge, gone after it.
+        assert await get_visit_by_url_service(session, "http://example.com/60") is None
+
+def test_rejects_unknown_archive_mode(session_factory):
+    with pytest.raises(ValueError):
+        RetentionJob(session_factory, days=30, archive="tape")
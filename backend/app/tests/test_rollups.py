@@ -0,0 +1,52 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import select
+from app.core.models import DailyVisitRollup, VisitEvent, VisitRollupState
+from app.services.rollups import WATERMARK, VisitRollups
+
+def make_event(event_id: int, visit_count: int = 1) -> VisitEvent:
+    return VisitEvent(
+        id=event_id,
+        url_hash=1,
+        url="https://example.com/",
+        visited_at=datetime(2026, 1, 1, 12),
+        visit_count=visit_count,
+        link_count=1,
+        word_count=10,
+        image_count=0,
+    )
+
+async def daily_visits(session) -> int:
+    rollup = (await session.execute(select(DailyVisitRollup))).scalars().first()
+    return rollup.visits if rollup else 0
+
+@pytest.mark.asyncio
+async def test_roll_up_waits_for_gaps_until_they_time_out(session):
+    rollups = VisitRollups(batch_size=2, gap_timeout=30)
+    # Id 3 is missing, as if its transaction had not committed yet.
+    session.add_all([make_event(1), make_event(2), make_event(4, visit_count=5)])
+    await session.commit()
+
+    assert await rollups.roll_up(session, now=0) == 2
+    assert await daily_visits(session) == 2
+    assert rollups.stats()["pending_gaps"] == 1
+
+    # The late event commits and both are picked up, in order.
+    session.add(make_event(3))
+    await session.commit()
+    assert await rollups.roll_up(session, now=10) == 2
+    assert await daily_visits(session) == 8
+    assert rollups.stats()["pending_gaps"] == 0
+
+    # A gap that outlives the timeout is taken for a rolled-back write.
+    session.add(make_event(6))
+    await session.commit()
+    assert await rollups.roll_up(session, now=20) == 0
+    assert await rollups.roll_up(session, now=49) == 0
+    assert await rollups.roll_up(session, now=50) == 1
+    assert (rollups.stats()["skipped_ids"], await daily_visits(session)) == (1, 9)
+
+    # The high-water mark is stored, so another process carries on from it.
+    state = (await session.execute(select(VisitRollupState))).scalars().one()
+    assert (state.name, state.last_event_id) == (WATERMARK, 6)
+    assert await VisitRollups().roll_up(session) == 0
@@ -0,0 +1,71 @@
+import random
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import delete
+from app.core.models import PageVisit
+from app.core.schemas import VisitCreate
+from app.repositories.analytics_repository import create_or_update_visits_repository
+from app.services.top_visits import TopVisits
+
+def make_visit(url: str, total_visits: int) -> PageVisit:
+    return PageVisit(
+        url=url,
+        link_count=1,
+        word_count=2,
+        image_count=3,
+        total_visits=total_visits,
+        datetime_visited=datetime.now(timezone.utc),
+    )
+
+def test_offers_keep_the_true_top_k():
+    rng = random.Random(3)
+    tracker = TopVisits(capacity=5)
+    tracker.load([])
+    totals = {}
+    for _ in range(2000):
+        url = f"https://example.com/{int(rng.paretovariate(1.1)) % 50}"
+        totals[url] = totals.get(url, 0) + 1
+        tracker.offer(make_visit(url, totals[url]))
+
+        expected = sorted(totals.values(), reverse=True)
+        for k in (1, 3, 5):
+            assert tracker.is_exact(k)
+            assert [visit.total_visits for visit in tracker.top(k)] == expected[:k]
+
+def test_removed_pages_make_answers_approximate_until_reloaded():
+    tracker = TopVisits(capacity=2)
+    # A full load: pages outside it have at most 9 visits.
+    tracker.load([make_visit("https://a.example", 10), make_visit("https://b.example", 9)])
+    tracker.remove(["https://a.example"])
+    assert tracker.is_exact(1)
+    assert not tracker.is_exact(2)
+
+    # A page written now is tracked, but untracked pages may rank above it.
+    tracker.offer(make_visit("https://d.example", 2))
+    assert [visit.url for visit in tracker.top(2)] == ["https://b.example", "https://d.example"]
+    assert not tracker.is_exact(2)
+
+    # Stale reports of an older total are ignored.
+    tracker.offer(make_visit("https://b.example", 12))
+    tracker.offer(make_visit("https://b.example", 11))
+    assert tracker.top(1)[0].total_visits == 12
+
+@pytest.mark.asyncio
+async def test_refresh_reads_the_most_visited_pages(session):
+    await create_or_update_visits_repository(session, [
+        VisitCreate(url=f"https://example.com/{i}", link_count=1, word_count=1, image_count=1)
+        for i in range(6) for _ in range(i + 1)
+    ])
+    tracker = TopVisits(capacity=3)
+    await tracker.ensure_exact(session, 3)
+    assert [visit.total_visits for visit in tracker.top(3)] == [6, 5, 4]
+    assert tracker.is_exact(3)
+
+    await session.execute(delete(PageVisit).where(PageVisit.url == "https://example.com/5"))
+    await session.commit()
+    tracker.remove(["https://example.com/5"])
+    tracker.offer(make_visit("https://example.com/0", 2))
+    assert not tracker.is_exact(3)
+    await tracker.ensure_exact(session, 3)
+    assert [visit.total_visits for visit in tracker.top(3)] == [5, 4, 3]
+    assert tracker.loads == 2
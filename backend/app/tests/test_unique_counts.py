@@ -0,0 +1,53 @@
+import pytest
+from datetime import date, datetime
+from app.core.models import PageVisit
+from app.services.unique_counts import ALL_SITES, UniqueCounters
+
+def make_visit(url: str, day: date) -> PageVisit:
+    return PageVisit(
+        url=url,
+        link_count=1,
+        word_count=2,
+        image_count=3,
+        total_visits=1,
+        datetime_visited=datetime(day.year, day.month, day.day, 12),
+    )
+
+def assert_close(estimate: float, expected: int):
+    # About four standard errors at the default precision.
+    assert abs(estimate - expected) <= max(1, 0.035 * expected)
+
+@pytest.mark.asyncio
+async def test_flushes_merge_with_the_stored_sketches(session):
+    first_day, second_day = date(2026, 1, 1), date(2026, 1, 2)
+    counters = UniqueCounters()
+    for i in range(100):
+        counters.add(make_visit(f"https://a.example/{i}", first_day))
+    # Visits to the same page count once.
+    counters.add(make_visit("https://a.example/0", first_day))
+    for i in range(50, 150):
+        counters.add(make_visit(f"https://b.example/{i % 100}", second_day))
+    assert await counters.flush(session) == 6
+    assert await counters.flush(session) == 0
+
+    # Another process adding to the same day keeps what was stored.
+    other = UniqueCounters()
+    for i in range(100, 200):
+        other.add(make_visit(f"https://a.example/{i}", first_day))
+    await other.flush(session)
+
+    fresh = UniqueCounters()
+    days, total = await fresh.estimate(session, "pages", ALL_SITES, first_day, second_day)
+    assert_close(days[first_day], 200)
+    assert_close(days[second_day], 100)
+    assert_close(total, 300)
+    days, total = await fresh.estimate(session, "pages", "b.example", first_day, second_day)
+    assert list(days) == [second_day]
+    assert_close(total, 100)
+    days, total = await fresh.estimate(session, "hosts", ALL_SITES, first_day, second_day)
+    assert_close(total, 2)
+
+    # Unflushed sketches are read together with the stored ones.
+    other.add(make_visit("https://c.example/", second_day))
+    days, _ = await other.estimate(session, "hosts", ALL_SITES, second_day, second_day)
+    assert_close(days[second_day], 2)
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from app.core.models import PageVisit
+from app.core.schemas import VisitCreate
+from app.services.analytics_service import (
+    create_or_update_visit_service,
+    get_visit_by_url_service,
+)
+from app.services.visit_cache import InMemoryCacheBackend, visit_cache
+
+@pytest.mark.asyncio
+async def test_backend_evicts_least_recently_used_by_bytes():
+    entry_size = len("a") + 100 + InMemoryCacheBackend.ENTRY_OVERHEAD_BYTES
+    backend = InMemoryCacheBackend(max_bytes=entry_size * 2)
+    await backend.set("a", b"x" * 100, ttl=60)
+    await backend.set("b", b"x" * 100, ttl=60)
+    # Touch "a" so "b" becomes the least recently used entry.
+    assert await backend.get("a") is not None
+    await backend.set("c", b"x" * 100, ttl=60)
+
+    assert await backend.get("b") is None
+    assert await backend.get("a") is not None
+    stats = backend.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_backend_expires_entries_after_ttl():
+    backend = InMemoryCacheBackend(max_bytes=1024)
+    await backend.set("a", b"value", ttl=0.01)
+    await asyncio.sleep(0.02)
+    assert await backend.get("a") is None
+    assert backend.stats()["expirations"] == 1
+    assert backend.stats()["bytes"] == 0
+
+@pytest.mark.asyncio
+async def test_backend_counts_key_bytes_not_characters():
+    key = "http://example.com/\u00fcber/\u65e5\u672c"
+    backend = InMemoryCacheBackend(max_bytes=1024)
+    await backend.set(key, b"value", ttl=60)
+    assert backend.stats()["bytes"] == len(key.encode()) + len(b"value") + InMemoryCacheBackend.ENTRY_OVERHEAD_BYTES
+    await backend.delete(key)
+    assert backend.stats()["bytes"] == 0
+
+@pytest.mark.asyncio
+async def test_backend_respects_entry_limit():
+    backend = InMemoryCacheBackend(max_bytes=1024 * 1024, max_entries=1)
+    await backend.set("a", b"1", ttl=60)
+    await backend.set("b", b"2", ttl=60)
+    assert await backend.get("a") is None
+    assert await backend.get("b") == b"2"
+
+@pytest.mark.asyncio
+async def test_service_reads_through_and_ingest_updates_cache(session):
+    url = "http://example.com/cached"
+    visit_data = VisitCreate(url=url, link_count=1, word_count=10, image_count=0)
+    await create_or_update_visit_service(session, visit_data)
+    await visit_cache.clear()
+
+    # First read misses and fills the cache, second read is a hit.
+    misses = visit_cache.stats()["misses"]
+    first = await get_visit_by_url_service(session, url)
+    assert visit_cache.stats()["misses"] == misses + 1
+    second = await get_visit_by_url_service(None, url)
+    assert second.total_visits == first.total_visits == 1
+
+    # The ingest path refreshes the cached entry.
+    await create_or_update_visit_service(session, visit_data)
+    cached = await get_visit_by_url_service(None, url)
+    assert cached.total_visits == 2
+
+@pytest.mark.asyncio
+async def test_fill_after_miss_keeps_newer_entry():
+    url = "http://example.com/raced"
+    visited_at = datetime(2026, 1, 1)
+
+    def record(total_visits: int, minutes: int) -> PageVisit:
+        return PageVisit(url=url, link_count=1, word_count=10, image_count=0,
+                         total_visits=total_visits, datetime_visited=visited_at + timedelta(minutes=minutes))
+
+    # A read missed and loaded total 1 while an ingest cached total 2.
+    await visit_cache.set(record(2, 1))
+    hits, misses = visit_cache.stats()["hits"], visit_cache.stats()["misses"]
+    await visit_cache.fill(record(1, 0))
+    assert (await visit_cache.get(url)).total_visits == 2
+    assert visit_cache.stats()["hits"] == hits + 1
+    assert visit_cache.stats()["misses"] == misses
+
+    # Newer reads still replace the entry, and a missing entry is filled.
+    await visit_cache.fill(record(3, 2))
+    assert (await visit_cache.get(url)).total_visits == 3
+    await visit_cache.invalidate(url)
+    await visit_cache.fill(record(1, 0))
+    assert (await visit_cache.get(url)).total_visits == 1
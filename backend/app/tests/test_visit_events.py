@@ -0,0 +1,66 @@
+import pytest
+from datetime import datetime, timezone
+from app.core.models import PageVisit
+from app.services.analytics_service import stream_visit_events_service
+from app.services.visit_events import TooManySubscribers, VisitBroadcaster
+
+def make_visit(url: str, total_visits: int = 1) -> PageVisit:
+    return PageVisit(
+        url=url,
+        link_count=1,
+        word_count=2,
+        image_count=3,
+        total_visits=total_visits,
+        datetime_visited=datetime.now(timezone.utc),
+    )
+
+@pytest.mark.asyncio
+async def test_updates_are_filtered_by_url():
+    broadcaster = VisitBroadcaster()
+    everything = broadcaster.subscribe()
+    one_page = broadcaster.subscribe("https://example.com/a")
+    broadcaster.publish([make_visit("https://example.com/a"), make_visit("https://example.com/b")])
+
+    assert everything.pending() == 2
+    assert one_page.pending() == 1
+    assert b'"https://example.com/a"' in await one_page.get(timeout=0.1)
+    assert await one_page.get(timeout=0.01) is None
+
+@pytest.mark.asyncio
+async def test_slow_subscribers_are_coalesced_and_bounded():
+    broadcaster = VisitBroadcaster(max_pending=2)
+    subscription = broadcaster.subscribe()
+    broadcaster.publish([make_visit("https://example.com/a", total_visits=n) for n in range(1, 4)])
+    assert subscription.pending() == 1
+    assert b'"total_visits":3' in await subscription.get(timeout=0.1)
+
+    broadcaster.publish([make_visit(f"https://example.com/{n}") for n in range(5)])
+    stats = broadcaster.stats()
+    assert subscription.pending() == 2
+    assert stats["coalesced"] == 2
+    assert stats["dropped"] == 3
+    assert b'"https://example.com/3"' in await subscription.get(timeout=0.1)
+
+@pytest.mark.asyncio
+async def test_subscriber_limit_and_release():
+    broadcaster = VisitBroadcaster(max_subscribers=1)
+    subscription = broadcaster.subscribe()
+    with pytest.raises(TooManySubscribers):
+        broadcaster.subscribe()
+    broadcaster.unsubscribe(subscription)
+    assert broadcaster.stats()["subscribers"] == 0
+    broadcaster.subscribe()
+
+@pytest.mark.asyncio
+async def test_event_stream_sends_keepalives_and_unsubscribes(monkeypatch):
+    broadcaster = VisitBroadcaster()
+    monkeypatch.setattr("app.services.analytics_service.visit_broadcaster", broadcaster)
+    subscription = broadcaster.subscribe()
+    stream = stream_visit_events_service(subscription, heartbeat_interval=0.01)
+
+    assert await stream.__anext__() == b"retry: 3000\n\n"
+    assert await stream.__anext__() == b": keepalive\n\n"
+    broadcaster.publish([make_visit("https://example.com/a")])
+    assert (await stream.__anext__()).startswith(b"event: visit\ndata: {")
+    await stream.aclose()
+    assert broadcaster.stats()["subscribers"] == 0
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import func, insert, select, update
+from app.core.models import PageVisit
+from app.core.urls import url_hash
+from app.services.visit_stats import VisitStatsSnapshot
+
+def _row(i: int, visited_at: datetime):
+    url = f"http://example.com/stats/{i}"
+    return {
+        "url_hash": url_hash(url),
+        "url": url,
+        "datetime_visited": visited_at,
+        "link_count": i % 7,
+        "word_count": i * 3,
+        "image_count": i % 2,
+        "total_visits": 1 + i % 5,
+    }
+
+@pytest.mark.asyncio
+async def test_snapshot_loads_in_batches_and_matches_sql(session):
+    start = datetime(2026, 1, 1)
+    await session.execute(insert(PageVisit), [_row(i, start + timedelta(seconds=i)) for i in range(250)])
+    await session.commit()
+
+    snapshot = VisitStatsSnapshot(batch_size=64)
+    assert await snapshot.refresh(session) == 250
+    assert snapshot.size == 250
+    assert snapshot.high_water == start + timedelta(seconds=249)
+
+    for name in ("word_count", "link_count", "image_count", "total_visits"):
+        column = getattr(PageVisit, name)
+        total, maximum = (await session.execute(select(func.sum(column), func.max(column)))).one()
+        values = snapshot.column(name)
+        assert int(values.sum()) == total
+        assert int(values.max()) == maximum
+
+    stats = snapshot.describe(percentiles=(50, 99), bins=5)
+    words = np.arange(250) * 3
+    assert stats["columns"]["word_count"]["mean"] == pytest.approx(words.mean())
+    assert stats["columns"]["word_count"]["percentiles"]["p99"] == pytest.approx(np.percentile(words, 99))
+    assert sum(stats["columns"]["word_count"]["histogram"]["counts"]) == 250
+
+@pytest.mark.asyncio
+async def test_snapshot_refresh_reads_only_changed_rows(session):
+    start = datetime(2026, 1, 1)
+    await session.execute(insert(PageVisit), [_row(i, start + timedelta(minutes=i)) for i in range(100)])
+    await session.commit()
+
+    snapshot = VisitStatsSnapshot(overlap_seconds=0)
+    await snapshot.refresh(session)
+
+    # Revisit one page and add a new one; the refresh reads just those rows
+    # (plus the row at the previous high-water mark) and overwrites in place.
+    later = start + timedelta(days=1)
+    await session.execute(
+        update(PageVisit)
+        .where(PageVisit.url_hash == url_hash("http://example.com/stats/10"))
+        .values(datetime_visited=later, word_count=1000, total_visits=PageVisit.total_visits + 1)
+    )
+    await session.execute(insert(PageVisit), [_row(100, later)])
+    await session.commit()
+
+    assert await snapshot.refresh(session) == 3
+    assert snapshot.size == 101
+    total_words = (await session.execute(select(func.sum(PageVisit.word_count)))).scalar_one()
+    assert int(snapshot.column("word_count").sum()) == total_words
+
+@pytest.mark.asyncio
+async def test_snapshot_keeps_rows_offered_after_late_commits(session):
+    start = datetime(2026, 1, 1)
+    await session.execute(insert(PageVisit), [_row(i, start + timedelta(minutes=i)) for i in range(10)])
+    await session.commit()
+
+    snapshot = VisitStatsSnapshot()
+    await snapshot.refresh(session)
+
+    # A write-behind flush commits a visit queued long before the newest
+    # row the snapshot has read: a refresh no longer reaches it.
+    late = PageVisit(**_row(10, start - timedelta(hours=1)))
+    session.add(late)
+    await session.commit()
+    assert await snapshot.refresh(session) == 1
+    assert snapshot.size == 10
+
+    await snapshot.offer([late])
+    assert snapshot.size == 11
+    assert snapshot.high_water == start + timedelta(minutes=9)
+    total_words = (await session.execute(select(func.sum(PageVisit.word_count)))).scalar_one()
+    assert int(snapshot.column("word_count").sum()) == total_words
+
+@pytest.mark.asyncio
+async def test_snapshot_ignores_offers_before_first_refresh():
+    snapshot = VisitStatsSnapshot()
+    await snapshot.offer([PageVisit(**_row(1, datetime(2026, 1, 1)))])
+    assert snapshot.size == 0
+
+def test_snapshot_describe_empty():
+    stats = VisitStatsSnapshot().describe()
+    assert stats["count"] == 0
+    assert stats["columns"]["total_visits"]["count"] == 0
@@ -0,0 +1,242 @@
+"""
+Load test of the API, driven in-process through httpx.ASGITransport (as the
+tests do), against a temporary SQLite database or --db-url.
+
+Workloads:
+
+  ingest  POST /api/analytics/ with URLs drawn from a Zipf distribution
+  read    GET /current, /url/{url} (Zipf URLs) and /history
+  mixed   both, about one write for every two reads
+
+Each workload runs `--concurrency` clients for `--duration` seconds after a
+short warm-up and reports throughput and p50/p95/p99 latency, overall and per
+operation. The app's lifespan runs against the benchmark database, so
+settings such as INGEST_WRITE_BEHIND and DB_POOL_WARMUP apply. Results are written as JSON (--output) together with the git commit,
+and --compare prints the change against an earlier result file. Run from the
+backend directory:
+
+    python -m benchmarks.bench_api --duration 10 --output bench-results.json
+    python -m benchmarks.bench_api --duration 10 --compare bench-results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from httpx import ASGITransport, AsyncClient
+
+from app.core.logging_config import configure_logging
+from app.core.models import Base
+from app.db.database import create_engine_for_profile, get_engine_profile_name
+from app.main import app
+
+class ZipfUrls:
+    """URLs drawn with probability proportional to 1 / rank**exponent."""
+
+    def __init__(self, count: int, exponent: float, seed: int = 0):
+        self.urls = [f"https://site{i % 97}.example.com/articles/{i}" for i in range(count)]
+        weights = [1 / rank ** exponent for rank in range(1, count + 1)]
+        self.cum_weights = list(itertools.accumulate(weights))
+        self.rng = random.Random(seed)
+
+    def sample(self) -> str:
+        return self.rng.choices(self.urls, cum_weights=self.cum_weights)[0]
+
+async def op_ingest(client: AsyncClient, urls: ZipfUrls) -> int:
+    payload = {
+        "url": urls.sample(),
+        "link_count": urls.rng.randrange(200),
+        "word_count": urls.rng.randrange(5000),
+        "image_count": urls.rng.randrange(40),
+    }
+    return (await client.post("/api/analytics/", json=payload)).status_code
+
+async def op_current(client: AsyncClient, urls: ZipfUrls) -> int:
+    return (await client.get("/api/analytics/current")).status_code
+
+async def op_url(client: AsyncClient, urls: ZipfUrls) -> int:
+    return (await client.get(f"/api/analytics/url/{urls.sample()}")).status_code
+
+async def op_history(client: AsyncClient, urls: ZipfUrls) -> int:
+    return (await client.get("/api/analytics/history", params={"limit": 100})).status_code
+
+OPERATIONS: Dict[str, Callable] = {
+    "ingest": op_ingest,
+    "current": op_current,
+    "url": op_url,
+    "history": op_history,
+}
+
+# Operation mix of each workload, as (operation, weight).
+WORKLOADS: Dict[str, Sequence[Tuple[str, float]]] = {
+    "ingest": [("ingest", 1.0)],
+    "read": [("current", 0.3), ("url", 0.5), ("history", 0.2)],
+    "mixed": [("ingest", 0.35), ("current", 0.2), ("url", 0.3), ("history", 0.15)],
+}
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else 0.0,
+        },
+    }
+
+async def run_workload(
+    client: AsyncClient, name: str, urls: ZipfUrls, concurrency: int, duration: float, warmup: float
+) -> Dict:
+    operations, weights = zip(*WORKLOADS[name])
+    latencies: Dict[str, List[float]] = {operation: [] for operation in operations}
+    errors: Dict[str, int] = {operation: 0 for operation in operations}
+
+    async def client_loop(deadline: float, record: bool):
+        while time.perf_counter() < deadline:
+            operation = urls.rng.choices(operations, weights)[0]
+            start = time.perf_counter()
+            status_code = await OPERATIONS[operation](client, urls)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if not record:
+                continue
+            # A URL that has not been visited yet is a valid 404 for /url.
+            if status_code >= 500 or (status_code >= 400 and not (operation == "url" and status_code == 404)):
+                errors[operation] += 1
+            latencies[operation].append(elapsed_ms)
+
+    await asyncio.gather(*(client_loop(time.perf_counter() + warmup, False) for _ in range(concurrency)))
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop(start + duration, True) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    result = summarize(list(itertools.chain(*latencies.values())), sum(errors.values()), elapsed)
+    result["operations"] = {
+        operation: summarize(latencies[operation], errors[operation], elapsed) for operation in operations
+    }
+    return result
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args, db_url: str) -> Dict:
+    engine = create_engine_for_profile(db_url, args.profile)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+    # The lifespan creates the app's engine (and the write-behind buffer's
+    # sessions) from these.
+    os.environ["DATABASE_URL"] = db_url
+    os.environ["DB_ENGINE_PROFILE"] = args.profile
+    urls = ZipfUrls(args.urls, args.zipf_exponent, args.seed)
+    results = {}
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            # Give the read workload something to find.
+            for offset in range(0, args.urls, 500):
+                batch = [
+                    {"url": url, "link_count": 1, "word_count": 100, "image_count": 1}
+                    for url in urls.urls[offset:offset + 500]
+                ]
+                response = await client.post("/api/analytics/batch", json=batch)
+                response.raise_for_status()
+            for name in args.workloads:
+                results[name] = await run_workload(
+                    client, name, urls, args.concurrency, args.duration, args.warmup
+                )
+                print_result(name, results[name])
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "database": db_url.split("://", 1)[0],
+            "engine_profile": args.profile,
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "urls": args.urls,
+            "zipf_exponent": args.zipf_exponent,
+            "ingest_write_behind": os.getenv("INGEST_WRITE_BEHIND", "false"),
+        },
+        "workloads": results,
+    }
+
+def print_result(name: str, result: Dict) -> None:
+    latency = result["latency_ms"]
+    print(
+        f"{name:<7} {result['throughput_rps']:9.0f} req/s  p50 {latency['p50']:7.2f} ms  "
+        f"p95 {latency['p95']:7.2f} ms  p99 {latency['p99']:7.2f} ms  errors {result['errors']}"
+    )
+    for operation, op_result in result["operations"].items():
+        op_latency = op_result["latency_ms"]
+        print(
+            f"  {operation:<8} {op_result['throughput_rps']:8.0f} req/s  p50 {op_latency['p50']:7.2f} ms  "
+            f"p99 {op_latency['p99']:7.2f} ms"
+        )
+
+def print_comparison(baseline: Dict, current: Dict) -> None:
+    print(f"\nchange against {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')})")
+    for name, result in current["workloads"].items():
+        before = baseline.get("workloads", {}).get(name)
+        if before is None:
+            continue
+        throughput = result["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        p99 = result["latency_ms"]["p99"] / before["latency_ms"]["p99"] - 1 if before["latency_ms"]["p99"] else 0.0
+        print(f"  {name:<7} throughput {throughput:+7.1%}  p99 {p99:+7.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per workload")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each workload")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--urls", type=int, default=5000, help="distinct URLs")
+    parser.add_argument("--zipf-exponent", type=float, default=1.1, help="skew of the URL distribution")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--profile", default=get_engine_profile_name(), help="database engine profile")
+    parser.add_argument("--db-url", help="database URL; its tables are dropped and recreated")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    configure_logging(level="warning")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_url = args.db_url or f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench_api.db')}"
+        results = asyncio.run(run(args, db_url))
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Latency of per-host aggregation over page_visits as the table grows.
+
+Three ways of getting the /domains result on SQLite:
+
+  client    every row read (as paging through /history does) and grouped in
+            Python after parsing each URL's host
+  scan      GROUP BY on the host column without an index
+  index     the same GROUP BY read from ix_page_visits_host alone (covering)
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_domains --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from app.core.urls import url_hash, url_host
+
+SCHEMA = """
+CREATE TABLE page_visits (
+    url_hash BIGINT NOT NULL PRIMARY KEY,
+    url VARCHAR NOT NULL,
+    host VARCHAR NOT NULL,
+    datetime_visited DATETIME NOT NULL,
+    link_count INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    image_count INTEGER NOT NULL,
+    total_visits INTEGER NOT NULL
+);
+"""
+
+INDEX = "CREATE INDEX ix_page_visits_host ON page_visits (host, total_visits, link_count, word_count, image_count)"
+
+QUERY = """
+SELECT host, count(*) AS pages, sum(total_visits) AS visits,
+       avg(link_count), avg(word_count), avg(image_count)
+FROM page_visits GROUP BY host ORDER BY visits DESC, host LIMIT 100
+"""
+
+def seed(conn: sqlite3.Connection, rows: int, hosts: int) -> None:
+    rng = random.Random(42)
+    batch = []
+    for i in range(rows):
+        url = f"https://www.site{int(rng.paretovariate(1.2)) % hosts}.example.com/articles/{i}"
+        batch.append((
+            url_hash(url), url, url_host(url), "2026-01-01 00:00:00",
+            rng.randrange(200), rng.randrange(5000), rng.randrange(40), rng.randrange(1, 50),
+        ))
+        if len(batch) == 10000:
+            conn.executemany("INSERT OR IGNORE INTO page_visits VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    conn.executemany("INSERT OR IGNORE INTO page_visits VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+
+def client_side(conn: sqlite3.Connection):
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for url, total_visits, link_count, word_count, image_count in conn.execute(
+        "SELECT url, total_visits, link_count, word_count, image_count FROM page_visits"
+    ):
+        host = totals[url_host(url)]
+        host[0] += 1
+        host[1] += total_visits
+        host[2] += link_count
+        host[3] += word_count
+        host[4] += image_count
+    return sorted(totals.items(), key=lambda item: (-item[1][1], item[0]))[:100]
+
+def median_ms(query, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--hosts", type=int, default=2000, help="distinct hosts (Pareto-distributed)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'client ms':>10} {'scan ms':>10} {'index ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.rows:
+            conn = sqlite3.connect(os.path.join(tmp_dir, f"domains_{rows}.db"))
+            conn.executescript(SCHEMA)
+            seed(conn, rows, args.hosts)
+            client_ms = median_ms(lambda: client_side(conn), args.repeat)
+            scan_ms = median_ms(lambda: conn.execute(QUERY).fetchall(), args.repeat)
+            conn.execute(INDEX)
+            plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {QUERY}"))
+            assert "COVERING INDEX ix_page_visits_host" in plan, plan
+            index_ms = median_ms(lambda: conn.execute(QUERY).fetchall(), args.repeat)
+            print(f"{rows:>10,} {client_ms:>10.1f} {scan_ms:>10.1f} {index_ms:>10.1f}")
+            conn.close()
+
+if __name__ == "__main__":
+    main()
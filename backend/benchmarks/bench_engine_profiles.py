@@ -0,0 +1,118 @@
+"""
+Compare ingest throughput of the database engine profiles (ENGINE_PROFILES in
+app.db.database).
+
+For each profile a fresh database is created and `--concurrency` workers
+store `--visits` visits between them through create_or_update_visit_repository,
+each visit in its own session as a request would. Readers run alongside and
+time GET /current's query, which in SQLite's rollback-journal mode has to wait
+for writers. Run from the backend directory:
+
+    python -m benchmarks.bench_engine_profiles --visits 5000 --concurrency 16
+
+Pass --url to run against another database (its tables are dropped and
+recreated for every profile).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import Base
+from app.core.schemas import VisitCreate
+from app.db.database import ENGINE_PROFILES, create_engine_for_profile
+from app.repositories.analytics_repository import (
+    create_or_update_visit_repository,
+    get_current_metrics_repository,
+)
+
+async def run_profile(db_url: str, profile: str, visits: int, concurrency: int, readers: int, urls: int) -> dict:
+    engine = create_engine_for_profile(db_url, profile)
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    rng = random.Random(7)
+    payloads = [
+        VisitCreate(
+            url=f"https://example.com/page/{rng.randrange(urls)}",
+            link_count=rng.randrange(100),
+            word_count=rng.randrange(5000),
+            image_count=rng.randrange(20),
+        )
+        for _ in range(visits)
+    ]
+    queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+    errors = 0
+    read_ms = []
+    done = asyncio.Event()
+
+    async def writer():
+        nonlocal errors
+        while not queue.empty():
+            payload = queue.get_nowait()
+            async with SessionLocal() as session:
+                try:
+                    await create_or_update_visit_repository(session, payload)
+                except OperationalError:
+                    errors += 1
+
+    async def reader():
+        while not done.is_set():
+            start = time.perf_counter()
+            async with SessionLocal() as session:
+                await get_current_metrics_repository(session)
+            read_ms.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0)
+
+    reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+    start = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await asyncio.gather(*reader_tasks)
+    await engine.dispose()
+
+    read_ms.sort()
+    return {
+        "visits_per_second": (visits - errors) / elapsed,
+        "errors": errors,
+        "read_p50_ms": statistics.median(read_ms) if read_ms else 0.0,
+        "read_p99_ms": read_ms[int(len(read_ms) * 0.99)] if read_ms else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, default=5000, help="visits to store per profile")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent writers")
+    parser.add_argument("--readers", type=int, default=2, help="concurrent readers of the latest visit")
+    parser.add_argument("--urls", type=int, default=1000, help="distinct URLs visited")
+    parser.add_argument("--profiles", nargs="+", default=list(ENGINE_PROFILES), choices=list(ENGINE_PROFILES))
+    parser.add_argument("--url", help="database URL (defaults to a temporary SQLite file per profile)")
+    args = parser.parse_args()
+
+    print(f"{args.visits} visits, {args.concurrency} writers, {args.readers} readers")
+    print(f"  {'profile':<10} {'visits/s':>10} {'errors':>7} {'read p50':>10} {'read p99':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for profile in args.profiles:
+            db_url = args.url or f"sqlite+aiosqlite:///{os.path.join(tmp_dir, f'{profile}.db')}"
+            result = asyncio.run(
+                run_profile(db_url, profile, args.visits, args.concurrency, args.readers, args.urls)
+            )
+            print(
+                f"  {profile:<10} {result['visits_per_second']:>10.0f} {result['errors']:>7} "
+                f"{result['read_p50_ms']:>8.2f}ms {result['read_p99_ms']:>8.2f}ms"
+            )
+
+if __name__ == "__main__":
+    main()
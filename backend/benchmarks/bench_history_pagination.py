@@ -0,0 +1,107 @@
+"""
+Compare /history page latency between offset and keyset (cursor) pagination.
+
+Seeds a SQLite database with synthetic page visits and times fetching the same
+deep page through get_all_visits_repository (OFFSET) and
+get_visits_after_repository (keyset). Run from the backend directory:
+
+    python -m benchmarks.bench_history_pagination --rows 1000000 --page 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import Base, PageVisit
+from app.core.urls import url_hash
+from app.repositories.analytics_repository import (
+    get_all_visits_repository,
+    get_visits_after_repository,
+)
+
+def seed(db_path: str, rows: int, chunk_size: int = 50000) -> None:
+    """Create the schema and insert `rows` synthetic visits, one second apart."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for offset in range(0, rows, chunk_size):
+            conn.execute(insert(PageVisit), [
+                {
+                    "url_hash": url_hash(f"https://example.com/page/{i}"),
+                    "url": f"https://example.com/page/{i}",
+                    "datetime_visited": start + timedelta(seconds=i),
+                    "link_count": i % 100,
+                    "word_count": i % 5000,
+                    "image_count": i % 20,
+                    "total_visits": 1 + i % 50,
+                }
+                for i in range(offset, min(offset + chunk_size, rows))
+            ])
+    engine.dispose()
+
+async def time_call(factory, repeat: int) -> float:
+    """Median latency in milliseconds of awaiting factory() `repeat` times."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await factory()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+async def run(db_path: str, page: int, limit: int, repeat: int) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    skip = (page - 1) * limit
+
+    async with SessionLocal() as session:
+        # The keyset position of the last row before the requested page, i.e.
+        # what the client would hold as its cursor. Not part of the timing.
+        boundary = (await get_all_visits_repository(session, skip - 1, 1))[0]
+        after = (boundary.datetime_visited, boundary.url_hash)
+
+        offset_ms = await time_call(lambda: get_all_visits_repository(session, skip, limit), repeat)
+        keyset_ms = await time_call(lambda: get_visits_after_repository(session, after, limit), repeat)
+
+        offset_page = [visit.url for visit in await get_all_visits_repository(session, skip, limit)]
+        keyset_page = [visit.url for visit in await get_visits_after_repository(session, after, limit)]
+        assert offset_page == keyset_page, "offset and keyset pages differ"
+
+    await engine.dispose()
+    print(f"page {page} (limit {limit}), median of {repeat} runs")
+    print(f"  offset: {offset_ms:9.2f} ms")
+    print(f"  keyset: {keyset_ms:9.2f} ms")
+    print(f"  speedup: {offset_ms / keyset_ms:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows to seed")
+    parser.add_argument("--page", type=int, default=1000, help="page number to fetch")
+    parser.add_argument("--limit", type=int, default=100, help="page size")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per mode")
+    parser.add_argument("--db", help="reuse an already seeded SQLite file instead of a temporary one")
+    args = parser.parse_args()
+
+    if args.page * args.limit > args.rows:
+        parser.error("--page * --limit must not exceed --rows")
+
+    if args.db and os.path.exists(args.db):
+        asyncio.run(run(args.db, args.page, args.limit, args.repeat))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db or os.path.join(tmp_dir, "bench_history.db")
+        start = time.perf_counter()
+        seed(db_path, args.rows)
+        print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+        asyncio.run(run(db_path, args.page, args.limit, args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Cost of the idempotency check on the ingest path, and the memory the
+remembered keys take.
+
+Claims `--keys` distinct UUID keys (filling both generations when it exceeds
+`--max-keys`), then the same number of duplicates, and reports claims per
+second and the memory held by the key sets, measured with tracemalloc. Run
+from the backend directory:
+
+    python -m benchmarks.bench_idempotency --keys 200000 --max-keys 100000
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+
+from app.services.idempotency import IdempotencyKeys
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=200000, help="distinct keys claimed")
+    parser.add_argument("--max-keys", type=int, default=100000, help="fingerprints per generation")
+    args = parser.parse_args()
+
+    keys = [str(uuid.uuid4()) for _ in range(args.keys)]
+    url = "https://example.com/articles/1"
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    idempotency_keys = IdempotencyKeys(window=3600, max_keys=args.max_keys)
+    start = time.perf_counter()
+    for key in keys:
+        idempotency_keys.claim(key, url)
+    new_elapsed = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    held = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    recent = keys[-args.max_keys:]
+    start = time.perf_counter()
+    for key in recent:
+        idempotency_keys.claim(key, url)
+    duplicate_elapsed = time.perf_counter() - start
+
+    stats = idempotency_keys.stats()
+    print(f"{args.keys:,} keys, at most {args.max_keys:,} per generation")
+    print(f"  new keys        {args.keys / new_elapsed:>12,.0f} claims/s")
+    print(f"  duplicates      {len(recent) / duplicate_elapsed:>12,.0f} claims/s ({stats['duplicates']:,} dropped)")
+    print(f"  keys held       {stats['keys']:>12,} ({stats['early_rotations']} early rotations)")
+    print(f"  memory          {held / 1024 / 1024:>12.1f} MiB ({held / max(stats['keys'], 1):.0f} bytes/key)")
+
+if __name__ == "__main__":
+    main()
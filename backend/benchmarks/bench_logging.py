@@ -0,0 +1,117 @@
+"""
+Measure requests/sec of the API with each logging mode.
+
+Requests go through httpx.ASGITransport straight into the app (no network),
+against a temporary SQLite database. The default workload reads one visit by
+URL, which is served from the per-URL cache, so request handling is cheap and
+the logging cost is visible. Modes:
+
+  off      LOG_LEVEL=warning, the INFO lines are not emitted
+  sync     StreamHandler on the event loop (the previous basicConfig setup)
+  queue    QueueHandler on the event loop, writes on a QueueListener thread
+  sampled  queue, with the app loggers' INFO lines sampled at --sample-rate
+  json     queue, formatted as JSON
+
+--write-delay-ms makes every log write sleep, to mimic a slow stdout consumer
+such as a container log driver under load. Run from the backend directory:
+
+    python -m benchmarks.bench_logging --requests 5000 --write-delay-ms 0.2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.logging_config import configure_logging, shutdown_logging
+from app.core.models import Base
+from app.db.database import create_engine_for_profile, get_db
+from app.main import app
+
+class SlowStream:
+    """File wrapper whose writes block for `delay` seconds."""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+MODES = {
+    "off": {"level": "warning", "use_queue": False},
+    "sync": {"level": "info", "use_queue": False},
+    "queue": {"level": "info", "use_queue": True},
+    "sampled": {"level": "info", "use_queue": True, "sampled": True},
+    "json": {"level": "info", "use_queue": True, "log_format": "json"},
+}
+
+async def run_mode(client: AsyncClient, url: str, requests: int, concurrency: int) -> float:
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            response = await client.get(f"/api/analytics/url/{url}")
+            assert response.status_code == 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+async def run(args, log_path: str) -> None:
+    engine = create_engine_for_profile(f"sqlite+aiosqlite:///{os.path.join(os.path.dirname(log_path), 'bench.db')}", "web")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with SessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    url = "https://example.com/benchmarked"
+    with open(log_path, "a") as log_file:
+        stream = SlowStream(log_file, args.write_delay_ms / 1000)
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            configure_logging(level="warning", use_queue=False, stream=stream)
+            response = await client.post(
+                "/api/analytics/", json={"url": url, "link_count": 1, "word_count": 1, "image_count": 1}
+            )
+            assert response.status_code == 200
+
+            print(f"{args.requests} requests, concurrency {args.concurrency}, write delay {args.write_delay_ms} ms")
+            for mode in args.modes:
+                options = dict(MODES[mode])
+                sample_rates = {"app": args.sample_rate} if options.pop("sampled", False) else {}
+                configure_logging(stream=stream, sample_rates=sample_rates, **options)
+                await run_mode(client, url, min(args.requests, 200), args.concurrency)  # warm-up
+                rate = await run_mode(client, url, args.requests, args.concurrency)
+                shutdown_logging()
+                print(f"  {mode:<8} {rate:9.0f} req/s")
+    app.dependency_overrides.pop(get_db, None)
+    await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="requests per mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--write-delay-ms", type=float, default=0.0, help="sleep per log write")
+    parser.add_argument("--sample-rate", type=float, default=0.01, help="INFO sampling rate in 'sampled' mode")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(run(args, os.path.join(tmp_dir, "bench.log")))
+    configure_logging()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Bytes and latency of the extension's polling pattern with and without ETags
+and compression.
+
+`--clients` pollers repeatedly fetch GET /current and GET /history (page of
+`--limit`), while one visit is ingested every `--write-every` polls, so most
+polls see unchanged data. Each mode runs `--polls` polls per client:
+
+  plain       no If-None-Match, Accept-Encoding: identity
+  etag        If-None-Match with the last ETag received
+  compressed  Accept-Encoding: br
+  both        ETags and brotli
+
+Reported: response body bytes on the wire, SQL statements run, and poll
+latency. Run from the backend directory:
+
+    python -m benchmarks.bench_polling --visits 1000 --polls 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.logging_config import configure_logging
+from app.core.models import Base
+from app.db.database import create_engine_for_profile, get_db
+from app.main import app
+
+MODES = {
+    "plain": (False, "identity"),
+    "etag": (True, "identity"),
+    "compressed": (False, "br"),
+    "both": (True, "br"),
+}
+
+async def run_mode(client: AsyncClient, args, use_etags: bool, encoding: str, counter: list) -> dict:
+    paths = ["/api/analytics/current", f"/api/analytics/history?limit={args.limit}"]
+    body_bytes = 0
+    not_modified = 0
+    latencies = []
+    writes = 0
+
+    async def poller(client_id: int):
+        nonlocal body_bytes, not_modified, writes
+        etags = {}
+        for poll in range(args.polls):
+            if client_id == 0 and poll % args.write_every == 0:
+                payload = {"url": f"https://example.com/polled/{poll}", "link_count": 1, "word_count": 2, "image_count": 3}
+                await client.post("/api/analytics/", json=payload)
+                writes += 1
+            for path in paths:
+                headers = {"Accept-Encoding": encoding}
+                if use_etags and path in etags:
+                    headers["If-None-Match"] = etags[path]
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                body_bytes += response.num_bytes_downloaded
+                if response.status_code == 304:
+                    not_modified += 1
+                elif "etag" in response.headers:
+                    etags[path] = response.headers["etag"]
+
+    counter[0] = 0
+    await asyncio.gather(*(poller(i) for i in range(args.clients)))
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "not_modified": not_modified,
+        "body_bytes": body_bytes,
+        "statements": counter[0],
+        "writes": writes,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+async def run(args, db_path: str) -> None:
+    engine = create_engine_for_profile(f"sqlite+aiosqlite:///{db_path}", "web")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    counter = [0]
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_statement(*_):
+        counter[0] += 1
+
+    async def override_get_db():
+        async with SessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for offset in range(0, args.visits, 500):
+            batch = [
+                {"url": f"https://example.com/page/{i}", "link_count": i % 90, "word_count": i, "image_count": i % 7}
+                for i in range(offset, min(offset + 500, args.visits))
+            ]
+            (await client.post("/api/analytics/batch", json=batch)).raise_for_status()
+
+        print(f"{args.clients} clients x {args.polls} polls of /current and /history?limit={args.limit}, "
+              f"a write every {args.write_every} polls")
+        print(f"  {'mode':<11} {'304s':>6} {'body bytes':>12} {'SQL stmts':>10} {'p50':>8} {'p99':>8}")
+        baseline = None
+        for mode in args.modes:
+            use_etags, encoding = MODES[mode]
+            result = await run_mode(client, args, use_etags, encoding, counter)
+            baseline = baseline or result["body_bytes"]
+            saved = 1 - result["body_bytes"] / baseline
+            print(
+                f"  {mode:<11} {result['not_modified']:>6} {result['body_bytes']:>12,} {result['statements']:>10} "
+                f"{result['p50_ms']:>6.2f}ms {result['p99_ms']:>6.2f}ms  ({saved:.1%} fewer bytes)"
+            )
+    app.dependency_overrides.pop(get_db, None)
+    await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, default=1000, help="visits seeded before polling")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent pollers")
+    parser.add_argument("--polls", type=int, default=500, help="polls per client and mode")
+    parser.add_argument("--limit", type=int, default=100, help="/history page size")
+    parser.add_argument("--write-every", type=int, default=20, help="ingest one visit every N polls")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    configure_logging(level="warning")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        asyncio.run(run(args, os.path.join(tmp_dir, "bench_polling.db")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Plotting a time window of visits: pulling every row and filtering and
+bucketing in the client (as paging through /history does) vs the range scan
+and server-side buckets of GET /range.
+
+Per table size and window, on SQLite:
+
+  client    every row read and JSON-encoded, then filtered by date and
+            bucketed in Python
+  rows      every row in the window (the endpoint pages them by `limit`),
+            from a range scan of ix_page_visits_datetime_visited_url_hash
+  buckets   the window aggregated into --buckets points in the database
+
+with the size of the JSON each would send. Run from the backend directory:
+
+    python -m benchmarks.bench_range --rows 100000 1000000 --window-hours 24 168 --buckets 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import orjson
+
+SCHEMA = """
+CREATE TABLE page_visits (
+    url_hash BIGINT NOT NULL PRIMARY KEY,
+    url VARCHAR NOT NULL,
+    datetime_visited DATETIME NOT NULL,
+    link_count INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    image_count INTEGER NOT NULL,
+    total_visits INTEGER NOT NULL
+);
+CREATE INDEX ix_page_visits_datetime_visited_url_hash ON page_visits (datetime_visited, url_hash);
+"""
+
+COLUMNS = "url, link_count, word_count, image_count, datetime_visited, total_visits"
+
+ROWS = f"""
+SELECT {COLUMNS} FROM page_visits
+WHERE datetime_visited >= ? AND datetime_visited < ?
+ORDER BY datetime_visited DESC, url_hash DESC
+"""
+
+BUCKETS = """
+SELECT CAST((julianday(datetime_visited) - julianday(?)) * 86400.0 / ? AS INTEGER) AS bucket,
+       count(*), sum(link_count), max(link_count), sum(word_count), max(word_count),
+       sum(image_count), max(image_count), sum(total_visits), max(total_visits)
+FROM page_visits WHERE datetime_visited >= ? AND datetime_visited < ?
+GROUP BY bucket ORDER BY bucket
+"""
+
+def median_ms(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def client_side(conn: sqlite3.Connection, start: str, end: str, width: float, buckets: int) -> int:
+    body = orjson.dumps([
+        dict(zip(COLUMNS.split(", "), row))
+        for row in conn.execute(f"SELECT {COLUMNS} FROM page_visits ORDER BY datetime_visited DESC, url_hash DESC")
+    ])
+    points = [[0, 0] for _ in range(buckets)]
+    start_time = datetime.fromisoformat(start)
+    for visit in orjson.loads(body):
+        if start <= visit["datetime_visited"] < end:
+            index = int((datetime.fromisoformat(visit["datetime_visited"]) - start_time).total_seconds() / width)
+            points[index][0] += 1
+            points[index][1] += visit["word_count"]
+    return len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--days", type=int, default=90, help="days the visits are spread over")
+    parser.add_argument("--window-hours", type=int, nargs="+", default=[24, 168])
+    parser.add_argument("--buckets", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime(2026, 4, 1)
+    print(
+        f"{'rows':>10} {'window':>7} {'matches':>8} {'client ms':>10} {'rows ms':>8} {'buckets ms':>10}"
+        f" {'client KB':>10} {'rows KB':>8} {'buckets KB':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.rows:
+            rng = random.Random(42)
+            conn = sqlite3.connect(os.path.join(tmp_dir, f"range_{rows}.db"))
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT INTO page_visits VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                (
+                    i, f"https://example.com/articles/{i}",
+                    (now - timedelta(seconds=rng.randrange(args.days * 86400))).isoformat(" ", "microseconds"),
+                    rng.randrange(200), rng.randrange(5000), rng.randrange(40), rng.randrange(1, 50),
+                )
+                for i in range(rows)
+            ))
+            conn.commit()
+            for hours in args.window_hours:
+                start = (now - timedelta(hours=hours)).isoformat(" ", "microseconds")
+                end = now.isoformat(" ", "microseconds")
+                width = hours * 3600 / args.buckets
+                plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {BUCKETS}", (start, width, start, end)))
+                assert "ix_page_visits_datetime_visited_url_hash" in plan, plan
+
+                matches = conn.execute(ROWS, (start, end)).fetchall()
+                rows_body = orjson.dumps([dict(zip(COLUMNS.split(", "), row)) for row in matches])
+                buckets_body = orjson.dumps(conn.execute(BUCKETS, (start, width, start, end)).fetchall())
+                client_bytes = client_side(conn, start, end, width, args.buckets)
+                client_ms = median_ms(lambda: client_side(conn, start, end, width, args.buckets), args.repeat)
+                rows_ms = median_ms(
+                    lambda: orjson.dumps([dict(zip(COLUMNS.split(", "), row)) for row in conn.execute(ROWS, (start, end))]),
+                    args.repeat,
+                )
+                buckets_ms = median_ms(
+                    lambda: orjson.dumps(conn.execute(BUCKETS, (start, width, start, end)).fetchall()), args.repeat
+                )
+                print(
+                    f"{rows:>10,} {hours:>6}h {len(matches):>8,} {client_ms:>10.1f} {rows_ms:>8.1f} {buckets_ms:>10.1f}"
+                    f" {client_bytes / 1024:>10,.0f} {len(rows_body) / 1024:>8,.0f} {len(buckets_body) / 1024:>10,.1f}"
+                )
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Latency of concurrent writes while the retention job ages out old rows,
+with one huge batch (a single DELETE) against small batches.
+
+Seeds `--rows` page visits one second apart (see bench_history_pagination),
+then ages out the older half with RetentionJob while a writer keeps
+upserting visits through the normal ingest path. Reported per batch size:
+purge time and rate, and the writer's p50/p99/max latency, which shows how
+long the purge held the database's write lock. Run from the backend
+directory:
+
+    python -m benchmarks.bench_retention --rows 200000 --batch-sizes 200000 1000
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.logging_config import configure_logging
+from app.core.schemas import VisitCreate
+from app.db.database import create_engine_for_profile
+from app.repositories.analytics_repository import create_or_update_visit_repository
+from app.services.retention import RetentionJob
+from benchmarks.bench_history_pagination import seed
+
+async def run(db_path: str, rows: int, batch_size: int, archive: str, pause: float) -> None:
+    engine = create_engine_for_profile(f"sqlite+aiosqlite:///{db_path}", "web")
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    # Seeded visits start on 2024-01-01, one second apart: age out the older half.
+    now = datetime(2024, 1, 1) + timedelta(seconds=rows // 2) + timedelta(days=1)
+    job = RetentionJob(SessionLocal, days=1, archive=archive, batch_size=batch_size, batch_pause=pause)
+
+    latencies = []
+    done = asyncio.Event()
+
+    async def writer():
+        i = 0
+        while not done.is_set():
+            visit = VisitCreate(url=f"https://example.com/live/{i % 100}", link_count=1, word_count=2, image_count=3)
+            start = time.perf_counter()
+            async with SessionLocal() as session:
+                await create_or_update_visit_repository(session, visit)
+            latencies.append((time.perf_counter() - start) * 1000)
+            i += 1
+            await asyncio.sleep(0.005)
+
+    writer_task = asyncio.create_task(writer())
+    await asyncio.sleep(0.2)
+    start = time.perf_counter()
+    removed = await job.run_once(now=now)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await writer_task
+    await engine.dispose()
+
+    latencies.sort()
+    print(
+        f"  {batch_size:>10,} {removed['page_visits']:>9,} {elapsed:>8.2f}s {removed['page_visits'] / elapsed:>10,.0f} "
+        f"{statistics.median(latencies):>8.1f} {latencies[int(len(latencies) * 0.99) - 1]:>8.1f} {latencies[-1]:>8.1f}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="rows to seed")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[200000, 10000, 1000])
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds between batches")
+    parser.add_argument("--archive", default="table", choices=["table", "none"], help="archive mode")
+    args = parser.parse_args()
+
+    configure_logging(level="warning")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        seeded = os.path.join(tmp_dir, "seeded.db")
+        seed(seeded, args.rows)
+        print(f"ageing out {args.rows // 2:,} of {args.rows:,} rows (archive={args.archive}, pause={args.pause}s); writer latency in ms")
+        print(f"  {'batch size':>10} {'rows':>9} {'time':>9} {'rows/s':>10} {'p50':>8} {'p99':>8} {'max':>8}")
+        for batch_size in args.batch_sizes:
+            db_path = os.path.join(tmp_dir, f"retention-{batch_size}.db")
+            shutil.copy(seeded, db_path)
+            asyncio.run(run(db_path, args.rows, batch_size, args.archive, args.pause))
+
+if __name__ == "__main__":
+    main()
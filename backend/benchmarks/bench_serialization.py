@@ -0,0 +1,105 @@
+"""
+Rows serialized per second for /history: ORM objects validated into Visit
+models and encoded by FastAPI, against plain column tuples encoded by orjson.
+
+Two measurements per path, for pages of `--limit` rows:
+
+  encode  only the serialization step, from an already fetched page
+  request the whole GET /api/analytics/history request through
+          httpx.ASGITransport, including the query
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --rows 20000 --limit 1000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+import orjson
+from httpx import ASGITransport, AsyncClient
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.logging_config import configure_logging
+from app.core.schemas import Visit
+from app.db.database import get_db
+from app.main import app
+from app.repositories.analytics_repository import get_all_visit_rows_repository, get_all_visits_repository
+from app.routers import analytics
+from app.services.analytics_service import encode_visit_rows
+from benchmarks.bench_history_pagination import seed
+
+VISIT_LIST = TypeAdapter(List[Visit])
+
+def rows_per_second(func, rows: int, seconds: float) -> float:
+    """Call func() repeatedly for about `seconds` seconds; return rows handled per second."""
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        func()
+        calls += 1
+    return calls * rows / (time.perf_counter() - start)
+
+async def requests_rows_per_second(client: AsyncClient, limit: int, seconds: float) -> float:
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        response = await client.get("/api/analytics/history", params={"limit": limit})
+        assert response.status_code == 200
+        calls += 1
+    return calls * limit / (time.perf_counter() - start)
+
+async def run(db_path: str, limit: int, seconds: float) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with SessionLocal() as session:
+        visits = await get_all_visits_repository(session, 0, limit)
+        rows = await get_all_visit_rows_repository(session, 0, limit)
+
+    def encode_models():
+        return VISIT_LIST.dump_json(VISIT_LIST.validate_python(visits, from_attributes=True))
+
+    def encode_rows():
+        return orjson.dumps(encode_visit_rows(rows))
+
+    assert encode_models() == encode_rows(), "encodings differ"
+
+    async def override_get_db():
+        async with SessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    results = {}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for mode, fast in (("models", False), ("orjson rows", True)):
+            analytics.FAST_JSON_RESPONSES = fast
+            results[mode] = await requests_rows_per_second(client, limit, seconds)
+    app.dependency_overrides.pop(get_db, None)
+    await engine.dispose()
+
+    print(f"pages of {limit} rows, {seconds:.0f}s per measurement (rows/s)")
+    print(f"  {'':<12} {'encode':>12} {'request':>12}")
+    print(f"  {'models':<12} {rows_per_second(encode_models, limit, seconds):>12,.0f} {results['models']:>12,.0f}")
+    print(f"  {'orjson rows':<12} {rows_per_second(encode_rows, limit, seconds):>12,.0f} {results['orjson rows']:>12,.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="rows to seed")
+    parser.add_argument("--limit", type=int, default=1000, help="page size")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each measurement")
+    args = parser.parse_args()
+
+    configure_logging(level="warning", use_queue=False)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench_serialization.db")
+        seed(db_path, args.rows)
+        asyncio.run(run(db_path, args.limit, args.seconds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Cold-start time of the API: how long a fresh process takes before it can
+answer its first request.
+
+Every repetition runs in a new interpreter against a temporary SQLite
+database and reports:
+
+  import   importing app.main
+  startup  running the lifespan's startup (engine, pool warm-up, workers)
+  first    the first GET /api/analytics/current, through httpx.ASGITransport
+  total    wall time from spawning the interpreter to the first response
+
+Medians over `--repeat` runs are printed. With --ref, the same probe also
+runs against the backend directory of an earlier git revision, for a
+before/after comparison. Run from the backend directory:
+
+    python -m benchmarks.bench_startup --repeat 15
+    python -m benchmarks.bench_startup --repeat 15 --ref HEAD~1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from app.core.logging_config import configure_logging
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the fresh interpreter. httpx is imported before the clock starts,
+# since a server would not load it at all.
+PROBE = """
+import asyncio, json, time
+from httpx import ASGITransport, AsyncClient
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def probe():
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://probe") as client:
+            response = await client.get("/api/analytics/current")
+        answered = time.perf_counter()
+    return started, answered, response.status_code
+
+started, answered, status_code = asyncio.run(probe())
+print(json.dumps({
+    "import": imported - start,
+    "startup": started - imported,
+    "first": answered - started,
+    "status": status_code,
+}))
+"""
+
+PHASES = ("import", "startup", "first", "total")
+
+def create_database(path: str) -> None:
+    import sqlite3
+
+    from sqlalchemy import create_engine
+
+    from app.core.models import Base
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+
+def export_revision(ref: str, target: str) -> str:
+    """Extract the backend directory of git revision `ref` into `target`."""
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", ref, "."], cwd=BACKEND_DIR, capture_output=True, check=True
+    ).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(target)
+    return target
+
+def run_probe(source_dir: str, db_url: str) -> Dict[str, float]:
+    env = dict(os.environ, DATABASE_URL=db_url, LOG_LEVEL="WARNING")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=source_dir, env=env, capture_output=True, text=True
+    )
+    total = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{result.stderr}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    if timings.pop("status") != 200:
+        raise RuntimeError("First request did not succeed")
+    timings["total"] = total
+    return timings
+
+def measure(label: str, source_dir: str, db_url: str, repeat: int) -> Dict[str, float]:
+    # One unmeasured run, so bytecode is compiled and caches are warm.
+    run_probe(source_dir, db_url)
+    runs: List[Dict[str, float]] = [run_probe(source_dir, db_url) for _ in range(repeat)]
+    medians = {phase: statistics.median(run[phase] for run in runs) for phase in PHASES}
+    print(f"{label:<12} " + "  ".join(f"{medians[phase] * 1000:8.1f}" for phase in PHASES))
+    return medians
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=15, help="fresh processes per measurement")
+    parser.add_argument("--ref", help="git revision to compare against, e.g. HEAD~1")
+    parser.add_argument("--db-url", help="database to start against (default: a temporary SQLite file)")
+    args = parser.parse_args()
+    configure_logging(level="warning")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_url = args.db_url
+        if db_url is None:
+            path = os.path.join(tmp_dir, "bench_startup.db")
+            create_database(path)
+            db_url = f"sqlite+aiosqlite:///{path}"
+
+        print(f"medians of {args.repeat} fresh processes, ms")
+        print(f"{'':<12} " + "  ".join(f"{phase:>8}" for phase in PHASES))
+        baseline: Optional[Dict[str, float]] = None
+        if args.ref:
+            source_dir = export_revision(args.ref, os.path.join(tmp_dir, "ref"))
+            baseline = measure(args.ref, source_dir, db_url, args.repeat)
+        current = measure("working tree", BACKEND_DIR, db_url, args.repeat)
+        if baseline is not None:
+            print(f"{'change':<12} " + "  ".join(
+                f"{(current[phase] - baseline[phase]) * 1000:+8.1f}" for phase in PHASES
+            ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Compare GET /stats computed from the NumPy column snapshot against the
+equivalent SQL aggregate queries.
+
+Seeds a SQLite database with synthetic page visits, then times:
+
+  * snapshot load: the first refresh, streaming the whole table in batches
+  * snapshot refresh: an incremental refresh after `--touched` rows changed
+  * snapshot describe: count, mean, percentiles and histograms from the arrays
+  * sql: the same numbers from SQL (one aggregate query, one ORDER BY/OFFSET
+    query per percentile and one GROUP BY query per histogram)
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_stats --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from sqlalchemy import cast, func, Integer, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.models import PageVisit
+from app.services.visit_stats import DEFAULT_PERCENTILES, STATS_COLUMNS, VisitStatsSnapshot
+from benchmarks.bench_history_pagination import seed
+
+BINS = 10
+
+async def sql_stats(session: AsyncSession) -> dict:
+    """The stats GET /stats reports, computed with SQL aggregates."""
+    columns = [getattr(PageVisit, name) for name in STATS_COLUMNS]
+    aggregates = (await session.execute(select(
+        func.count(),
+        *(agg(column) for column in columns for agg in (func.avg, func.min, func.max)),
+    ))).one()
+    count = aggregates[0]
+    stats = {}
+    for i, (name, column) in enumerate(zip(STATS_COLUMNS, columns)):
+        mean, minimum, maximum = aggregates[1 + 3 * i:4 + 3 * i]
+        percentiles = {}
+        for p in DEFAULT_PERCENTILES:
+            offset = min(count - 1, int(round(p / 100 * (count - 1))))
+            percentiles[f"p{p}"] = (await session.execute(
+                select(column).order_by(column).limit(1).offset(offset)
+            )).scalar_one()
+        width = max((maximum - minimum) / BINS, 1)
+        bucket = func.min(cast((column - minimum) / width, Integer), BINS - 1)
+        histogram = (await session.execute(
+            select(bucket, func.count()).group_by(bucket).order_by(bucket)
+        )).all()
+        stats[name] = {"mean": mean, "min": minimum, "max": maximum, "percentiles": percentiles, "histogram": histogram}
+    return {"count": count, "columns": stats}
+
+async def time_call(factory, repeat: int) -> float:
+    """Median latency in milliseconds of awaiting factory() `repeat` times."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await factory()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def time_sync(func, repeat: int) -> float:
+    """Median latency in milliseconds of calling func() `repeat` times."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+async def run(db_path: str, touched: int, repeat: int) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with SessionLocal() as session:
+        snapshot = VisitStatsSnapshot()
+        start = time.perf_counter()
+        loaded = await snapshot.refresh(session)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        # Revisit `touched` pages so the next refresh has something to read.
+        newest = (await session.execute(select(func.max(PageVisit.datetime_visited)))).scalar_one()
+        touched_hashes = select(PageVisit.url_hash).order_by(PageVisit.url_hash).limit(touched).scalar_subquery()
+        await session.execute(
+            update(PageVisit)
+            .where(PageVisit.url_hash.in_(touched_hashes))
+            .values(datetime_visited=newest + timedelta(minutes=1), total_visits=PageVisit.total_visits + 1)
+        )
+        await session.commit()
+
+        start = time.perf_counter()
+        refreshed = await snapshot.refresh(session)
+        refresh_ms = (time.perf_counter() - start) * 1000
+
+        describe_ms = time_sync(lambda: snapshot.describe(bins=BINS), repeat)
+        sql_ms = await time_call(lambda: sql_stats(session), repeat)
+
+        expected = await sql_stats(session)
+        described = snapshot.describe(bins=BINS)
+        assert described["count"] == expected["count"], "snapshot and table row counts differ"
+        for name in STATS_COLUMNS:
+            assert abs(described["columns"][name]["mean"] - expected["columns"][name]["mean"]) < 1e-6, name
+
+    await engine.dispose()
+    print(f"{loaded} rows, median of {repeat} runs")
+    print(f"  snapshot load:     {load_ms:9.2f} ms (once per process)")
+    print(f"  snapshot refresh:  {refresh_ms:9.2f} ms ({refreshed} changed rows read)")
+    print(f"  snapshot describe: {describe_ms:9.2f} ms")
+    print(f"  sql aggregates:    {sql_ms:9.2f} ms")
+    print(f"  speedup (refresh + describe vs sql): {sql_ms / (refresh_ms + describe_ms):.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows to seed")
+    parser.add_argument("--touched", type=int, default=1000, help="rows changed before the incremental refresh")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per mode")
+    parser.add_argument("--db", help="reuse an already seeded SQLite file instead of a temporary one")
+    args = parser.parse_args()
+
+    if args.db and os.path.exists(args.db):
+        asyncio.run(run(args.db, args.touched, args.repeat))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db or os.path.join(tmp_dir, "bench_stats.db")
+        start = time.perf_counter()
+        seed(db_path, args.rows)
+        print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+        asyncio.run(run(db_path, args.touched, args.repeat))
+
+if __name__ == "__main__":
+    main()
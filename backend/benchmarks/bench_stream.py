@@ -0,0 +1,54 @@
+"""
+Cost of fanning visits out to stream subscribers, and the memory held for
+subscribers that never read.
+
+For each subscriber count, `--visits` visits over `--urls` distinct URLs are
+published to that many subscriptions that do not consume anything (the worst
+case for the bounded buffers). Reported: publish time per visit, and the
+updates each subscriber holds afterwards, which stays at or below
+STREAM_MAX_PENDING however many visits were published. Run from the backend
+directory:
+
+    python -m benchmarks.bench_stream --visits 20000 --subscribers 1 10 100 1000
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+from app.core.models import PageVisit
+from app.services.visit_events import VisitBroadcaster
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, default=20000, help="visits published per run")
+    parser.add_argument("--urls", type=int, default=1000, help="distinct URLs among the visits")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--max-pending", type=int, default=100, help="updates kept per subscriber")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    visits = [
+        PageVisit(
+            url=f"https://example.com/page/{i % args.urls}", link_count=1, word_count=2,
+            image_count=3, total_visits=i, datetime_visited=now,
+        )
+        for i in range(args.visits)
+    ]
+
+    print(f"{args.visits} visits over {args.urls} URLs, max {args.max_pending} pending per subscriber")
+    print(f"  {'subscribers':>11} {'us/visit':>10} {'pending each':>13} {'coalesced':>11} {'dropped':>11}")
+    for count in args.subscribers:
+        broadcaster = VisitBroadcaster(max_subscribers=count, max_pending=args.max_pending)
+        subscriptions = [broadcaster.subscribe() for _ in range(count)]
+        start = time.perf_counter()
+        for visit in visits:
+            broadcaster.publish([visit])
+        elapsed = time.perf_counter() - start
+        stats = broadcaster.stats()
+        print(
+            f"  {count:>11} {elapsed / args.visits * 1e6:>10.1f} {subscriptions[0].pending():>13} "
+            f"{stats['coalesced']:>11,} {stats['dropped']:>11,}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Cost of answering "the K most visited pages" as page_visits grows, and what
+keeping the in-memory top-K costs the ingest path.
+
+Per table size, on SQLite:
+
+  sort     ORDER BY total_visits DESC LIMIT K without an index (a full sort)
+  index    the same query read backwards from ix_page_visits_total_visits_url_hash
+  memory   TopVisits.top(K), as served by GET /top
+
+and the time TopVisits.offer() adds per written visit, for visits drawn from
+a Zipf distribution (most of them to pages that are not candidates). Run
+from the backend directory:
+
+    python -m benchmarks.bench_top --rows 100000 1000000 --k 10 100
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from app.core.models import PageVisit
+from app.services.top_visits import TopVisits
+
+SCHEMA = """
+CREATE TABLE page_visits (
+    url_hash BIGINT NOT NULL PRIMARY KEY,
+    url VARCHAR NOT NULL,
+    datetime_visited DATETIME NOT NULL,
+    link_count INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    image_count INTEGER NOT NULL,
+    total_visits INTEGER NOT NULL
+);
+"""
+
+INDEX = "CREATE INDEX ix_page_visits_total_visits_url_hash ON page_visits (total_visits, url_hash)"
+
+QUERY = "SELECT * FROM page_visits ORDER BY total_visits DESC, url_hash DESC LIMIT ?"
+
+def median_us(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings)
+
+def zipf_totals(rows: int, seed: int = 42):
+    rng = random.Random(seed)
+    return [max(1, int(rng.paretovariate(1.1))) for _ in range(rows)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--k", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--capacity", type=int, default=1000, help="pages tracked in memory")
+    parser.add_argument("--offers", type=int, default=200000, help="visits offered when timing the ingest cost")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    print(f"{'rows':>10} {'k':>5} {'sort us':>12} {'index us':>10} {'memory us':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.rows:
+            totals = zipf_totals(rows)
+            conn = sqlite3.connect(os.path.join(tmp_dir, f"top_{rows}.db"))
+            conn.executescript(SCHEMA)
+            conn.executemany(
+                "INSERT INTO page_visits VALUES (?, ?, '2026-01-01 00:00:00', 1, 1, 1, ?)",
+                ((i, f"https://example.com/{i}", total) for i, total in enumerate(totals)),
+            )
+            conn.commit()
+            sort_us = {k: median_us(lambda: conn.execute(QUERY, (k,)).fetchall(), args.repeat) for k in args.k}
+            conn.execute(INDEX)
+            index_us = {k: median_us(lambda: conn.execute(QUERY, (k,)).fetchall(), args.repeat) for k in args.k}
+
+            tracker = TopVisits(capacity=args.capacity)
+            tracker.load(
+                PageVisit(url=row[1], link_count=1, word_count=1, image_count=1, total_visits=row[6], datetime_visited=now)
+                for row in conn.execute(QUERY, (args.capacity,))
+            )
+            for k in args.k:
+                assert tracker.is_exact(k)
+                memory_us = median_us(lambda: tracker.top(k), args.repeat * 20)
+                print(f"{rows:>10,} {k:>5} {sort_us[k]:>12,.0f} {index_us[k]:>10,.0f} {memory_us:>10.1f}")
+            conn.close()
+
+            # Ingest cost: every visit adds one to its page's total.
+            rng = random.Random(7)
+            cum_weights = []
+            running = 0.0
+            for rank in range(1, rows + 1):
+                running += 1 / rank ** 1.1
+                cum_weights.append(running)
+            pages = rng.choices(range(rows), cum_weights=cum_weights, k=args.offers)
+            visits = []
+            for page in pages:
+                totals[page] += 1
+                visits.append(PageVisit(
+                    url=f"https://example.com/{page}", link_count=1, word_count=1, image_count=1,
+                    total_visits=totals[page], datetime_visited=now,
+                ))
+            start = time.perf_counter()
+            for visit in visits:
+                tracker.offer(visit)
+            offer_us = (time.perf_counter() - start) / len(visits) * 1e6
+            print(f"{'':>10} offer: {offer_us:.2f} us per visit, exact top-{max(args.k)}: {tracker.is_exact(max(args.k))}")
+
+if __name__ == "__main__":
+    main()
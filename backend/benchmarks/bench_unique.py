@@ -0,0 +1,134 @@
+"""
+Distinct pages visited over a range of days: exact COUNT(DISTINCT) over the
+visit_events log vs merging the stored HyperLogLog sketches of GET /unique.
+
+Per number of logged visits, on SQLite, for the last day and for the whole
+range:
+
+  exact    COUNT(DISTINCT url_hash) on visit_events filtered by visited_at
+           (read from ix_visit_events_visited_at)
+  sketch   merge of the stored per-day sketches and the estimate
+  error    relative error of the sketch estimate
+
+and the stored size of a sketch and the time UniqueCounters.add() adds per
+written visit. Run from the backend directory:
+
+    python -m benchmarks.bench_unique --visits 100000 1000000 --days 30
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from app.core.hyperloglog import HyperLogLog
+from app.core.models import PageVisit
+from app.core.urls import url_hash
+from app.services.unique_counts import UniqueCounters
+
+SCHEMA = """
+CREATE TABLE visit_events (
+    id INTEGER NOT NULL PRIMARY KEY,
+    url_hash BIGINT NOT NULL,
+    url VARCHAR NOT NULL,
+    visited_at DATETIME NOT NULL,
+    visit_count INTEGER NOT NULL,
+    link_count INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    image_count INTEGER NOT NULL
+);
+CREATE INDEX ix_visit_events_visited_at ON visit_events (visited_at);
+CREATE TABLE unique_visit_sketches (
+    day DATE NOT NULL,
+    counter VARCHAR NOT NULL,
+    scope VARCHAR NOT NULL,
+    precision INTEGER NOT NULL,
+    registers BLOB NOT NULL,
+    PRIMARY KEY (day, counter, scope)
+);
+"""
+
+EXACT = "SELECT count(DISTINCT url_hash) FROM visit_events WHERE visited_at >= ? AND visited_at < ?"
+
+SKETCHES = """
+SELECT precision, registers FROM unique_visit_sketches
+WHERE counter = 'pages' AND scope = '' AND day >= ? AND day <= ?
+"""
+
+def median_ms(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def merged_estimate(conn: sqlite3.Connection, start: date, end: date, precision: int) -> float:
+    sketches = [
+        HyperLogLog.from_bytes(registers, precision)
+        for _, registers in conn.execute(SKETCHES, (start.isoformat(), end.isoformat()))
+    ]
+    return HyperLogLog.union(sketches, precision).estimate()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--days", type=int, default=30, help="days the visits are spread over")
+    parser.add_argument("--precision", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    first_day = date(2026, 1, 1)
+    last_day = first_day + timedelta(days=args.days - 1)
+    print(f"{'visits':>10} {'range':>6} {'distinct':>10} {'exact ms':>10} {'sketch ms':>10} {'error':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for visits in args.visits:
+            rng = random.Random(42)
+            pages = visits // 4
+            counters = UniqueCounters(precision=args.precision, per_host=False)
+            rows = []
+            add_seconds = 0.0
+            for i in range(visits):
+                url = f"https://www.site{i % 500}.example.com/articles/{int(rng.paretovariate(0.8)) % pages}"
+                visited_at = datetime(2026, 1, 1) + timedelta(seconds=rng.randrange(args.days * 86400))
+                visit = PageVisit(
+                    url=url, link_count=1, word_count=1, image_count=1, total_visits=1, datetime_visited=visited_at,
+                )
+                start = time.perf_counter()
+                counters.add(visit)
+                add_seconds += time.perf_counter() - start
+                rows.append((url_hash(url), url, visited_at.isoformat(" ")))
+
+            conn = sqlite3.connect(os.path.join(tmp_dir, f"unique_{visits}.db"))
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT INTO visit_events VALUES (NULL, ?, ?, ?, 1, 1, 1, 1)", rows)
+            sketch_bytes = []
+            for (day, counter, scope), sketch in counters._sketches.items():
+                registers = sketch.to_bytes()
+                if counter == "pages":
+                    sketch_bytes.append(len(registers))
+                conn.execute(
+                    "INSERT INTO unique_visit_sketches VALUES (?, ?, ?, ?, ?)",
+                    (day.isoformat(), counter, scope, args.precision, registers),
+                )
+            conn.commit()
+
+            for label, start_day in (("1d", last_day), (f"{args.days}d", first_day)):
+                bounds = (start_day.isoformat(), (last_day + timedelta(days=1)).isoformat())
+                distinct = conn.execute(EXACT, bounds).fetchone()[0]
+                exact_ms = median_ms(lambda: conn.execute(EXACT, bounds).fetchone(), args.repeat)
+                estimate = merged_estimate(conn, start_day, last_day, args.precision)
+                sketch_ms = median_ms(lambda: merged_estimate(conn, start_day, last_day, args.precision), args.repeat)
+                error = (estimate - distinct) / distinct
+                print(f"{visits:>10,} {label:>6} {distinct:>10,} {exact_ms:>10.1f} {sketch_ms:>10.2f} {error:>+8.2%}")
+            print(
+                f"{'':>10} {statistics.median(sketch_bytes):,.0f} bytes per stored daily sketch, "
+                f"add: {add_seconds / visits * 1e6:.2f} us per visit"
+            )
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Compare index size and lookup latency of the page_visits key before and after
+keying rows by a 64-bit hash of the normalized URL.
+
+"before" is the original schema: the full URL as a TEXT primary key plus the
+redundant index on it. "after" is a BIGINT url_hash primary key with the URL
+kept as payload. Lookups in "after" include normalizing and hashing the URL.
+Run from the backend directory:
+
+    python -m benchmarks.bench_url_key --rows 200000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from app.core.urls import normalize_url, url_hash
+
+BEFORE_SCHEMA = """
+CREATE TABLE page_visits (
+    url VARCHAR NOT NULL PRIMARY KEY,
+    datetime_visited DATETIME NOT NULL,
+    link_count INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    image_count INTEGER NOT NULL,
+    total_visits INTEGER NOT NULL
+);
+CREATE INDEX ix_page_visits_url ON page_visits (url);
+"""
+
+AFTER_SCHEMA = """
+CREATE TABLE page_visits (
+    url_hash BIGINT NOT NULL PRIMARY KEY,
+    url VARCHAR NOT NULL,
+    datetime_visited DATETIME NOT NULL,
+    link_count INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    image_count INTEGER NOT NULL,
+    total_visits INTEGER NOT NULL
+);
+"""
+
+def make_urls(rows: int):
+    """Long, realistic URLs: deep paths plus tracking query strings."""
+    rng = random.Random(42)
+    sections = ["news", "blog", "products", "docs", "forum", "search"]
+    urls = []
+    for i in range(rows):
+        urls.append(
+            f"https://www.site{i % 500}.example.com/{rng.choice(sections)}/2024/"
+            f"article-{i}-{'x' * rng.randint(10, 60)}"
+            f"?id={i}&ref=homepage&utm_source=newsletter&utm_medium=email"
+            f"&utm_campaign=spring-sale-{rng.randint(1, 99)}&fbclid=IwAR{rng.getrandbits(64):x}"
+        )
+    return urls
+
+def index_bytes(conn: sqlite3.Connection, names):
+    """Bytes used by the given b-trees, from the dbstat virtual table."""
+    placeholders = ",".join("?" for _ in names)
+    return conn.execute(
+        f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ({placeholders})", list(names)
+    ).fetchone()[0]
+
+def time_lookups(lookup, urls, repeat: int) -> float:
+    """Median per-lookup latency in microseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url in urls:
+            lookup(url)
+        timings.append((time.perf_counter() - start) / len(urls) * 1e6)
+    return statistics.median(timings)
+
+def run(rows: int, lookups: int, repeat: int, tmp_dir: str) -> None:
+    urls = make_urls(rows)
+    sample = random.Random(7).sample(urls, min(lookups, rows))
+
+    before = sqlite3.connect(os.path.join(tmp_dir, "before.db"))
+    before.executescript(BEFORE_SCHEMA)
+    before.executemany(
+        "INSERT INTO page_visits VALUES (?, '2024-01-01 00:00:00', 1, 1, 1, 1)", ((url,) for url in urls)
+    )
+    before.commit()
+
+    after = sqlite3.connect(os.path.join(tmp_dir, "after.db"))
+    after.executescript(AFTER_SCHEMA)
+    normalized = (normalize_url(url) for url in urls)
+    after.executemany(
+        "INSERT OR IGNORE INTO page_visits VALUES (?, ?, '2024-01-01 00:00:00', 1, 1, 1, 1)",
+        ((url_hash(url), url) for url in normalized),
+    )
+    after.commit()
+
+    # The TEXT primary key lives in its own autoindex next to the table b-tree;
+    # the BIGINT key is stored inside the table b-tree itself.
+    before_key = index_bytes(before, ["sqlite_autoindex_page_visits_1", "ix_page_visits_url"])
+    before_total = index_bytes(before, ["page_visits", "sqlite_autoindex_page_visits_1", "ix_page_visits_url"])
+    after_total = index_bytes(after, ["page_visits"])
+
+    def lookup_before(url):
+        return before.execute("SELECT * FROM page_visits WHERE url = ?", (url,)).fetchone()
+
+    def lookup_after(url):
+        key = normalize_url(url)
+        return after.execute(
+            "SELECT * FROM page_visits WHERE url_hash = ? AND url = ?", (url_hash(key), key)
+        ).fetchone()
+
+    def lookup_after_key(url):
+        return after.execute(
+            "SELECT * FROM page_visits WHERE url_hash = ? AND url = ?", (url_hash(url), url)
+        ).fetchone()
+
+    assert all(lookup_after(url) is not None for url in sample[:100])
+    normalized_sample = [normalize_url(url) for url in sample]
+    before_us = time_lookups(lookup_before, sample, repeat)
+    after_us = time_lookups(lookup_after, sample, repeat)
+    after_key_us = time_lookups(lookup_after_key, normalized_sample, repeat)
+
+    print(f"{rows} rows, {len(sample)} lookups x {repeat}")
+    print(f"  before: URL key indexes {before_key / 1e6:8.1f} MB, table+indexes {before_total / 1e6:8.1f} MB, "
+          f"lookup {before_us:6.2f} us")
+    print(f"  after:  URL key indexes {0.0:8.1f} MB, table+indexes {after_total / 1e6:8.1f} MB, "
+          f"lookup {after_us:6.2f} us incl. normalize + hash, {after_key_us:6.2f} us for a normalized URL")
+    before.close()
+    after.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="rows to seed")
+    parser.add_argument("--lookups", type=int, default=10_000, help="distinct URLs looked up per run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run(args.rows, args.lookups, args.repeat, tmp_dir)
+
+if __name__ == "__main__":
+    main()
@@ -21,20 +21,52 @@
   
     console.log("Extracted page metrics:", pageMetrics);
   
-    // Option 1: Send the metrics directly to the backend endpoint.
-    fetch('http://localhost:8000/api/analytics/', {
+    // One idempotency key per page and tab, kept in sessionStorage so that
+    // reloads and retries of the same page view are only counted once.
+    const getIdempotencyKey = () => {
+      const storageKey = `analytics-idempotency-key:${url}`;
+      try {
+        let key = sessionStorage.getItem(storageKey);
+        if (!key) {
+          key = crypto.randomUUID();
+          sessionStorage.setItem(storageKey, key);
+        }
+        return key;
+      } catch (error) {
+        // Storage can be unavailable (e.g. sandboxed frames); still dedupe retries.
+        return crypto.randomUUID();
+      }
+    };
+    const idempotencyKey = getIdempotencyKey();
+
+    // Option 1: Send the metrics directly to the backend endpoint, retrying
+    // network and server errors with the same key.
+    const sendMetrics = (attempt = 1) => fetch('http://localhost:8000/api/analytics/', {
       method: 'POST',
       headers: {
-        'Content-Type': 'application/json'
+        'Content-Type': 'application/json',
+        'Idempotency-Key': idempotencyKey
       },
       body: JSON.stringify(pageMetrics)
     })
       .then(response => {
-        if (!response.ok) {
+        if (response.status >= 500 && attempt < 3) {
           throw new Error(`HTTP error, status = ${response.status}`);
         }
+        if (!response.ok) {
+          throw Object.assign(new Error(`HTTP error, status = ${response.status}`), { final: true });
+        }
         return response.json();
       })
+      .catch(error => {
+        if (error.final || attempt >= 3) {
+          throw error;
+        }
+        return new Promise(resolve => setTimeout(resolve, 1000 * attempt))
+          .then(() => sendMetrics(attempt + 1));
+      });
+
+    sendMetrics()
       .then(data => console.log("Page analytics recorded:", data))
       .catch(error => console.error("Error sending page metrics:", error));
   
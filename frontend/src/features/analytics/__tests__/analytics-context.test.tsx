@@ -6,7 +6,8 @@ import { analyticsApi } from '../../../services/api/analytics-api';
 // Mock the API service
 jest.mock('../../../services/api/analytics-api', () => ({
   analyticsApi: {
-    getAllAnalyticsData: jest.fn()
+    getAllAnalyticsData: jest.fn(),
+    subscribeToVisits: jest.fn(() => () => {})
   }
 }));
 
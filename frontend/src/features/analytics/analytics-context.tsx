@@ -33,6 +33,15 @@ const analyticsReducer = (state: AnalyticsState, action: AnalyticsActionType): A
         loading: false,
         error: action.payload,
       };
+    case 'VISIT_RECEIVED':
+      return {
+        ...state,
+        currentData: action.payload,
+        visitHistory: [
+          action.payload,
+          ...state.visitHistory.filter((visit) => visit.url !== action.payload.url),
+        ],
+      };
     case 'RESET':
       return initialState;
     default:
@@ -93,10 +102,11 @@ export const AnalyticsProvider: React.FC<AnalyticsProviderProps> = ({ children }
 
   useEffect(() => {
     fetchData();
-    
-    // Add auto-refresh if needed
-    // const intervalId = setInterval(() => fetchData(), 60000); // Refresh every minute
-    // return () => clearInterval(intervalId);
+
+    // Push new visits from the server instead of polling /current
+    return analyticsApi.subscribeToVisits((visit) => {
+      dispatch({ type: 'VISIT_RECEIVED', payload: visit });
+    });
   }, [fetchData]);
 
   const value = {
@@ -78,5 +78,21 @@ export const analyticsApi = {
     ]);
     
     return { current, history };
+  },
+
+  /**
+   * Subscribe to visits as the server records them (Server-Sent Events).
+   * Returns a function that closes the stream; a no-op where EventSource
+   * is unavailable.
+   */
+  subscribeToVisits: (onVisit: (visit: Visit) => void): (() => void) => {
+    if (typeof EventSource === 'undefined') {
+      return () => {};
+    }
+    const source = new EventSource(`${apiClient.defaults.baseURL}/analytics/stream`);
+    source.addEventListener('visit', (event) => {
+      onVisit(JSON.parse((event as MessageEvent).data) as Visit);
+    });
+    return () => source.close();
   }
 };
@@ -22,4 +22,5 @@ export type AnalyticsActionType =
   | { type: 'FETCH_START' }
   | { type: 'FETCH_SUCCESS'; payload: { current: AnalyticsData | null, history: Visit[] } }
   | { type: 'FETCH_ERROR'; payload: string }
+  | { type: 'VISIT_RECEIVED'; payload: Visit }
   | { type: 'RESET' };